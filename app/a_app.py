@@ -1,19 +1,36 @@
-import anthropic
 import os
-from dotenv import load_dotenv
 from typing import List, Dict, Optional
 from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "internal" / "backend" / "shared"))
+
+from response_cache import backend_model, cache_from_env, cache_key, stub_backend, stub_reply
+
+try:
+    from dotenv import load_dotenv
+except ImportError:  # .env support is optional
+    load_dotenv = None
 
 # Load environment variables
-load_dotenv()
+if load_dotenv is not None:
+    load_dotenv()
+
+MODEL = "claude-3-5-sonnet-20241022"
+MAX_TOKENS = 200
 
 class MoonTrace:
     def __init__(self):
-        self.client = anthropic.Anthropic(
-            api_key=os.getenv("CLAUDE_API_KEY")
-        )
+        self.stub = stub_backend()
+        self.client = None
+        if not self.stub:
+            import anthropic
+            self.client = anthropic.Anthropic(
+                api_key=os.getenv("CLAUDE_API_KEY")
+            )
         self.messages: List[Dict[str, str]] = []
         self.system_prompt: str = ""
+        self.responses = cache_from_env("response_cache")
         
     @staticmethod
     def colorize_text(prompt: str, color_code: str = "33") -> str:
@@ -79,31 +96,44 @@ Your job:
 10. Unless there is an explicit i -> j in graph.txt, do not assume any i drives any j.
 """
 
+    def complete(self) -> List[str]:
+        """The reply to the conversation so far, in pieces."""
+        if self.stub:
+            return stub_reply(self.messages)
+        response = self.client.messages.create(
+            model=MODEL,
+            max_tokens=MAX_TOKENS,
+            messages=self.messages,
+            # The system prompt holds all the design data and is the same
+            # for every message: mark it so the API caches it as a prefix
+            system=[{
+                "type": "text",
+                "text": self.system_prompt,
+                "cache_control": {"type": "ephemeral"},
+            }]
+        )
+        return [response.content[0].text]
+
     def process_message(self, user_input: str) -> None:
         """Process user input and get response from Claude."""
         self.messages.append({"role": "user", "content": user_input})
 
         try:
-            response = self.client.messages.create(
-                model="claude-3-5-sonnet-20241022",
-                max_tokens=200,
-                messages=self.messages,
-                system=self.system_prompt
-            )
-
             print(self.colorize_text("MoonTrace: ", "36"), end="", flush=True)
-            assistant_reply = ""
-            print(response.content[0].text)
-
-            # for chunk in response:
-            #     content = chunk.choices[0].delta.content
-            #     if content:
-            #         print(content, end="", flush=True)
-            #         assistant_reply += content
-            #     elif assistant_reply and not content:
-            #         break
-
-            # print()
+
+            def emit(text: str) -> None:
+                print(text, end="", flush=True)
+
+            if self.responses is not None:
+                key = cache_key(backend_model(MODEL), self.system_prompt, self.messages, max_tokens=MAX_TOKENS)
+                assistant_reply = self.responses.stream(key, self.complete, emit)
+            else:
+                assistant_reply = ""
+                for text in self.complete():
+                    emit(text)
+                    assistant_reply += text
+            print()
+
             self.messages.append({"role": "assistant", "content": assistant_reply})
 
         except Exception as e:
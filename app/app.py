@@ -1,30 +1,98 @@
+import io
 import json
+import socketserver
 import sys
 import os
-from openai import OpenAI
-from dotenv import load_dotenv
+from pathlib import Path
+try:
+    from dotenv import load_dotenv
+except ImportError:  # .env support is optional
+    load_dotenv = None
 
-# Load API key
-load_dotenv()
-OpenAI.api_key = os.getenv("OPENAI_API_KEY")
-client = OpenAI()
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "internal" / "backend" / "shared"))
 
+from dep_graph import GRAPH_SUFFIX, graph_text, load_dependency_graph
+from context_builder import DEFAULT_BUDGET, build_context, fit_text
+from conversation_store import DEFAULT_HISTORY_BUDGET, ConversationStore, import_legacy_history
+from response_cache import backend_model, cache_key, cache_from_env, stub_backend, stub_reply
 
-def load_conversation():
+# Load API key and settings
+if load_dotenv is not None:
+    load_dotenv()
+MODEL = "gpt-4o-mini"
+_client = None
+
+# Replies to identical requests (same model, system prompt and messages)
+# are served from here; see response_cache
+RESPONSE_CACHE_DIR = "response_cache"
+responses = cache_from_env(RESPONSE_CACHE_DIR)
+
+def openai_client():
+    # created (and openai imported) on first use, so the stub backend needs
+    # neither an API key nor the openai package
+    global _client
+    if _client is None:
+        from openai import OpenAI
+        _client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return _client
+
+def stream_completion(messages):
+    """The reply to 'messages' piece by piece. MOONTRACE_BACKEND=stub answers offline."""
+    if stub_backend():
+        yield from stub_reply(messages)
+        return
+    response = openai_client().chat.completions.create(
+        model=MODEL,
+        messages=messages,
+        stream=True
+    )
+    started = False
+    for chunk in response:
+        content = chunk.choices[0].delta.content
+        if content:
+            started = True
+            yield content
+        elif started:
+            break
+
+
+HISTORY_FILE = "conversation_history.jsonl"
+LEGACY_HISTORY_FILE = "conversation_history.json"
+_store = None
+
+def history_budget():
+    # tokens of past messages sent with each question; older turns are compacted
     try:
-        with open("conversation_history.json", "r") as f:
-            return json.load(f)
-    except:
-        return []
+        return int(os.getenv("MOONTRACE_HISTORY_TOKENS", DEFAULT_HISTORY_BUDGET))
+    except ValueError:
+        return DEFAULT_HISTORY_BUDGET
+
+def load_conversation():
+    global _store
+    if _store is None:
+        _store = ConversationStore(HISTORY_FILE, budget=history_budget())
+        import_legacy_history(_store, LEGACY_HISTORY_FILE)
+    return _store
 
-def save_conversation(messages):
-    with open("conversation_history.json", "w") as f:
-        json.dump(messages, f)
+# file contents by path, with the (mtime, size) they were read at; a served
+# process (--serve) only reads a file again once it changes
+_file_cache = {}
 
 def read_file_contents(file_path):
     try:
-        with open(file_path, 'r') as f:
-            return f.read()
+        st = os.stat(file_path)
+        key = (st.st_mtime_ns, st.st_size)
+        cached = _file_cache.get(file_path)
+        if cached and cached[0] == key:
+            return cached[1]
+        if file_path.endswith(GRAPH_SUFFIX):
+            # binary graph from code/parser.py; the prompt gets its text form
+            content = graph_text(load_dependency_graph(file_path))
+        else:
+            with open(file_path, 'r') as f:
+                content = f.read()
+        _file_cache[file_path] = (key, content)
+        return content
     except FileNotFoundError:
         print(f"[Warning] File not found: {file_path}")
         return ""
@@ -32,39 +100,39 @@ def read_file_contents(file_path):
         print(f"[Error] Could not read {file_path}: {e}")
         return ""
 
-def build_system_prompt(base_files, additional_files=None, generate_verification = False, v_filename = None, description = None):
-    # Read base files
-    base_content = {}
-    for name, path in base_files.items():
-        content = read_file_contents(path)
-        base_content[name] = content
-
-    # Start with base system prompt
-    system_prompt = f"""
-You are a hardware design engineer with deep knowledge of Verilog, netlists, waveforms, and RTL simulation.
+def context_budget():
+    # tokens for graph + log (and again for selected files); 0 pastes everything
+    try:
+        return int(os.getenv("MOONTRACE_CONTEXT_TOKENS", DEFAULT_BUDGET))
+    except ValueError:
+        return DEFAULT_BUDGET
 
-Relevant data:
+def build_system_prompt(base_files, additional_files=None, generate_verification = False, v_filename = None, description = None,
+                        question=None, budget=None):
+    # With a question and a budget, only the parts of the graph and log
+    # relevant to it are included (see context_builder)
+    if budget is None:
+        budget = context_budget()
+    budgeted = question is not None and budget > 0
 
-===== GRAPH.TXT =====
-{base_content['graph']}
+    # Read base files
+    if budgeted:
+        base_content = build_context(question, base_files['graph'], base_files['analysis'], budget)
+    else:
+        base_content = {}
+        for name in ('graph', 'analysis'):
+            base_content[name] = read_file_contents(base_files[name])
 
-===== ANALYSIS.TXT =====
-{base_content['analysis']}
+    # Instructions first, then the data they refer to
+    system_prompt = """
+You are a hardware design engineer with deep knowledge of Verilog, netlists, waveforms, and RTL simulation.
 """
 
-    # Add any additional files that were selected
-    if additional_files:
-        for file_path in additional_files:
-            content = read_file_contents(file_path)
-            if content:
-                file_name = os.path.basename(file_path).upper()
-                system_prompt += f"\n===== {file_name} =====\n{content}\n"
-
     # Add job description for non verification cases  
     if not generate_verification:
         system_prompt += """
                 Your job:
-                1. Use ONLY the above data for technical details.
+                1. Use ONLY the data below for technical details.
                 2. Analyze these waveforms and netlists.
                 3. If you lack enough data, say so explicitly.
                 4. Keep answers concise and accurate.
@@ -103,12 +171,34 @@ Relevant data:
             DO NOT include any explanations or commentary outside the testbench code itself.
             """
 
+    system_prompt += f"""
+Relevant data:
 
+===== GRAPH.TXT =====
+{base_content['graph']}
+
+===== ANALYSIS.TXT =====
+{base_content['analysis']}
+"""
+
+    # Add any additional files that were selected
+    if additional_files:
+        files_left = budget
+        for file_path in additional_files:
+            content = read_file_contents(file_path)
+            if content and budgeted:
+                content, files_left = fit_text(content, files_left)
+            if content:
+                file_name = os.path.basename(file_path).upper()
+                system_prompt += f"\n===== {file_name} =====\n{content}\n"
 
     return system_prompt
-def process_prompt(user_input, generate_verification, v_filename, description=None, additional_files=None):
+def print_chunk(text):
+    print(text, end="", flush=True)
+
+def process_prompt(user_input, generate_verification, v_filename, description=None, additional_files=None, emit=print_chunk):
+    # 'emit' receives the answer piece by piece, and any status text after it
     # Define base directory and required files
-    global messages
     BASE_DIR = "/Users/senagulhazir/Desktop/demo/"
     base_files = {
         'graph': os.path.join(BASE_DIR, "moontrace/graph.txt"),
@@ -118,34 +208,30 @@ def process_prompt(user_input, generate_verification, v_filename, description=No
         'vcd': os.path.join(BASE_DIR, "counter/counter_tb.vcd")
     }
 
-    # Build system prompt with all files
-    messages = load_conversation()
-    system_prompt = build_system_prompt(base_files, additional_files, generate_verification, v_filename, description)    
-    # Message history
-    
-    if not messages:
-        messages = [{"role": "system", "content": system_prompt}]
-        messages.append({"role": "user", "content": user_input})
-    else:
-         messages.append({"role": "user", "content": user_input})
+    # Build system prompt around what this question (and the last few) ask about
+    store = load_conversation()
+    recent = [m["content"] for m in store.messages if m["role"] == "user"][-2:]
+    question = "\n".join(recent + [user_input])
+    system_prompt = build_system_prompt(base_files, additional_files, generate_verification, v_filename, description,
+                                        question=question)
+    if store.summary:
+        system_prompt += f"\n===== EARLIER IN THIS CONVERSATION =====\n{store.summary}\n"
+
+    # Message history: the system prompt is stored by hash, each turn is an append
+    store.set_system_prompt(system_prompt)
+    store.append("user", user_input)
+    messages = [{"role": "system", "content": system_prompt}] + store.messages
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            stream=True
-        )
-        
-        assistant_reply = ""
-        content = ""
-        for chunk in response:
-            content = chunk.choices[0].delta.content
-            if content:
-                print(content, end="", flush=True)
+        if responses is not None:
+            key = cache_key(backend_model(MODEL), system_prompt, messages[1:])
+            assistant_reply = responses.stream(key, lambda: stream_completion(messages), emit)
+        else:
+            assistant_reply = ""
+            for content in stream_completion(messages):
+                emit(content)
                 assistant_reply += content
-            elif assistant_reply and not content:
-                break
-                
-        messages.append({"role": "assistant", "content": assistant_reply})
+
+        store.append("assistant", assistant_reply)
 
         if generate_verification:
             output_dir = "/Users/senagulhazir/Desktop/demo/counter" 
@@ -156,21 +242,106 @@ def process_prompt(user_input, generate_verification, v_filename, description=No
 
             try:
                 with open(output_file, 'w') as f:
-                    print(f"\n\nVerification file saved to: {output_file}")
+                    emit(f"\n\nVerification file saved to: {output_file}\n")
                     f.write(assistant_reply) 
             except Exception as e:
-                print(f"\n\nError saving testbench: {e}")
+                emit(f"\n\nError saving testbench: {e}\n")
                 
         
     except Exception as e:
-        print(f"Error: {e}")
-    save_conversation(messages)
+        emit(f"Error: {e}\n")
+    store.compact_if_needed()
+
+def serve(requests, replies):
+    """
+    Answer line-delimited JSON requests from 'requests' until it closes:
+
+      {"id": 1, "prompt": "...", "verification": false, "fileName": null,
+       "description": null, "files": ["..."]}
+
+    The answer streams back on 'replies' as {"id": 1, "chunk": "..."} lines
+    and ends with {"id": 1, "done": true}. A request that cannot be read,
+    or whose answer fails part way, gets {"id": ..., "error": "..."} and the
+    next request is served. The client, loaded graph, log index and file
+    contents stay in memory between requests.
+    """
+    def reply(obj):
+        replies.write(json.dumps(obj) + "\n")
+        replies.flush()
+
+    for line in requests:
+        if not line.strip():
+            continue
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            prompt = request["prompt"]
+            if not isinstance(prompt, str):
+                raise ValueError("'prompt' must be a string")
+            for field in ("fileName", "description"):
+                if not isinstance(request.get(field), (str, type(None))):
+                    raise ValueError(f"'{field}' must be a string or null")
+            files = request.get("files") or []
+            if not isinstance(files, list) or not all(isinstance(f, str) for f in files):
+                raise ValueError("'files' must be a list of paths")
+        except (ValueError, KeyError, AttributeError) as e:
+            reply({"id": request_id, "error": f"bad request: {e}"})
+            continue
+
+        def emit(text):
+            reply({"id": request_id, "chunk": text})
+
+        try:
+            process_prompt(prompt, bool(request.get("verification")), request.get("fileName"),
+                           description=request.get("description"), additional_files=files,
+                           emit=emit)
+        except Exception as e:
+            # the model call or the history write failed; the worker stays up
+            reply({"id": request_id, "error": f"{type(e).__name__}: {e}"})
+            continue
+        reply({"id": request_id, "done": True})
+
+class _SocketHandler(socketserver.StreamRequestHandler):
+    # one connection at a time: requests share the conversation history
+    def handle(self):
+        serve(io.TextIOWrapper(self.rfile, encoding="utf-8"), io.TextIOWrapper(self.wfile, encoding="utf-8"))
+
+def serve_socket(path):
+    """serve() every connection to the Unix socket at 'path'."""
+    if os.path.exists(path):
+        os.unlink(path)
+    with socketserver.UnixStreamServer(path, _SocketHandler) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(path)
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
         print("Error: Missing prompt argument")
         sys.exit(1)
 
+    # Long-lived worker: --serve speaks the serve() protocol on stdin/stdout,
+    # --socket PATH on a Unix socket
+    if sys.argv[1] == "--serve":
+        replies = sys.stdout
+        # stray prints (warnings) must not interleave with the replies
+        sys.stdout = sys.stderr
+        try:
+            serve(sys.stdin, replies)
+        except KeyboardInterrupt:
+            pass
+        sys.exit(0)
+    if sys.argv[1] == "--socket":
+        if len(sys.argv) < 3:
+            print("Error: Missing socket path")
+            sys.exit(1)
+        serve_socket(sys.argv[2])
+        sys.exit(0)
+
     user_input = sys.argv[1]
     v_filename = None 
     description = None 
@@ -192,4 +363,4 @@ if __name__ == "__main__":
             additional_files.append(sys.argv[i]) 
             i += 1 
     
-    process_prompt(user_input, generate_verification, v_filename, additional_files)
+    process_prompt(user_input, generate_verification, v_filename, additional_files=additional_files)
@@ -0,0 +1,327 @@
+import ast
+import heapq
+import os
+import re
+import sys
+from collections import defaultdict, deque
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "internal" / "backend" / "shared"))
+
+from dep_graph import GRAPH_SUFFIX, load_dependency_graph
+from log_index import open_log_index
+
+# Question-driven context for the system prompt. Instead of pasting the
+# whole graph and simulation log, build_context picks the signals and
+# times the question mentions, takes their fan-in/fan-out neighborhood from
+# the dependency graph and the log blocks that touch either, and fills a
+# token budget with the most relevant pieces first.
+#
+# Relevance: a mentioned signal scores 1, a signal d hops away 1 / (d + 1);
+# a log block scores its best signal plus how close its time is to a
+# mentioned one. A graph edge scores its driver plus its best driven signal.
+# When the log has an index next to it (written by vcd_parser.py), only the
+# lines for the neighborhood and the mentioned times are read from it.
+
+DEFAULT_BUDGET = 8000  # tokens
+DEFAULT_DEPTH = 2      # hops of fan-in/fan-out around a mentioned signal
+TIME_SLACK = 10        # a block this far from a mentioned time scores half
+
+_NAME = re.compile(r"[A-Za-z_][\w$]*(?:\.[A-Za-z_][\w$]*)*")
+_TIME = re.compile(r"(?:\btimes?|\bt|@|\bcycles?)\s*[=:]?\s*(\d+)(?:\s*(?:-|to|and|\.\.)\s*(\d+))?"
+                   r"|(\d+)\s*(?:ps|ns|us)\b", re.IGNORECASE)
+_LOG_TIME = re.compile(r"Time (\d+):")
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token for English and code)."""
+    return len(text) // 4 + 1
+
+
+def load_graph(path):
+    """
+    The dependency graph at 'path' as a driver -> [driven] mapping: a
+    .mtgraph or JSON file from code/parser.py, or the 'driver -> [...]'
+    text it prints (graph.txt).
+    """
+    if path.endswith(GRAPH_SUFFIX) or path.endswith(".json"):
+        return load_dependency_graph(path)
+    edges = {}
+    with open(path, "r") as f:
+        for line in f:
+            driver, sep, driven = line.strip().partition(" -> ")
+            if not sep:
+                continue
+            try:
+                edges[driver] = list(ast.literal_eval(driven))
+            except (ValueError, SyntaxError):
+                continue
+    return edges
+
+
+def mentioned_times(question):
+    """(start, end) time ranges the question refers to ("time 40", "t=10-50", "120ns")."""
+    ranges = []
+    for m in _TIME.finditer(question):
+        start, end, unit_time = m.groups()
+        if unit_time is not None:
+            ranges.append((int(unit_time), int(unit_time)))
+        else:
+            a = int(start)
+            b = int(end) if end is not None else a
+            ranges.append((min(a, b), max(a, b)))
+    return ranges
+
+
+class _GraphView:
+    """A loaded graph with the reverse edges and name lookup the neighborhoods need."""
+
+    def __init__(self, graph):
+        self.graph = graph
+        fan_in = defaultdict(list)
+        nodes = set()
+        for driver, driven in graph.items():
+            nodes.add(driver)
+            for d in driven:
+                fan_in[d].append(driver)
+                nodes.add(d)
+        self.fan_in = fan_in
+
+        # a question may name a signal by its full path or by any dotted
+        # suffix of it ("count", "u_counter_logic.count")
+        by_suffix = defaultdict(set)
+        for n in nodes:
+            parts = n.split(".")
+            for k in range(len(parts)):
+                by_suffix[".".join(parts[k:])].add(n)
+        self.by_suffix = by_suffix
+
+
+# Loaded graphs and log indexes by path, with the (mtime, size) they were
+# loaded at, so a long-running process (app.py --serve) only reloads a file
+# once it changes.
+_graph_views = {}
+_log_indexes = {}
+
+
+def _stat_key(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _cached(cache, path, load):
+    key = _stat_key(path)
+    hit = cache.get(path)
+    if hit is not None and key is not None and hit[0] == key:
+        return hit[1]
+    value = load(path)
+    cache[path] = (key, value)
+    return value
+
+
+def graph_view(path):
+    return _cached(_graph_views, path, lambda p: _GraphView(load_graph(p)))
+
+
+class _Neighborhood:
+    """Signals of the graph within 'depth' hops of the mentioned ones, with their distance."""
+
+    def __init__(self, view, question, depth):
+        self.graph = graph = view.graph
+        fan_in = view.fan_in
+        self.mentioned = set()
+        for token in _NAME.findall(question):
+            self.mentioned |= view.by_suffix.get(token, set())
+
+        self.distance = {n: 0 for n in self.mentioned}
+        queue = deque(self.mentioned)
+        while queue:
+            n = queue.popleft()
+            d = self.distance[n] + 1
+            if d > depth:
+                continue
+            for m in list(graph.get(n, ())) + fan_in.get(n, []):
+                if m not in self.distance:
+                    self.distance[m] = d
+                    queue.append(m)
+
+    def score(self, signal):
+        d = self.distance.get(signal)
+        return 0.0 if d is None else 1.0 / (d + 1)
+
+
+def _graph_candidates(hood):
+    """(score, order, line) for every edge with both ends in the neighborhood."""
+    order = 0
+    for driver in sorted(hood.distance, key=lambda n: (hood.distance[n], n)):
+        driven = [d for d in hood.graph.get(driver, ()) if d in hood.distance]
+        if driven:
+            score = hood.score(driver) + max(hood.score(d) for d in driven)
+            yield score, order, f"  {driver} -> {driven}"
+            order += 1
+
+
+def iter_log_blocks(lines):
+    """
+    (time, text) per 'Time T: ...' line of a simulation log together with
+    the '=> ... possibly caused ...' lines under it. Lines before the first
+    block (headers) are skipped.
+    """
+    time = None
+    block = []
+    for line in lines:
+        m = _LOG_TIME.match(line)
+        if m:
+            if block:
+                yield time, "".join(block)
+            time = int(m.group(1))
+            block = [line]
+        elif block and line.strip():
+            block.append(line)
+    if block:
+        yield time, "".join(block)
+
+
+def _time_score(time, ranges, slack):
+    if not ranges or time is None:
+        return 0.0
+    gap = min(max(start - time, time - end, 0) for start, end in ranges)
+    return 1.0 / (1 + gap / slack) if slack else float(gap == 0)
+
+
+def _block_score(time, text, hood, ranges, slack):
+    score = _time_score(time, ranges, slack)
+    signal_score = max((hood.score(n) for n in _NAME.findall(text)), default=0.0)
+    if signal_score or not hood.mentioned:
+        return score + signal_score
+    # a block near a mentioned time but off the neighborhood
+    return score * 0.5
+
+
+def _log_candidates(blocks, hood, ranges, slack, budget):
+    """
+    The best-scoring log blocks that fit in 'budget' tokens, as (score,
+    order, text). Kept in a bounded heap, so the log is read once and never
+    held in memory.
+    """
+    heap = []
+    used = 0
+    for order, (time, text) in enumerate(blocks):
+        score = _block_score(time, text, hood, ranges, slack)
+        if score <= 0:
+            continue
+        cost = estimate_tokens(text)
+        heapq.heappush(heap, (score, -order, text, cost))
+        used += cost
+        while used > budget and heap:
+            used -= heapq.heappop(heap)[3]
+    return [(score, -neg_order, text) for score, neg_order, text, _ in heap]
+
+
+def _indexed_log_candidates(index, hood, ranges, slack, budget):
+    """
+    _log_candidates through the log's index (see log_index): only the lines
+    naming a neighborhood signal, or at a mentioned time, are read. Each
+    line is a candidate of its own, ordered by its offset.
+    """
+    # about as many lines as the budget holds, per signal and per range
+    per_query = budget * 4 // 60 + 1
+    span = (None, None)
+    if ranges:
+        span = (min(a for a, _ in ranges) - 4 * slack, max(b for _, b in ranges) + 4 * slack)
+
+    offsets = set()
+    for signal in hood.distance:
+        offsets.update(index.signal_offsets(signal, *span)[:per_query])
+    for t0, t1 in ranges:
+        start, end = index.time_span(t0, t1)
+        for line in index.lines_for_time(t0, t1, limit=per_query):
+            offsets.add(start)
+            start += len(line.encode()) + 1
+
+    for offset in offsets:
+        line = index.line_at(offset) + "\n"
+        score = _block_score(index.time_at(offset), line, hood, ranges, slack)
+        if score > 0:
+            yield score, offset, line
+
+
+def _fill(candidates, budget):
+    """The highest-scoring candidates that fit 'budget', back in their original order."""
+    chosen = []
+    for score, order, text in sorted(candidates, key=lambda c: (-c[0], c[1])):
+        cost = estimate_tokens(text)
+        if cost <= budget:
+            chosen.append((order, text))
+            budget -= cost
+    return [text for _, text in sorted(chosen)], budget
+
+
+def _head(lines, budget):
+    """The leading 'lines' that fit 'budget' tokens, and the tokens left over."""
+    out = []
+    for line in lines:
+        cost = estimate_tokens(line)
+        if cost > budget:
+            out.append("... [truncated]\n")
+            break
+        out.append(line)
+        budget -= cost
+    return "".join(out), budget
+
+
+def fit_text(text, budget):
+    """'text' cut at a line boundary to fit 'budget' tokens, and the tokens left over."""
+    return _head(text.splitlines(keepends=True), budget)
+
+
+def build_context(question, graph_path, log_path, budget=DEFAULT_BUDGET, depth=DEFAULT_DEPTH,
+                  time_slack=TIME_SLACK):
+    """
+    {'graph': text, 'analysis': text} holding the parts of the dependency
+    graph and simulation log relevant to 'question', within 'budget'
+    tokens together. With nothing recognizable in the question, both are
+    the start of their file cut to fit.
+    """
+    try:
+        view = graph_view(graph_path)
+    except (OSError, ValueError) as e:
+        print(f"[Warning] Could not read graph {graph_path}: {e}")
+        view = _GraphView({})
+    hood = _Neighborhood(view, question, depth)
+    ranges = mentioned_times(question)
+
+    if hood.mentioned:
+        graph_lines, left = _fill(_graph_candidates(hood), budget // 2)
+        graph_text = "\n".join(graph_lines)
+        log_budget = budget // 2 + left
+    else:
+        graph_text = ""
+        log_budget = budget // 2
+
+    index = _cached(_log_indexes, log_path, open_log_index) if hood.mentioned or ranges else None
+    try:
+        if index is not None:
+            candidates = _indexed_log_candidates(index, hood, ranges, time_slack, log_budget)
+            log_lines, left = _fill(candidates, log_budget)
+            log_text = "".join(log_lines)
+        elif hood.mentioned or ranges:
+            with open(log_path, "r") as f:
+                candidates = _log_candidates(iter_log_blocks(f), hood, ranges, time_slack, log_budget)
+            log_blocks, left = _fill(candidates, log_budget)
+            log_text = "".join(log_blocks)
+        else:
+            with open(log_path, "r") as f:
+                log_text, left = _head(f, log_budget)
+    except OSError as e:
+        print(f"[Warning] Could not read simulation log {log_path}: {e}")
+        log_text, left = "", log_budget
+
+    if not hood.mentioned:
+        # nothing to center on: as much of the graph as the budget allows
+        lines = (f"  {driver} -> {list(driven)}\n" for driver, driven in view.graph.items())
+        graph_text, _ = _head(lines, budget // 2 + left)
+    return {"graph": graph_text, "analysis": log_text}
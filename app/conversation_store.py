@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+
+from atomic_write import atomic_write
+from context_builder import estimate_tokens
+
+# Append-only conversation log: one JSON object per line.
+#
+#   {"type": "system", "hash": <sha256>}       the system prompt for the turns
+#                                               that follow, stored once in
+#                                               '<log>.prompts/<sha256>.txt'
+#   {"type": "message", "role": ..., "content": ...}
+#   {"type": "summary", "content": ...}        what compaction kept of the
+#                                               turns it dropped
+#
+# A turn appends a line or two, whatever the length of the history. Once
+# the messages exceed the token budget, the oldest are folded into the
+# summary and the log is rewritten as summary + system + the newest
+# messages, so both the file and each request stay bounded.
+
+DEFAULT_HISTORY_BUDGET = 4000  # tokens of messages kept verbatim
+NOTE_CHARS = 160               # per dropped message in the summary
+
+
+class ConversationStore:
+    """
+    The conversation in 'path'. 'messages' are the user/assistant turns
+    kept verbatim and 'summary' notes on the ones compacted away. Another
+    process appending to the same log is picked up on the next access.
+    """
+
+    def __init__(self, path, budget=DEFAULT_HISTORY_BUDGET):
+        self.path = path
+        self.prompts_dir = path + ".prompts"
+        self.budget = budget
+        self._size = None
+        self._load()
+
+    def _load(self):
+        self._messages = []
+        self._summary = ""
+        self.system_hash = None
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = b""
+        self._size = len(data)
+        for line in data.splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by a crash
+            kind = record.get("type")
+            if kind == "message":
+                self._messages.append({"role": record["role"], "content": record["content"]})
+            elif kind == "system":
+                self.system_hash = record["hash"]
+            elif kind == "summary":
+                self._summary = record["content"]
+
+    def _sync(self):
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            size = 0
+        if size != self._size:
+            self._load()
+
+    @property
+    def messages(self):
+        self._sync()
+        return list(self._messages)
+
+    @property
+    def summary(self):
+        self._sync()
+        return self._summary
+
+    def _append(self, record):
+        line = (json.dumps(record) + "\n").encode()
+        with open(self.path, "ab") as f:
+            f.write(line)
+        self._size = (self._size or 0) + len(line)
+
+    def system_prompt(self, digest=None):
+        """The stored system prompt with 'digest' (the current one by default), or None."""
+        digest = digest or self.system_hash
+        if digest is None:
+            return None
+        try:
+            with open(os.path.join(self.prompts_dir, digest + ".txt"), "r") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def set_system_prompt(self, text):
+        """Record 'text' as the system prompt from here on; returns its hash."""
+        self._sync()
+        digest = hashlib.sha256(text.encode()).hexdigest()
+        if digest != self.system_hash:
+            prompt_path = os.path.join(self.prompts_dir, digest + ".txt")
+            if not os.path.exists(prompt_path):
+                os.makedirs(self.prompts_dir, exist_ok=True)
+                with atomic_write(prompt_path) as f:
+                    f.write(text)
+            self._append({"type": "system", "hash": digest})
+            self.system_hash = digest
+            self._prune_prompts()
+        return digest
+
+    def append(self, role, content):
+        self._sync()
+        self._append({"type": "message", "role": role, "content": content})
+        self._messages.append({"role": role, "content": content})
+
+    def tokens(self):
+        return sum(estimate_tokens(m["content"]) for m in self.messages)
+
+    def compact_if_needed(self):
+        """
+        Fold the oldest messages into the summary once the messages exceed
+        the budget, keeping the newest ones that fit in half of it.
+        Returns whether the log was compacted.
+        """
+        messages = self.messages
+        if not messages or self.tokens() <= self.budget:
+            return False
+        keep = len(messages)
+        used = 0
+        while keep > 0:
+            cost = estimate_tokens(messages[keep - 1]["content"])
+            if used + cost > self.budget // 2:
+                break
+            used += cost
+            keep -= 1
+        # start the kept part on a question, not on an orphaned answer
+        while keep < len(messages) and messages[keep]["role"] != "user":
+            keep += 1
+        dropped, kept = messages[:keep], messages[keep:]
+
+        notes = [self._summary] if self._summary else []
+        for m in dropped:
+            text = " ".join(m["content"].split())
+            if len(text) > NOTE_CHARS:
+                text = text[:NOTE_CHARS] + "..."
+            notes.append(f"- {m['role']}: {text}")
+        # the summary gets a quarter of the budget, newest notes first
+        summary_lines = []
+        left = self.budget // 4
+        for line in reversed("\n".join(notes).splitlines()):
+            left -= estimate_tokens(line)
+            if left < 0:
+                break
+            summary_lines.append(line)
+        summary = "\n".join(reversed(summary_lines))
+
+        records = [{"type": "summary", "content": summary}]
+        if self.system_hash:
+            records.append({"type": "system", "hash": self.system_hash})
+        records += [{"type": "message", **m} for m in kept]
+        with atomic_write(self.path) as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+        self._load()
+        return True
+
+    def _prune_prompts(self):
+        # only the current system prompt is ever read back (a reload keeps
+        # the last system record), so the files of earlier ones can go
+        try:
+            names = os.listdir(self.prompts_dir)
+        except OSError:
+            return
+        for name in names:
+            # a .tmp is another process still writing its prompt
+            if name != f"{self.system_hash}.txt" and not name.endswith(".tmp"):
+                try:
+                    os.remove(os.path.join(self.prompts_dir, name))
+                except OSError:
+                    pass
+
+
+def import_legacy_history(store, legacy_path):
+    """
+    Move the messages of an old 'conversation_history.json' (a full
+    message list with the system prompt inline) into 'store', once.
+    """
+    if not os.path.exists(legacy_path) or store.messages:
+        return
+    try:
+        with open(legacy_path, "r") as f:
+            messages = json.load(f)
+    except (OSError, ValueError):
+        return
+    for m in messages:
+        if isinstance(m, dict) and m.get("role") in ("user", "assistant"):
+            store.append(m["role"], m.get("content") or "")
+    os.replace(legacy_path, legacy_path + ".imported")
@@ -1,8 +1,14 @@
 import sys
 import json
-import requests
 import os
-from dotenv import load_dotenv
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "internal" / "backend" / "shared"))
+
+from response_cache import backend_model, cache_from_env, cache_key, stub_backend, stub_reply
+
+MODEL = "deepseek-coder"
+responses = cache_from_env("response_cache")
 
 def read_file_contents(file_path):
     try:
@@ -18,32 +24,53 @@ def read_file_contents(file_path):
 def colorize_text(prompt, color_code = "33"):
     return f"\033[{color_code}m{prompt}\033[0m"
 
+def generate(payload):
+    """The reply to 'payload' from Ollama, piece by piece."""
+    if stub_backend():
+        yield from stub_reply([{"role": "user", "content": payload["prompt"]}])
+        return
+    import requests
+    response = requests.post('http://localhost:11434/api/generate', 
+                           json=payload,
+                           stream=True)
+    
+    if response.status_code != 200:
+        raise RuntimeError(f"Error: {response.status_code}")
+    for line in response.iter_lines():
+        if line:
+            json_response = json.loads(line)
+            if not json_response.get('done', False):
+                yield json_response.get('response', '')
+
 def process_prompt(user_input, messages):
     payload = {
-        "model": "deepseek-coder",
-        "prompt": f"Previous conversation:\n{messages}\n\nUser: {user_input}\nAssistant:"
+        "model": MODEL,
+        "prompt": f"Previous conversation:\n{messages}\n\nUser: {user_input}\nAssistant:",
+        # Keep the model loaded between questions: Ollama reuses the KV cache
+        # of the previous prompt, and every prompt starts with the same
+        # system prompt and history
+        "keep_alive": "30m"
     }
     
     print(colorize_text("MoonTrace: ", "36"), end="", flush=True)
-    
-    response = requests.post('http://localhost:11434/api/generate', 
-                           json=payload,
-                           stream=True)
-    
-    if response.status_code == 200:
-        assistant_reply = ""
-        for line in response.iter_lines():
-            if line:
-                json_response = json.loads(line)
-                if not json_response.get('done', False):
-                    chunk = json_response.get('response', '')
-                    print(chunk, end='', flush=True)
-                    assistant_reply += chunk
-        print()
-        return assistant_reply
-    else:
-        print(f"Error: {response.status_code}")
+
+    def emit(chunk):
+        print(chunk, end='', flush=True)
+
+    try:
+        if responses is not None:
+            key = cache_key(backend_model(MODEL), "", [{"role": "user", "content": payload["prompt"]}])
+            assistant_reply = responses.stream(key, lambda: generate(payload), emit)
+        else:
+            assistant_reply = ""
+            for chunk in generate(payload):
+                emit(chunk)
+                assistant_reply += chunk
+    except RuntimeError as e:
+        print(e)
         return None
+    print()
+    return assistant_reply
 
 def main():
     print("Welcome to MoonTrace 🌝! Type 'exit' to quit.\n")
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+
+from atomic_write import atomic_write
+
+# Content-addressed cache of model replies, shared by the LLM front ends.
+#
+# A reply is keyed on everything that determines it: the model, the hash of
+# the system prompt and the message list (plus any sampling parameters).
+# Lookups go to an in-memory LRU first and then to one JSON file per key
+# under the cache directory; both drop entries older than the TTL, and the
+# directory is trimmed to its newest 'max_files' entries.
+
+DEFAULT_TTL = 24 * 3600  # seconds
+DEFAULT_MEMORY_ENTRIES = 128
+DEFAULT_MAX_FILES = 1024
+
+
+def prompt_hash(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def cache_key(model, system_prompt, messages, **params):
+    """The key of a request; 'messages' must not include the system prompt."""
+    blob = json.dumps({
+        "model": model,
+        "system": prompt_hash(system_prompt or ""),
+        "messages": messages,
+        "params": params,
+    }, sort_keys=True)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    Replies by cache_key: an LRU of 'memory_entries' in front of 'cache_dir'
+    (None for memory only). 'ttl' of None keeps entries until evicted.
+    """
+
+    def __init__(self, cache_dir, ttl=DEFAULT_TTL, memory_entries=DEFAULT_MEMORY_ENTRIES,
+                 max_files=DEFAULT_MAX_FILES):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self.max_files = max_files
+        self._memory = OrderedDict()
+        self.hits = self.misses = 0
+
+    def _fresh(self, created):
+        return self.ttl is None or time.time() - created <= self.ttl
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".json")
+
+    def get(self, key):
+        entry = self._memory.get(key)
+        if entry is not None:
+            if self._fresh(entry[0]):
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self._memory[key]
+
+        if self.cache_dir is not None:
+            try:
+                with open(self._path(key), "r") as f:
+                    stored = json.load(f)
+                if self._fresh(stored["created"]):
+                    self._remember(key, stored["created"], stored["reply"])
+                    self.hits += 1
+                    return stored["reply"]
+                os.remove(self._path(key))
+            except (OSError, ValueError, KeyError):
+                pass
+        self.misses += 1
+        return None
+
+    def _remember(self, key, created, reply):
+        self._memory[key] = (created, reply)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def put(self, key, reply):
+        created = time.time()
+        self._remember(key, created, reply)
+        if self.cache_dir is None:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with atomic_write(self._path(key)) as f:
+                json.dump({"created": created, "reply": reply}, f)
+            self._evict()
+        except OSError as e:
+            print(f"[Warning] Could not write response cache {self.cache_dir}: {e}", file=sys.stderr)
+
+    def _evict(self):
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".json"):
+                    entries.append((entry.stat().st_mtime, entry.path))
+        if len(entries) <= self.max_files:
+            return
+        entries.sort()
+        for _, path in entries[:len(entries) - self.max_files]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stream(self, key, chunks, emit):
+        """
+        The reply for 'key': from the cache in one piece, or else streamed
+        from 'chunks' (called only on a miss) and stored. Every piece goes
+        to 'emit' as it arrives.
+        """
+        reply = self.get(key)
+        if reply is not None:
+            emit(reply)
+            return reply
+        reply = ""
+        for chunk in chunks():
+            emit(chunk)
+            reply += chunk
+        if reply:
+            self.put(key, reply)
+        return reply
+
+
+def cache_from_env(cache_dir):
+    """
+    A ResponseCache configured by MOONTRACE_RESPONSE_CACHE ("0" turns it
+    off, returning None) and MOONTRACE_CACHE_TTL (seconds, "0" for no TTL).
+    """
+    if os.getenv("MOONTRACE_RESPONSE_CACHE", "1") == "0":
+        return None
+    try:
+        ttl = int(os.getenv("MOONTRACE_CACHE_TTL", DEFAULT_TTL)) or None
+    except ValueError:
+        ttl = DEFAULT_TTL
+    return ResponseCache(cache_dir, ttl=ttl)
+
+
+STUB_MODEL = "stub"
+
+
+def stub_backend():
+    """True when MOONTRACE_BACKEND=stub: replies come from stub_reply, not a model."""
+    return os.getenv("MOONTRACE_BACKEND") == STUB_MODEL
+
+
+def backend_model(model):
+    """
+    The model to key replies on: STUB_MODEL under the stub backend, so its
+    canned replies never answer a request to the real 'model'.
+    """
+    return STUB_MODEL if stub_backend() else model
+
+
+def stub_reply(messages):
+    """The canned reply of the offline stub backend (MOONTRACE_BACKEND=stub)."""
+    question = messages[-1]["content"] if messages else ""
+    return [f"[stub] {len(messages)} messages; last: ", question]
@@ -0,0 +1,192 @@
+import argparse
+import gc
+import importlib.util
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from workload import PRESETS, generate
+
+# Per-stage benchmark of the parsing/analysis pipeline on a synthetic
+# workload. Each stage is timed on its own (best of --repeat runs, without
+# tracing) and then run once more under tracemalloc for its peak
+# allocation. Results are compared against baselines.json and any stage
+# slower or bigger than baseline * --tolerance (and MIN_DELTA) is flagged.
+# A stage flagged for time is timed --confirm more times, and only counts
+# as a regression if the median of those runs is still over the line: a
+# single best-of-N on a busy machine is too noisy to fail on.
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+BASELINES = Path(__file__).resolve().with_name("baselines.json")
+# differences below these are noise, whatever the ratio
+MIN_DELTA = {"seconds": 0.005, "peak_bytes": 64 * 1024}
+
+sys.path.insert(0, str(BACKEND_DIR / "vcd"))
+
+import vcd_parser  # noqa: E402
+
+
+def _load_code_parser():
+    # code/parser.py is a script, and 'parser' is too generic a name to put on sys.path
+    spec = importlib.util.spec_from_file_location("code_parser", BACKEND_DIR / "code" / "parser.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _close_all(reach):
+    # Reachability is lazy; force every driver's closure so the stage is comparable
+    for driver in reach.drivers:
+        reach.closure_bits(reach.comp_of[reach.index[driver]])
+    return reach
+
+
+def _drain(records):
+    return sum(1 for _ in records)
+
+
+def stages(xml_path, vcd_path, time_window):
+    """(name, function of the previous results) in pipeline order."""
+    code_parser = _load_code_parser()
+    return [
+        ("parse_verilator_xml_signals",
+         lambda r: code_parser.parse_verilator_xml_signals(xml_path, "top")),
+        ("parse_vcd_to_events",
+         lambda r: vcd_parser.parse_vcd_to_events(vcd_path)),
+        ("label_events_with_names",
+         lambda r: vcd_parser.label_events_with_names(*r["parse_vcd_to_events"],
+                                                      r["parse_verilator_xml_signals"])),
+        ("compute_signal_changes",
+         lambda r: vcd_parser.compute_signal_changes(r["label_events_with_names"])),
+        ("build_descendants_map",
+         lambda r: _close_all(vcd_parser.build_descendants_map(r["parse_verilator_xml_signals"]))),
+        ("analyze_dependencies_possible",
+         lambda r: _drain(vcd_parser.analyze_dependencies_possible(
+             r["compute_signal_changes"], r["parse_verilator_xml_signals"], time_window))),
+    ]
+
+
+def _time(stage, results, repeat):
+    """(timings of 'repeat' runs of 'stage', output of the last one)."""
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        out = stage(results)
+        timings.append(time.perf_counter() - start)
+    return timings, out
+
+
+def run(xml_path, vcd_path, repeat=3, time_window=1, memory=True):
+    """(report of stage -> metrics, stage outputs, stage functions)."""
+    results = {}
+    report = {}
+    funcs = dict(stages(xml_path, vcd_path, time_window))
+    for name, stage in funcs.items():
+        timings, out = _time(stage, results, repeat)
+        entry = {"seconds": min(timings)}
+        if memory:
+            gc.collect()
+            tracemalloc.start()
+            stage(results)
+            entry["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        results[name] = out
+        report[name] = entry
+    return report, results, funcs
+
+
+def _over(value, base, tolerance, metric):
+    return value > base * tolerance and value - base > MIN_DELTA[metric]
+
+
+def compare(report, baseline, tolerance):
+    """(stage, metric, baseline, value) for every metric above baseline * tolerance."""
+    regressions = []
+    for name, entry in report.items():
+        for metric, value in entry.items():
+            base = baseline.get(name, {}).get(metric)
+            if base and _over(value, base, tolerance, metric):
+                regressions.append((name, metric, base, value))
+    return regressions
+
+
+def confirm(regressions, results, funcs, tolerance, runs):
+    """
+    Re-time every stage flagged for 'seconds' 'runs' times and keep it only
+    if the median is still over the line (reported as the value). Memory
+    peaks are deterministic enough to keep as they are.
+    """
+    confirmed = []
+    for name, metric, base, value in regressions:
+        if metric == "seconds" and runs:
+            timings, _ = _time(funcs[name], results, runs)
+            value = statistics.median(timings)
+            if not _over(value, base, tolerance, metric):
+                continue
+        confirmed.append((name, metric, base, value))
+    return confirmed
+
+
+def _fmt(metric, value):
+    if metric == "seconds":
+        return f"{value * 1000:10.1f} ms"
+    return f"{value / 2**20:10.1f} MiB"
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark each pipeline stage on a synthetic workload.")
+    arg_parser.add_argument("--preset", choices=sorted(PRESETS), default="small")
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--window", type=int, default=1, help="time window for the analysis stage")
+    arg_parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc runs")
+    arg_parser.add_argument("--workdir", help="keep the generated workload here instead of a temp dir")
+    arg_parser.add_argument("--tolerance", type=float, default=1.5,
+                            help="flag stages above baseline * TOLERANCE (default: 1.5)")
+    arg_parser.add_argument("--confirm", type=int, default=5, metavar="RUNS",
+                            help="re-time a flagged stage RUNS times and fail only if the median "
+                                 "is still over (default: 5, 0 to fail on the first measurement)")
+    arg_parser.add_argument("--update-baseline", action="store_true",
+                            help=f"store this run as the baseline for the preset in {BASELINES.name}")
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = args.workdir or tmp
+        xml_path, vcd_path = generate(workdir, **PRESETS[args.preset])
+        print(f"Workload '{args.preset}': {os.path.getsize(vcd_path) / 2**20:.1f} MiB VCD")
+        report, results, funcs = run(xml_path, vcd_path, args.repeat, args.window,
+                                     memory=not args.no_memory)
+
+        baselines = json.loads(BASELINES.read_text()) if BASELINES.exists() else {}
+        baseline = baselines.get(args.preset, {})
+        regressions = compare(report, baseline, args.tolerance)
+        if not args.update_baseline:
+            regressions = confirm(regressions, results, funcs, args.tolerance, args.confirm)
+    flagged = {(name, metric) for name, metric, _, _ in regressions}
+
+    for name, entry in report.items():
+        cols = []
+        for metric, value in entry.items():
+            mark = " !" if (name, metric) in flagged else "  "
+            cols.append(_fmt(metric, value) + mark)
+        print(f"{name:32}" + "".join(cols))
+
+    if args.update_baseline:
+        baselines[args.preset] = report
+        BASELINES.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+        print(f"Baseline for '{args.preset}' saved to {BASELINES}")
+    elif regressions:
+        for name, metric, base, value in regressions:
+            print(f"Regression: {name} {metric} {_fmt(metric, base).strip()} -> {_fmt(metric, value).strip()}")
+        sys.exit(1)
+    elif not baseline:
+        print(f"No baseline for '{args.preset}'; run with --update-baseline to store one.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import argparse
+import os
+import random
+from xml.sax.saxutils import quoteattr
+
+# Synthetic workloads for the benchmarks: a Verilator-style XML netlist and
+# a VCD of the same design, so names line up the way they do for a real
+# Verilator run ("TOP.top.u_m1_0.s3" in the VCD, "top.u_m1_0.s3" in the graph).
+#
+# Every module has ports clk, rst, din (in) and dout (out), 'signals'
+# internal nets s0..sN-1 built from a chain of continuous assignments, a
+# register on every fourth net, and 'fanout' child instances from the next
+# level down, whose dout feeds back into the parent as c<k>_out. Module
+# definitions are spread over 'depth' levels, so the elaborated hierarchy
+# has 1 + fanout + ... + fanout^(depth - 1) instances.
+
+PRESETS = {
+    "small":  dict(modules=6, depth=3, fanout=2, signals=16, cycles=2000, activity=0.1),
+    "medium": dict(modules=12, depth=3, fanout=3, signals=32, cycles=20000, activity=0.1),
+    "large":  dict(modules=24, depth=4, fanout=4, signals=48, cycles=50000, activity=0.05),
+}
+
+CLOCK_PERIOD = 10
+
+
+class Workload:
+    """Generated design: module definitions per level and the elaborated instance tree."""
+
+    def __init__(self, modules=6, depth=3, fanout=2, signals=16, cycles=2000, activity=0.1, seed=0):
+        if depth < 1 or modules < depth:
+            raise ValueError("need depth >= 1 and at least one module per level")
+        self.depth = depth
+        self.fanout = fanout
+        self.signals = signals
+        self.cycles = cycles
+        self.activity = activity
+        self.rng = random.Random(seed)
+
+        # level 0 is just "top"; the other definitions are dealt out over the levels below
+        self.levels = [["top"]] + [[] for _ in range(depth - 1)]
+        for i in range(1, modules):
+            level = 1 + (i - 1) % (depth - 1) if depth > 1 else 0
+            self.levels[level].append(f"m{i}")
+        self.modules = {}
+        for level, names in enumerate(self.levels):
+            for name in names:
+                self.modules[name] = self._module(level)
+
+    def _module(self, level):
+        rng = self.rng
+        children = []
+        if level + 1 < self.depth:
+            for k in range(self.fanout):
+                children.append((f"u_{rng.choice(self.levels[level + 1])}_{k}", k))
+        child_outs = [f"c{k}_out" for _, k in children]
+        assigns = []
+        for i in range(self.signals):
+            pool = ["din"] + [f"s{j}" for j in range(i)] + child_outs
+            assigns.append((f"s{i}", rng.sample(pool, min(2, len(pool)))))
+        registers = [f"s{i}" for i in range(3, self.signals, 4)]
+        child_ins = [rng.choice([f"s{j}" for j in range(self.signals)] or ["din"]) for _ in children]
+        return {"assigns": assigns, "registers": registers, "children": children,
+                "child_ins": child_ins, "nets": [f"s{i}" for i in range(self.signals)] + child_outs}
+
+    def write_xml(self, path):
+        with open(path, "w") as f:
+            f.write("<?xml version=\"1.0\" ?>\n<verilator_xml>\n<netlist>\n")
+            for name, mod in self.modules.items():
+                f.write(f"<module name={quoteattr(name)}>\n")
+                for port in ("clk", "rst", "din", "dout"):
+                    f.write(f"  <var name=\"{port}\"/>\n")
+                for driven, drivers in mod["assigns"]:
+                    f.write("  <contassign><and>")
+                    f.write("".join(f"<varref name=\"{d}\"/>" for d in drivers))
+                    f.write(f"</and><varref name=\"{driven}\"/></contassign>\n")
+                f.write(f"  <contassign><varref name=\"s{self.signals - 1}\"/>"
+                        f"<varref name=\"dout\"/></contassign>\n")
+                for reg in mod["registers"]:
+                    f.write("  <always><if><varref name=\"rst\"/>"
+                            f"<begin><assigndly><const name=\"0\"/><varref name=\"{reg}\"/></assigndly></begin>"
+                            f"<begin><assigndly><varref name=\"{reg}\"/><varref name=\"{reg}\"/></assigndly></begin>"
+                            "</if></always>\n")
+                for (inst, k), parent_in in zip(mod["children"], mod["child_ins"]):
+                    def_name = inst[2:inst.rindex("_")]
+                    f.write(f"  <instance name={quoteattr(inst)} defName={quoteattr(def_name)}>")
+                    for port, direction, sig in (("clk", "in", "clk"), ("rst", "in", "rst"),
+                                                 ("din", "in", parent_in), ("dout", "out", f"c{k}_out")):
+                        f.write(f"<port name=\"{port}\" direction=\"{direction}\"><varref name=\"{sig}\"/></port>")
+                    f.write("</instance>\n")
+                f.write("</module>\n")
+            f.write("</netlist>\n</verilator_xml>\n")
+
+    def write_vcd(self, path):
+        codes = _id_codes()
+        clk, rst = next(codes), next(codes)
+        nets = []   # (id code, width) of everything that toggles randomly
+        lines = ["$timescale 1ns $end", "$scope module TOP $end"]
+
+        def declare(mname, inst):
+            lines.append(f"$scope module {inst} $end")
+            lines.append(f"$var wire 1 {clk} clk $end")
+            lines.append(f"$var wire 1 {rst} rst $end")
+            mod = self.modules[mname]
+            for net in ["din", "dout"] + mod["nets"]:
+                code = next(codes)
+                width = 8 if len(nets) % 3 == 0 else 1
+                nets.append((code, width))
+                lines.append(f"$var wire {width} {code} {net} $end")
+            for child, _ in mod["children"]:
+                declare(child[2:child.rindex("_")], child)
+            lines.append("$upscope $end")
+
+        declare("top", "top")
+        lines += ["$upscope $end", "$enddefinitions $end"]
+
+        rng = self.rng
+        per_cycle = max(1, round(len(nets) * self.activity))
+        half = CLOCK_PERIOD // 2
+        with open(path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+            f.write(f"#0\n0{clk}\n1{rst}\n")
+            for code, width in nets:
+                f.write(f"b{'0' * width} {code}\n" if width > 1 else f"0{code}\n")
+            for c in range(1, self.cycles + 1):
+                out = [f"#{c * CLOCK_PERIOD}", f"1{clk}"]
+                if c == 2:
+                    out.append(f"0{rst}")
+                for code, width in rng.sample(nets, per_cycle):
+                    if width > 1:
+                        out.append(f"b{rng.getrandbits(width):0{width}b} {code}")
+                    else:
+                        out.append(f"{rng.getrandbits(1)}{code}")
+                out += [f"#{c * CLOCK_PERIOD + half}", f"0{clk}"]
+                f.write("\n".join(out) + "\n")
+
+
+def _id_codes():
+    # VCD identifiers: base-94 over the printable characters '!'..'~'
+    n = 0
+    while True:
+        code, k = "", n
+        while True:
+            code += chr(33 + k % 94)
+            k //= 94
+            if not k:
+                break
+        yield code
+        n += 1
+
+
+def generate(out_dir, seed=0, **params):
+    """Write design.xml and design.vcd into 'out_dir'; returns their paths."""
+    os.makedirs(out_dir, exist_ok=True)
+    workload = Workload(seed=seed, **params)
+    xml_path = os.path.join(out_dir, "design.xml")
+    vcd_path = os.path.join(out_dir, "design.vcd")
+    workload.write_xml(xml_path)
+    workload.write_vcd(vcd_path)
+    return xml_path, vcd_path
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Generate a synthetic netlist and VCD.")
+    arg_parser.add_argument("out_dir")
+    arg_parser.add_argument("--preset", choices=sorted(PRESETS), default="small")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    for key in PRESETS["small"]:
+        arg_parser.add_argument(f"--{key}", type=type(PRESETS["small"][key]),
+                                help=f"override the preset's {key}")
+    args = arg_parser.parse_args()
+
+    params = dict(PRESETS[args.preset])
+    for key in params:
+        if getattr(args, key) is not None:
+            params[key] = getattr(args, key)
+    for path in generate(args.out_dir, seed=args.seed, **params):
+        print(f"Wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,15 @@
+import argparse
 import xml.etree.ElementTree as ET
 from collections import defaultdict
-import json
 import sys
 import os
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "shared"))
+
+from dep_graph import GRAPH_SUFFIX, graph_text, write_graph, write_graph_json
+from stage_stats import add_stats_arguments, finish_stats, stats_from_args
+from symbols import SymbolTable
 
 def parse_expression(elem, module_hier=""):
     """
@@ -137,130 +144,285 @@ def parse_instance_ports(instance_elem, parent_hier=""):
     return direction_map
 
 
-def parse_verilator_xml_signals(xml_path, top_module_name=None):
+# Placeholder for the hierarchical prefix in module summaries. A module is
+# summarized once with this as its prefix; elaborating an instance replaces
+# it with the instance path, which gives the same names as parsing the
+# module again at that path.
+_HIER = "\x00"
+
+
+def summarize_module(module_elem):
     """
-    Parse a Verilator XML file into a dictionary: driver_signal -> set of driven_signals,
-    using consistent hierarchical naming. We recursively parse:
-      - <module name="...">
-      - <always>/<if>/<assigndly>/<contassign>
-      - <instance name="..." defName="...">
+    Reduce a <module> element to what elaboration needs:
+      edges:     [(driver, driven)] from <always> and top-level <contassign>
+      instances: [(instance name, defName, [(driver, driven)] from its ports)]
+    Names are prefixed with _HIER. Edge order matches parse order.
+    """
+    edges = []
+
+    # 1) Parse <always> blocks
+    for always_elem in module_elem.findall('always'):
+        # <if> inside <always>
+        for if_elem in always_elem.findall('.//if'):
+            d_sigs, dr_sigs = parse_if_block(if_elem, _HIER)
+            for d in d_sigs:
+                for dr in dr_sigs:
+                    edges.append((d, dr))
+
+        # <assigndly> inside <always>
+        for assigndly_elem in always_elem.findall('.//assigndly'):
+            ds, dr = parse_assigndly(assigndly_elem, _HIER)
+            if dr:
+                for dd in ds:
+                    edges.append((dd, dr))
+
+    # 2) Parse top-level <contassign>
+    for contassign_elem in module_elem.findall('contassign'):
+        ds, dr = parse_contassign(contassign_elem, _HIER)
+        if dr:
+            for dd in ds:
+                edges.append((dd, dr))
+
+    # 3) Record each <instance> and its port bindings
+    instances = []
+    for inst_elem in module_elem.findall('instance'):
+        port_edges = []
+        for (child_port, direction, parent_sig) in parse_instance_ports(inst_elem, _HIER):
+            if direction == "out":
+                # submodule out -> parent
+                port_edges.append((child_port, parent_sig))
+            else:
+                # parent -> submodule in
+                port_edges.append((parent_sig, child_port))
+        instances.append((inst_elem.get('name'), inst_elem.get('defName'), port_edges))
 
-    'top_module_name' can be used if you want to treat one module as top-level.
-    Otherwise, we just assume each <module> is a "root" if it's not instantiated by a parent.
+    return {"edges": edges, "instances": instances}
+
+
+def iter_module_summaries(xml_path):
     """
-    tree = ET.parse(xml_path)
-    root = tree.getroot()
+    Stream the netlist with iterparse, yielding (module name, summary) for
+    each <module> under <netlist> as soon as it has been read. Elements are
+    dropped once summarized, so peak memory follows the largest module
+    rather than the whole file. Raises ValueError if there is no <netlist>.
+    """
+    depth = 0
+    root = netlist = None
+    for event, elem in ET.iterparse(xml_path, events=("start", "end")):
+        if event == "start":
+            if depth == 0:
+                root = elem
+            elif depth == 1 and elem.tag == 'netlist':
+                netlist = elem
+            depth += 1
+            continue
+
+        depth -= 1
+        if depth == 2 and elem.tag == 'module' and netlist is not None:
+            yield elem.get('name'), summarize_module(elem)
+            netlist.clear()
+        elif depth == 1 and elem is not netlist:
+            # <files>, <cells>, ... are not needed
+            root.clear()
 
-    netlist = root.find('netlist')
     if netlist is None:
         raise ValueError("No <netlist> tag found in the XML.")
 
-    edges = defaultdict(set)
+
+def find_root_modules(module_defs):
+    """
+    Modules that are not instantiated by any module, in definition order.
+    If every module is instantiated somewhere (a cycle), all of them.
+    """
+    instantiated = {defName for summary in module_defs.values()
+                    for (_, defName, _) in summary["instances"]}
+    roots = [m for m in module_defs if m not in instantiated]
+    return roots or list(module_defs)
+
+
+def _relative(name):
+    # "\x00.u_x.count" -> ("u_x", "count"). Names the prefix cannot be split
+    # off (None, or a ','-join of several prefixed names) stay strings.
+    if name is None or name.count(_HIER) != 1 or not name.startswith(_HIER + "."):
+        return name
+    return tuple(name[len(_HIER) + 1:].split('.'))
+
+
+def _stamp(symbols, root_id, rel):
+    if isinstance(rel, tuple):
+        return symbols.intern_path(root_id, rel)
+    if rel is None:
+        return None
+    return symbols.intern(rel.replace(_HIER, symbols.name(root_id)))
+
+
+def parse_verilator_xml_ids(xml_path, top_module_name=None, symbols=None, cache=None):
+    """
+    parse_verilator_xml_signals on interned names: returns (edges, symbols)
+    where edges maps a driver id to the set of driven ids in 'symbols' (a
+    SymbolTable, new unless given). No hierarchical name is built as a
+    string during elaboration.
+
+    With 'cache' (an xml_cache.ModuleSummaryCache), only modules whose text
+    changed since the cache was saved are parsed; the rest reuse their
+    stored summaries.
+    """
+    if symbols is None:
+        symbols = SymbolTable()
+
+    if cache is not None:
+        summaries = cache.summaries(xml_path, summarize_module)
+    else:
+        summaries = iter_module_summaries(xml_path)
 
     # We'll store 'module_defs' in a dictionary:
-    #   module_defs[moduleName] = <module_elem>
-    # so we can recursively parse submodules after we parse the top.
+    #   module_defs[moduleName] = summary of <module_elem>
+    # so we can recursively elaborate submodules after we parse the top.
     module_defs = {}
-    for mod_elem in netlist.findall('module'):
-        mname = mod_elem.get('name')
-        module_defs[mname] = mod_elem
+    for mname, summary in summaries:
+        module_defs[mname] = summary
 
-    # A helper function to parse a *specific module* at a given hierarchical prefix
-    def parse_module(mname, hier_prefix):
+    templates = {}
+
+    # A helper function to turn a *specific module* into an edge template
+    def module_template(mname):
         """
-        Parse the module 'mname' from module_defs, referencing it at hierarchical prefix 'hier_prefix'.
-        E.g. if mname="counter_logic" but we are instantiating it as "counter.u_counter_logic".
-        We'll parse <always>, <contassign>, <instance> inside it.
+        The names used by 'mname' itself (assignments and instance ports) as
+        paths relative to the module, its edges as index pairs into those
+        paths, and its (instance name, defName) list. Computed once per
+        definition, however many instances it has.
         """
-        if mname not in module_defs:
-            return  # No definition known?
-
-        module_elem = module_defs[mname]
-
-        # 1) Parse <always> blocks
-        for always_elem in module_elem.findall('always'):
-            # <if> inside <always>
-            for if_elem in always_elem.findall('.//if'):
-                d_sigs, dr_sigs = parse_if_block(if_elem, hier_prefix)
-                for d in d_sigs:
-                    for dr in dr_sigs:
-                        edges[d].add(dr)
-
-            # <assigndly> inside <always>
-            for assigndly_elem in always_elem.findall('.//assigndly'):
-                ds, dr = parse_assigndly(assigndly_elem, hier_prefix)
-                if dr:
-                    for dd in ds:
-                        edges[dd].add(dr)
-
-        # 2) Parse top-level <contassign>
-        for contassign_elem in module_elem.findall('contassign'):
-            ds, dr = parse_contassign(contassign_elem, hier_prefix)
-            if dr:
-                for dd in ds:
-                    edges[dd].add(dr)
-
-        # 3) Parse each <instance> inside this module
-        for inst_elem in module_elem.findall('instance'):
-            inst_name = inst_elem.get('name')      # e.g. "u_counter_logic"
-            defName   = inst_elem.get('defName')   # e.g. "counter_logic"
-
-            # (a) parse instance ports
-            ports = parse_instance_ports(inst_elem, hier_prefix)
-            for (child_port, direction, parent_sig) in ports:
-                if direction == "out":
-                    # submodule out -> parent
-                    edges[child_port].add(parent_sig)
-                else:
-                    # parent -> submodule in
-                    edges[parent_sig].add(child_port)
-
-            # (b) Recursively parse the submodule definition itself,
-            #     giving it a hierarchical prefix = hier_prefix + "." + inst_name
+        template = templates.get(mname)
+        if template is None:
+            summary = module_defs[mname]
+            paths = []
+            slot = {}
+
+            def path_index(name):
+                k = slot.get(name)
+                if k is None:
+                    k = slot[name] = len(paths)
+                    paths.append(_relative(name))
+                return k
+
+            pairs = [(path_index(d), path_index(dr)) for d, dr in summary["edges"]]
+            for _, _, port_edges in summary["instances"]:
+                pairs.extend((path_index(d), path_index(dr)) for d, dr in port_edges)
+            odd = [k for k, p in enumerate(paths) if not isinstance(p, tuple)]
+            children = [(inst_name, defName) for inst_name, defName, _ in summary["instances"]]
+            template = templates[mname] = (paths, odd, pairs, children)
+        return template
+
+    edges = defaultdict(set)
+
+    # Stamp the template of 'mname' at the instance path 'prefix_id'
+    def parse_module(mname, prefix_id, active):
+        if mname not in module_defs or mname in active:
+            return  # No definition known, or a module that instantiates itself
+        paths, odd, pairs, children = module_template(mname)
+        ids = symbols.intern_paths(prefix_id, paths)
+        for k in odd:
+            ids[k] = _stamp(symbols, prefix_id, paths[k])
+        for a, b in pairs:
+            edges[ids[a]].add(ids[b])
+        active.add(mname)
+        for inst_name, defName in children:
+            # the submodule's hierarchical prefix = hier_prefix + "." + inst_name
             if defName:
-                sub_hier = f"{hier_prefix}.{inst_name}" if hier_prefix else inst_name
-                parse_module(defName, sub_hier)
+                parse_module(defName, symbols.child(prefix_id, inst_name), active)
+        active.discard(mname)
 
     # Strategy:
-    #  - If top_module_name is provided, parse that as the root with the same prefix.
-    #  - Otherwise, parse *all* modules as though each is top-level (which may or may not help).
-    # Typically, you'd parse just your top-level.
+    #  - If top_module_name is provided, elaborate that as the root with the same prefix.
+    #  - Otherwise, elaborate every module that no other module instantiates.
+    roots = [top_module_name] if top_module_name else find_root_modules(module_defs)
+    for root in roots:
+        parse_module(root, symbols.intern(root), set())
+    return edges, symbols
 
-    if top_module_name:
-        parse_module(top_module_name, top_module_name)
-    else:
-        # parse every module as if it were top-level
-        for m in module_defs.keys():
-            parse_module(m, m)
 
-    return edges
+def parse_verilator_xml_signals(xml_path, top_module_name=None):
+    """
+    Parse a Verilator XML file into a dictionary: driver_signal -> set of driven_signals,
+    using consistent hierarchical naming. We recursively parse:
+      - <module name="...">
+      - <always>/<if>/<assigndly>/<contassign>
+      - <instance name="..." defName="...">
 
+    'top_module_name' can be used if you want to treat one module as top-level.
+    Otherwise, each <module> that no other module instantiates is a root.
 
-if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python parse_verilator_xml.py <input_file.xml> [topModuleName]")
-        sys.exit(1)
+    The file is streamed (see iter_module_summaries); each module is kept
+    only as a summary of its assignments and instance port bindings, and is
+    turned into a relative edge template once, however many instances it
+    has. Elaboration works on interned ids (parse_verilator_xml_ids); names are
+    only turned into strings here.
+    """
+    id_edges, symbols = parse_verilator_xml_ids(xml_path, top_module_name)
+    names = symbols.names()
 
-    xml_file = sys.argv[1]
+    edges = defaultdict(set)
+    for d, driven in id_edges.items():
+        # a port bound to a nameless <varref> has no id
+        edges[names[d] if d is not None else None] = {
+            names[dr] if dr is not None else None for dr in driven}
+    return edges
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Build a signal dependency graph from Verilator XML.")
+    arg_parser.add_argument("xml_file")
+    arg_parser.add_argument("top_module", nargs="?", help="treat this module as the top level")
+    arg_parser.add_argument("--output", "-o", metavar="PATH",
+                            help=f"where to write the graph (default: dependency_graph{GRAPH_SUFFIX}, "
+                                 "or dependency_graph.json with --json)")
+    arg_parser.add_argument("--json", action="store_true",
+                            help="export the graph as JSON instead of the binary format")
+    arg_parser.add_argument("--reachability", action="store_true",
+                            help="also store the multi-hop reachability closure (per feedback loop) in the binary graph")
+    arg_parser.add_argument("--no-cache", action="store_true",
+                            help="parse every module instead of reusing the summaries cached next to the XML")
+    add_stats_arguments(arg_parser)
+    args = arg_parser.parse_args()
+
+    xml_file = args.xml_file
     if not os.path.isfile(xml_file):
         print(f"Error: file '{xml_file}' not found.")
         sys.exit(1)
 
-    maybe_top = None
-    if len(sys.argv) > 2:
-        maybe_top = sys.argv[2]
+    stats = stats_from_args(args)
 
-    # Parse the Verilator XML with an optional top module name
-    signal_deps = parse_verilator_xml_signals(xml_file, top_module_name=maybe_top)
+    cache = None
+    if not args.no_cache:
+        from xml_cache import ModuleSummaryCache
+        cache = ModuleSummaryCache(xml_file)
 
-    # Convert sets to lists for JSON serialization
-    final_deps = {drv: list(driven) for drv, driven in signal_deps.items()}
+    # Parse the Verilator XML with an optional top module name
+    with stats.stage("parse_xml") as st:
+        signal_deps, symbols = parse_verilator_xml_ids(xml_file, top_module_name=args.top_module, cache=cache)
+        st["drivers"] = len(signal_deps)
+        st["edges"] = sum(len(driven) for driven in signal_deps.values())
+        st["symbols"] = len(symbols)
+        if cache is not None:
+            st["modules_reused"] = cache.hits
+            st["modules_parsed"] = cache.misses
+            cache.save()
+
+    # names are only materialized for output
+    names = symbols.names()
 
     print("Signal-level Dependencies (driver -> driven):")
-    for driver, driven_list in final_deps.items():
-        print(f"  {driver} -> {driven_list}")
+    print(graph_text(signal_deps, names))
 
-    out_json = "dependency_graph.json"
-    with open(out_json, "w") as f:
-        json.dump(final_deps, f, indent=2)
-    print(f"Dependency graph saved to {out_json}")
+    out_path = args.output or ("dependency_graph.json" if args.json else "dependency_graph" + GRAPH_SUFFIX)
+    with stats.stage("write_graph"):
+        if args.json:
+            write_graph_json(out_path, signal_deps, names)
+        else:
+            write_graph(out_path, signal_deps, reachability=args.reachability, names=names)
+    print(f"Dependency graph saved to {out_path}")
+    finish_stats(stats, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import hashlib
+import json
+import mmap
+import re
+import sys
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import unescape
+
+from atomic_write import atomic_write
+
+# Sidecar cache of module summaries for a Verilator XML: '<xml>.mtmod' (JSON).
+#
+#   {"version": CACHE_VERSION, "modules": {<blake2b of module bytes>: summary}}
+#
+# Modules are found as byte ranges in the mapped file and hashed as raw
+# bytes, so an unchanged module is never parsed as XML at all; only modules
+# whose bytes changed are parsed and summarized again. The cache only keeps
+# the entries the last run used, so it does not grow across edits.
+
+CACHE_SUFFIX = ".mtmod"
+CACHE_VERSION = 1  # bump when summarize_module's output changes
+
+_MODULE_START = re.compile(rb'<module[\s/>]')
+_MODULE_END = b'</module>'
+_NAME = re.compile(rb'\sname="([^"]*)"')
+
+
+def cache_path_for(xml_path):
+    return xml_path + CACHE_SUFFIX
+
+
+def iter_module_slices(mm):
+    """
+    Yield (name, bytes) for each <module> inside <netlist>. Modules do not
+    nest in Verilator XML, so each one runs to the next '</module>' (or is
+    a self-closing tag). Raises ValueError if there is no <netlist>.
+    """
+    start = mm.find(b'<netlist')
+    if start < 0:
+        raise ValueError("No <netlist> tag found in the XML.")
+    end = mm.find(b'</netlist>', start)
+    if end < 0:
+        end = len(mm)
+
+    pos = start
+    while True:
+        m = _MODULE_START.search(mm, pos, end)
+        if m is None:
+            return
+        tag_end = mm.find(b'>', m.start(), end)
+        if tag_end < 0:
+            return
+        if mm[tag_end - 1:tag_end] == b'/':
+            stop = tag_end + 1
+        else:
+            stop = mm.find(_MODULE_END, tag_end, end)
+            stop = end if stop < 0 else stop + len(_MODULE_END)
+        name = _NAME.search(mm, m.start(), tag_end)
+        name = unescape(name.group(1).decode(), {"&quot;": '"'}) if name else None
+        yield name, mm[m.start():stop]
+        pos = stop
+
+
+class ModuleSummaryCache:
+    """
+    Module summaries keyed by content hash, loaded from and saved to the
+    sidecar next to the XML. 'hits' and 'misses' count this run's lookups.
+    """
+
+    def __init__(self, xml_path):
+        self.path = cache_path_for(xml_path)
+        self.old = {}
+        self.used = {}
+        self.hits = self.misses = 0
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            if data.get("version") == CACHE_VERSION and isinstance(data["modules"], dict):
+                self.old = data["modules"]
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass
+
+    def summaries(self, xml_path, summarize):
+        """Yield (module name, summary) like parser.iter_module_summaries."""
+        with open(xml_path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for name, raw in iter_module_slices(mm):
+                    key = hashlib.blake2b(raw, digest_size=16).hexdigest()
+                    summary = self.used.get(key) or self.old.get(key)
+                    if summary is None:
+                        self.misses += 1
+                        summary = summarize(ET.fromstring(raw))
+                    else:
+                        self.hits += 1
+                    self.used[key] = summary
+                    yield name, summary
+
+    def save(self):
+        try:
+            with atomic_write(self.path) as f:
+                json.dump({"version": CACHE_VERSION, "modules": self.used}, f)
+        except OSError as e:
+            print(f"[Warning] Could not write module cache {self.path}: {e}", file=sys.stderr)
@@ -0,0 +1,26 @@
+import os
+from contextlib import contextmanager
+
+# Sidecar files (caches, indexes, the conversation log) are written to
+# '<path>.<pid>.tmp' and renamed over 'path', so a reader never sees a half
+# written file. A write that fails part way removes its temporary file
+# instead of leaving it next to the sidecar.
+
+
+@contextmanager
+def atomic_write(path, mode="w"):
+    """
+    Open a temporary file for 'path'; it replaces 'path' when the block
+    exits normally and is removed if the block or the rename fails.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, mode) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,308 @@
+import json
+import mmap
+import struct
+import sys
+from array import array
+from collections.abc import Mapping
+
+from reachability import Reachability
+
+# Binary dependency graph: '<name>.mtgraph', written by code/parser.py and
+# read by the VCD stage and the prompt builder.
+#
+# Layout (little-endian, every section padded to 8 bytes):
+#   MAGIC | header (n_nodes, n_drivers, n_edges, n_comps, n_closure,
+#                   names_size, flags)
+#   name_offsets    u32 * (n_nodes + 1)   into 'names'
+#   names           utf-8, all node names back to back
+#   edge_offsets    u32 * (n_nodes + 1)   CSR over node ids
+#   edge_targets    u32 * n_edges
+# only with HAS_REACH, the condensation of Reachability:
+#   comp_of         u32 * n_nodes         component of each node
+#   member_offsets  u32 * (n_comps + 1)   CSR over component ids:
+#   members         u32 * n_nodes         the nodes in each component
+#   closure_offsets u32 * (n_comps + 1)   CSR over component ids: sorted ids
+#   closure         u32 * n_closure       of the components reachable in 1+ hops
+#
+# Node ids put the drivers first, in the order of the source dict, so the
+# graph reads back as the same driver -> [driven] mapping. Every array is
+# mapped straight from the file, so loading costs an mmap and nothing else.
+# The closure is stored per component rather than per node, so a loop of
+# registers costs one row instead of one row per register.
+
+# bump the last byte when the layout changes (v2: per-component closure)
+MAGIC = b"MTGRAPH\x02"
+GRAPH_SUFFIX = ".mtgraph"
+HAS_REACH = 1
+
+_header = struct.Struct("<IIIIIII")
+
+
+def _pad(n):
+    return -n % 8
+
+
+def _set_bits(bits):
+    # ascending positions of the set bits of an int, a byte at a time
+    raw = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    for k, byte in enumerate(raw):
+        while byte:
+            low = byte & -byte
+            yield 8 * k + low.bit_length() - 1
+            byte ^= low
+
+
+def _csr(rows):
+    offsets = array('I', [0])
+    targets = array('I')
+    for row in rows:
+        targets.extend(row)
+        offsets.append(len(targets))
+    return offsets, targets
+
+
+def _labeler(names):
+    # Graphs may be keyed by SymbolTable ids, with 'names' (SymbolTable.names())
+    # giving their strings. A None node (a port bound to a nameless <varref>)
+    # gets an empty name.
+    if names is None:
+        return lambda n: "" if n is None else n
+    return lambda n: "" if n is None else names[n]
+
+
+def write_graph(path, edges, reachability=False, names=None):
+    """
+    Write 'edges' (driver -> iterable of driven) to 'path'. With
+    'reachability', the strongly connected components and the closure of
+    each one are stored as well. See _labeler for 'names'.
+    """
+    label = _labeler(names)
+    nodes = list(edges)
+    index = {n: i for i, n in enumerate(nodes)}
+    n_drivers = len(nodes)
+    edge_offsets = array('I', [0])
+    edge_targets = array('I')
+    for driver in list(nodes):
+        for d in edges[driver]:
+            i = index.get(d)
+            if i is None:
+                i = index[d] = len(nodes)
+                nodes.append(d)
+            edge_targets.append(i)
+        edge_offsets.append(len(edge_targets))
+    edge_offsets.extend([len(edge_targets)] * (len(nodes) - n_drivers))
+
+    encoded = [label(n).encode() for n in nodes]
+    name_offsets = array('I', [0])
+    for raw in encoded:
+        name_offsets.append(name_offsets[-1] + len(raw))
+    name_blob = b"".join(encoded)
+
+    sections = [name_offsets, name_blob, edge_offsets, edge_targets]
+    flags = 0
+    n_comps = n_closure = 0
+    if reachability:
+        flags |= HAS_REACH
+        reach = Reachability(edges)
+        n_comps = reach.n_components
+        comp_of = array('I', (reach.comp_of[reach.index[n]] for n in nodes))
+        members = [[] for _ in range(n_comps)]
+        for i, c in enumerate(comp_of):
+            members[c].append(i)
+        member_offsets, member_ids = _csr(members)
+        closure_offsets, closure = _csr(_set_bits(reach.closure_bits(c)) for c in range(n_comps))
+        n_closure = len(closure)
+        sections += [comp_of, member_offsets, member_ids, closure_offsets, closure]
+
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(_header.pack(len(nodes), n_drivers, len(edge_targets), n_comps, n_closure,
+                             len(name_blob), flags))
+        f.write(b"\0" * _pad(_header.size))
+        for section in sections:
+            if isinstance(section, array):
+                if sys.byteorder == "big":
+                    section.byteswap()
+                section = section.tobytes()
+            f.write(section)
+            f.write(b"\0" * _pad(len(section)))
+
+
+def write_graph_json(path, edges, names=None):
+    """The JSON export: {driver: [driven, ...]}. See _labeler for 'names'."""
+    if names is not None:
+        label = _labeler(names)
+        edges = {label(drv): [label(d) for d in driven] for drv, driven in edges.items()}
+    with open(path, "w") as f:
+        json.dump({drv: list(driven) for drv, driven in edges.items()}, f, indent=2)
+
+
+class DependencyGraph(Mapping):
+    """
+    Read-only view of a .mtgraph file. Behaves as the driver -> [driven]
+    dict the JSON format loads into, so it can be passed anywhere that dict
+    was; names are decoded on access and the arrays stay in the file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"'{path}' is not a MoonTrace dependency graph")
+        (self.n_nodes, self.n_drivers, self.n_edges, n_comps, n_closure,
+         names_size, flags) = _header.unpack_from(self._mm, len(MAGIC))
+
+        pos = len(MAGIC) + _header.size + _pad(_header.size)
+        self._name_offsets, pos = self._u32(pos, self.n_nodes + 1)
+        self._names = memoryview(self._mm)[pos:pos + names_size]
+        pos += names_size + _pad(names_size)
+        self._edge_offsets, pos = self._u32(pos, self.n_nodes + 1)
+        self._edge_targets, pos = self._u32(pos, self.n_edges)
+        self.has_reachability = bool(flags & HAS_REACH)
+        if self.has_reachability:
+            self.comp_of, pos = self._u32(pos, self.n_nodes)
+            member_offsets, pos = self._u32(pos, n_comps + 1)
+            member_ids, pos = self._u32(pos, self.n_nodes)
+            closure_offsets, pos = self._u32(pos, n_comps + 1)
+            closure, pos = self._u32(pos, n_closure)
+            self.members = _Rows(member_offsets, member_ids)
+            self.closure = _Rows(closure_offsets, closure)
+        self._index = None
+        self._reach = None
+
+    def __reduce__(self):
+        # the mapping is per process; another process maps the file again
+        return (DependencyGraph, (self.path,))
+
+    def _u32(self, pos, count):
+        end = pos + 4 * count
+        view = memoryview(self._mm)[pos:end]
+        if sys.byteorder == "big":
+            view = array('I', view)
+            view.byteswap()
+        else:
+            view = view.cast('I')
+        return view, end + _pad(4 * count)
+
+    def name(self, i):
+        return str(self._names[self._name_offsets[i]:self._name_offsets[i + 1]], 'utf-8')
+
+    def index(self, name):
+        """Node id of 'name', or None. The name table is indexed on first use."""
+        if self._index is None:
+            self._index = {self.name(i): i for i in range(self.n_nodes)}
+        return self._index.get(name)
+
+    def nodes(self):
+        return [self.name(i) for i in range(self.n_nodes)]
+
+    def successor_ids(self, i):
+        return self._edge_targets[self._edge_offsets[i]:self._edge_offsets[i + 1]]
+
+    def __getitem__(self, driver):
+        i = self.index(driver)
+        if i is None or i >= self.n_drivers:
+            raise KeyError(driver)
+        return [self.name(j) for j in self.successor_ids(i)]
+
+    def __iter__(self):
+        return (self.name(i) for i in range(self.n_drivers))
+
+    def __len__(self):
+        return self.n_drivers
+
+    def items(self):
+        # one pass over the arrays, without a name lookup per driver
+        for i in range(self.n_drivers):
+            yield self.name(i), [self.name(j) for j in self.successor_ids(i)]
+
+    def descendants(self, name):
+        """Names reachable from 'name' in one or more hops (needs stored reachability)."""
+        return list(self._stored_reachability().descendants(name))
+
+    def is_descendant(self, a, b):
+        return self._stored_reachability().is_descendant(a, b)
+
+    def _stored_reachability(self):
+        if not self.has_reachability:
+            raise ValueError("graph was written without reachability")
+        if self._reach is None:
+            self._reach = StoredReachability(self)
+        return self._reach
+
+    def reachability(self):
+        """
+        A Reachability over this graph: read from the stored closure when
+        the graph has one, computed from the edges otherwise.
+        """
+        if self.has_reachability:
+            return StoredReachability(self)
+        return Reachability(self)
+
+
+class _Rows:
+    """Rows of a CSR pair: row i is targets[offsets[i]:offsets[i + 1]]."""
+
+    def __init__(self, offsets, targets):
+        self.offsets = offsets
+        self.targets = targets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.targets[self.offsets[i]:self.offsets[i + 1]]
+
+
+class StoredReachability(Reachability):
+    """
+    Reachability backed by the condensation stored in a .mtgraph
+    (code/parser.py --reachability), so nothing is condensed or walked at
+    load time. Components and their members are read from the file, and a
+    component's closure bitset is built from its stored row the first time
+    it is queried; is_descendant and descendants are Reachability's own.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.nodes = graph.nodes()
+        self.index = {name: i for i, name in enumerate(self.nodes)}
+        self.drivers = set(self.nodes[:graph.n_drivers])
+        self.comp_of = graph.comp_of
+        self.members = graph.members
+        self._closure = {}
+
+    def __reduce__(self):
+        return (StoredReachability, (self.graph,))
+
+    def closure_bits(self, comp):
+        bits = self._closure.get(comp)
+        if bits is None:
+            bitmap = bytearray((len(self.members) + 7) // 8)
+            for c in self.graph.closure[comp]:
+                bitmap[c >> 3] |= 1 << (c & 7)
+            bits = self._closure[comp] = int.from_bytes(bitmap, "little")
+        return bits
+
+
+def load_dependency_graph(path):
+    """A DependencyGraph for .mtgraph files, the plain dict for JSON ones."""
+    with open(path, "rb") as f:
+        head = f.read(len(MAGIC))
+    if head == MAGIC:
+        return DependencyGraph(path)
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def graph_text(graph, names=None):
+    """
+    The graph as 'driver -> [driven, ...]' lines, as code/parser.py prints
+    it. See _labeler for 'names'.
+    """
+    if names is None:
+        return "\n".join(f"  {driver} -> {list(driven)}" for driver, driven in graph.items())
+    label = _labeler(names)
+    return "\n".join(f"  {label(driver)} -> {[label(d) for d in driven]}"
+                     for driver, driven in graph.items())
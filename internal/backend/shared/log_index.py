@@ -0,0 +1,281 @@
+import bisect
+import heapq
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from atomic_write import atomic_write
+
+# Inverted index over a text simulation log: '<log>.mtlidx', written by
+# vcd/vcd_parser.py next to the log as it is produced and read by the app
+# layer to pull the lines for a signal, a time range or a driver -> driven
+# pair without scanning the log.
+#
+# Layout (little-endian, every section padded to 8 bytes):
+#   MAGIC | header (n_signals, names_size, n_postings, n_driver_postings,
+#                   n_times, log_size)
+#   name_offsets    u64 * (n_signals + 1)   into 'names'
+#   names           utf-8, signal names back to back
+#   post_offsets    u64 * (n_signals + 1)   CSR over signal ids: byte offsets
+#   postings        u64 * n_postings        of the lines about the signal
+#   driver_offsets  u64 * (n_signals + 1)   CSR over signal ids: byte offsets
+#   driver_postings u64 * n_driver_postings of the '=> X possibly caused ...'
+#                                           lines where it is X
+#   times           i64 * n_times           each new time in the log and the
+#   time_offsets    u64 * n_times           offset of its first line
+#
+# A driver -> driven pair is the intersection of the driver's driver
+# postings with the driven signal's postings; nearly every cause line is a
+# pair of its own, so a table of pairs would be as large as the log.
+# 'log_size' is the size of the log the index was built for; an index for
+# a log of any other size is stale and is not used.
+
+MAGIC = b"MTLIDX\x01"
+LOG_INDEX_SUFFIX = ".mtlidx"
+
+_header = struct.Struct("<6Q")
+
+
+def _pad(n):
+    return -n % 8
+
+
+def _write_section(f, parts):
+    # one section from one or more arrays / byte strings, then its padding
+    size = 0
+    for part in parts:
+        if isinstance(part, array):
+            if sys.byteorder == "big":
+                part = array(part.typecode, part)
+                part.byteswap()
+            part = memoryview(part).cast('B')
+        f.write(part)
+        size += len(part)
+    f.write(b"\0" * _pad(size))
+
+
+def log_index_path_for(log_path):
+    return log_path + LOG_INDEX_SUFFIX
+
+
+class LogIndexWriter:
+    """
+    Collects the index while the log is written: call add(offset, record)
+    with the byte offset of each record's line (log_sink.TextSink does this
+    when given an index), then write() once the log is complete.
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.postings = []
+        self.driver_postings = []
+        self.times = array('q')
+        self.time_offsets = array('Q')
+        self._last_time = -2**63
+
+    def _sig(self, name):
+        i = self.ids.get(name)
+        if i is None:
+            i = self.ids[name] = len(self.postings)
+            self.postings.append(array('Q'))
+            self.driver_postings.append(array('Q'))
+        return i
+
+    def add(self, offset, record):
+        # Every record has a 'signal' the line is about; a Cause also has a
+        # 'driver'. The driver lists of MultipleDrivers lines are not
+        # indexed: they repeat for every change of a multiply-driven signal
+        # and would dominate the index.
+        time = record.time
+        if time > self._last_time:
+            self._last_time = time
+            self.times.append(time)
+            self.time_offsets.append(offset)
+        sig = self.ids.get(record.signal)
+        if sig is None:
+            sig = self._sig(record.signal)
+        self.postings[sig].append(offset)
+        driver = getattr(record, "driver", None)
+        if driver is not None:
+            drv = self.ids.get(driver)
+            if drv is None:
+                drv = self._sig(driver)
+            self.driver_postings[drv].append(offset)
+
+    def write(self, path, log_size):
+        encoded = [name.encode() for name in self.ids]
+        name_offsets = array('Q', [0])
+        for raw in encoded:
+            name_offsets.append(name_offsets[-1] + len(raw))
+        name_blob = b"".join(encoded)
+
+        # the posting lists are written one by one rather than joined first
+        post_offsets = array('Q', [0])
+        for p in self.postings:
+            post_offsets.append(post_offsets[-1] + len(p))
+        driver_offsets = array('Q', [0])
+        for p in self.driver_postings:
+            driver_offsets.append(driver_offsets[-1] + len(p))
+
+        header = _header.pack(len(encoded), len(name_blob), post_offsets[-1], driver_offsets[-1],
+                              len(self.times), log_size)
+        sections = [[name_offsets], [name_blob], [post_offsets], self.postings,
+                    [driver_offsets], self.driver_postings, [self.times], [self.time_offsets]]
+        try:
+            with atomic_write(path, "wb") as f:
+                f.write(MAGIC)
+                f.write(header)
+                f.write(b"\0" * _pad(len(MAGIC) + _header.size))
+                for parts in sections:
+                    _write_section(f, parts)
+        except OSError as e:
+            print(f"[Warning] Could not write log index {path}: {e}", file=sys.stderr)
+
+
+class LogIndex:
+    """
+    Queries over a simulation log through its index. Both files are mapped,
+    so a query touches only the index entries and log lines it returns.
+    Raises ValueError if the index is not one, or is stale for the log.
+    """
+
+    def __init__(self, log_path, index_path=None):
+        index_path = index_path or log_index_path_for(log_path)
+        with open(index_path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"'{index_path}' is not a MoonTrace log index")
+        (n_signals, names_size, n_postings, n_driver_postings,
+         n_times, self.log_size) = _header.unpack_from(self._mm, len(MAGIC))
+        if os.path.getsize(log_path) != self.log_size:
+            raise ValueError(f"'{index_path}' is stale for '{log_path}'")
+
+        pos = len(MAGIC) + _header.size
+        pos += _pad(pos)
+        self._name_offsets, pos = self._array(pos, 'Q', n_signals + 1)
+        self._names = memoryview(self._mm)[pos:pos + names_size]
+        pos += names_size + _pad(names_size)
+        self._post_offsets, pos = self._array(pos, 'Q', n_signals + 1)
+        self._postings, pos = self._array(pos, 'Q', n_postings)
+        self._driver_offsets, pos = self._array(pos, 'Q', n_signals + 1)
+        self._driver_postings, pos = self._array(pos, 'Q', n_driver_postings)
+        self._times, pos = self._array(pos, 'q', n_times)
+        self._time_offsets, pos = self._array(pos, 'Q', n_times)
+        self.n_signals = n_signals
+        self._index = None
+
+        with open(log_path, "rb") as f:
+            # mmap cannot map an empty file
+            self._log = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.log_size else b""
+
+    def _array(self, pos, typecode, count):
+        end = pos + 8 * count
+        view = memoryview(self._mm)[pos:end]
+        if sys.byteorder == "big":
+            view = array(typecode, view)
+            view.byteswap()
+        else:
+            view = view.cast(typecode)
+        return view, end + _pad(8 * count)
+
+    def name(self, i):
+        return str(self._names[self._name_offsets[i]:self._name_offsets[i + 1]], "utf-8")
+
+    def signals(self):
+        return [self.name(i) for i in range(self.n_signals)]
+
+    def signal_id(self, name):
+        """Id of 'name', or None if no line of the log names it."""
+        if self._index is None:
+            self._index = {self.name(i): i for i in range(self.n_signals)}
+        return self._index.get(name)
+
+    def time_at(self, offset):
+        """The time of the log block holding the line at 'offset' (None before the first)."""
+        k = bisect.bisect_right(self._time_offsets, offset)
+        return self._times[k - 1] if k else None
+
+    def time_span(self, t0, t1):
+        """Byte range [start, end) of the lines for times t0..t1."""
+        lo = bisect.bisect_left(self._times, t0)
+        hi = bisect.bisect_right(self._times, t1)
+        start = self._time_offsets[lo] if lo < len(self._times) else self.log_size
+        end = self._time_offsets[hi] if hi < len(self._times) else self.log_size
+        return start, max(start, end)
+
+    def _subject_offsets(self, i, t0, t1):
+        return self._clip(self._postings[self._post_offsets[i]:self._post_offsets[i + 1]], t0, t1)
+
+    def _driver_offsets_of(self, i, t0, t1):
+        return self._clip(self._driver_postings[self._driver_offsets[i]:self._driver_offsets[i + 1]], t0, t1)
+
+    def signal_offsets(self, signal, t0=None, t1=None):
+        """Offsets of the lines naming 'signal', optionally only for times t0..t1."""
+        i = self.signal_id(signal)
+        if i is None:
+            return []
+        offsets = []
+        # a signal that possibly caused its own change is on both lists
+        for o in heapq.merge(self._subject_offsets(i, t0, t1), self._driver_offsets_of(i, t0, t1)):
+            if not offsets or offsets[-1] != o:
+                offsets.append(o)
+        return offsets
+
+    def pair_offsets(self, driver, driven, t0=None, t1=None):
+        """Offsets of the lines where 'driver' possibly caused a change of 'driven'."""
+        d, s = self.signal_id(driver), self.signal_id(driven)
+        if d is None or s is None:
+            return []
+        small, large = self._driver_offsets_of(d, t0, t1), self._subject_offsets(s, t0, t1)
+        if len(small) > len(large):
+            small, large = large, small
+        offsets = []
+        for o in small:
+            k = bisect.bisect_left(large, o)
+            if k < len(large) and large[k] == o:
+                offsets.append(o)
+        return offsets
+
+    def _clip(self, offsets, t0, t1):
+        if t0 is None and t1 is None:
+            return offsets
+        start, end = self.time_span(t0 if t0 is not None else -2**63,
+                                    t1 if t1 is not None else 2**63 - 1)
+        return offsets[bisect.bisect_left(offsets, start):bisect.bisect_left(offsets, end)]
+
+    def line_at(self, offset):
+        end = self._log.find(b"\n", offset)
+        if end < 0:
+            end = self.log_size
+        return self._log[offset:end].decode()
+
+    def lines(self, offsets, limit=None):
+        if limit is not None:
+            offsets = offsets[:limit]
+        return [self.line_at(o) for o in offsets]
+
+    def lines_for_signal(self, signal, t0=None, t1=None, limit=None):
+        return self.lines(self.signal_offsets(signal, t0, t1), limit)
+
+    def lines_for_pair(self, driver, driven, t0=None, t1=None, limit=None):
+        return self.lines(self.pair_offsets(driver, driven, t0, t1), limit)
+
+    def lines_for_time(self, t0, t1, limit=None):
+        start, end = self.time_span(t0, t1)
+        if limit is None:
+            return self._log[start:end].decode().splitlines()
+        lines = []
+        while start < end and len(lines) < limit:
+            lines.append(self.line_at(start))
+            start += len(lines[-1].encode()) + 1
+        return lines
+
+
+def open_log_index(log_path):
+    """A LogIndex for 'log_path', or None if it has no usable index."""
+    try:
+        return LogIndex(log_path)
+    except (OSError, ValueError):
+        return None
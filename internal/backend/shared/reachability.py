@@ -0,0 +1,180 @@
+from array import array
+
+
+class Reachability:
+    """
+    Multi-hop reachability over a dependency graph (driver -> driven).
+
+    Strongly connected components (register feedback loops) are condensed
+    first, so the closure is computed over a DAG of components. Each
+    component's descendant set is a bitset over component ids, held in a
+    Python int, and is only computed the first time that component is
+    queried.
+
+    Drop-in for the old dict of descendant sets:
+      driver in reach           -> driver has outgoing edges
+      reach[driver]             -> lazy set-like view of its descendants
+      reach.is_descendant(a, b) -> b is reachable from a in one or more hops
+    """
+
+    def __init__(self, edges):
+        self.nodes = []
+        self.index = {}
+        succ = []
+        for driver, driven in edges.items():
+            a = self._node(driver, succ)
+            for d in driven:
+                succ[a].append(self._node(d, succ))
+        self.drivers = set(edges.keys())
+
+        self.comp_of, self.members = _tarjan_scc(succ)
+        n_comps = len(self.members)
+        self.comp_succ = [set() for _ in range(n_comps)]
+        self.cyclic = [len(m) > 1 for m in self.members]
+        for a, targets in enumerate(succ):
+            ca = self.comp_of[a]
+            for b in targets:
+                cb = self.comp_of[b]
+                if ca == cb:
+                    self.cyclic[ca] = True  # covers self-loops
+                else:
+                    self.comp_succ[ca].add(cb)
+        self._closure = [None] * n_comps
+
+    def _node(self, name, succ):
+        i = self.index.get(name)
+        if i is None:
+            i = self.index[name] = len(self.nodes)
+            self.nodes.append(name)
+            succ.append([])
+        return i
+
+    def closure_bits(self, comp):
+        """Bitset of components reachable from 'comp' in one or more hops."""
+        closure = self._closure
+        if closure[comp] is not None:
+            return closure[comp]
+        # Components come out of Tarjan in reverse topological order, so this
+        # post-order walk never revisits a component whose closure is known.
+        stack = [comp]
+        while stack:
+            c = stack[-1]
+            if closure[c] is not None:
+                stack.pop()
+                continue
+            missing = [d for d in self.comp_succ[c] if closure[d] is None]
+            if missing:
+                stack.extend(missing)
+                continue
+            bits = (1 << c) if self.cyclic[c] else 0
+            for d in self.comp_succ[c]:
+                bits |= (1 << d) | closure[d]
+            closure[c] = bits
+            stack.pop()
+        return closure[comp]
+
+    @property
+    def n_components(self):
+        return len(self.members)
+
+    def is_descendant(self, a, b):
+        ia = self.index.get(a)
+        ib = self.index.get(b)
+        if ia is None or ib is None:
+            return False
+        return bool(self.closure_bits(self.comp_of[ia]) >> self.comp_of[ib] & 1)
+
+    def descendants(self, a):
+        """Lazily yield every signal reachable from 'a'."""
+        ia = self.index.get(a)
+        if ia is None:
+            return
+        bits = self.closure_bits(self.comp_of[ia])
+        while bits:
+            low = bits & -bits
+            for m in self.members[low.bit_length() - 1]:
+                yield self.nodes[m]
+            bits ^= low
+
+    def __contains__(self, driver):
+        return driver in self.drivers
+
+    def __getitem__(self, driver):
+        if driver not in self.drivers:
+            raise KeyError(driver)
+        return DescendantSet(self, driver)
+
+
+class DescendantSet:
+    """Set-like view of one driver's descendants."""
+
+    def __init__(self, reach, driver):
+        self.reach = reach
+        self.driver = driver
+
+    def __contains__(self, sig):
+        return self.reach.is_descendant(self.driver, sig)
+
+    def __iter__(self):
+        return self.reach.descendants(self.driver)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"DescendantSet({self.driver!r})"
+
+
+def _tarjan_scc(succ):
+    """
+    Iterative Tarjan. Returns (comp_of, members): comp_of[node] is the
+    component id, members[comp] the nodes in it. Components are numbered in
+    reverse topological order (sinks first).
+    """
+    n = len(succ)
+    index_of = array('i', [-1]) * n
+    low = array('i', [0]) * n
+    on_stack = bytearray(n)
+    comp_of = array('i', [-1]) * n
+    members = []
+    stack = []
+    counter = 0
+
+    for root in range(n):
+        if index_of[root] != -1:
+            continue
+        work = [(root, 0)]
+        while work:
+            v, i = work[-1]
+            if i == 0:
+                index_of[v] = low[v] = counter
+                counter += 1
+                stack.append(v)
+                on_stack[v] = 1
+            targets = succ[v]
+            while i < len(targets):
+                w = targets[i]
+                i += 1
+                if index_of[w] == -1:
+                    work[-1] = (v, i)
+                    work.append((w, 0))
+                    break
+                if on_stack[w] and index_of[w] < low[v]:
+                    low[v] = index_of[w]
+            else:
+                work.pop()
+                if low[v] == index_of[v]:
+                    comp = []
+                    while True:
+                        w = stack.pop()
+                        on_stack[w] = 0
+                        comp_of[w] = len(members)
+                        comp.append(w)
+                        if w == v:
+                            break
+                    members.append(comp)
+                if work:
+                    u = work[-1][0]
+                    if low[v] < low[u]:
+                        low[u] = low[v]
+    return comp_of, members
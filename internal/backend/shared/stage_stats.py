@@ -0,0 +1,158 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # not on Windows
+    resource = None
+
+# Per-stage instrumentation for the parser entry points: wall time, peak
+# RSS and whatever counts the stage reports (events, edges, ...). Any stage
+# can additionally be run under cProfile or tracemalloc.
+#
+#   stats = StageStats(profile="cprofile", profile_stages={"parse_vcd"})
+#   with stats.stage("parse_vcd") as st:
+#       store, ids = parse_vcd_to_events(path)
+#       st["events"] = len(store)
+#   print(stats.summary(), file=sys.stderr)
+
+PROFILERS = ("cprofile", "tracemalloc")
+
+
+def _reset_peak_rss():
+    # Linux lets a process reset its own RSS high-water mark, which makes
+    # the peak per stage rather than per process so far.
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss():
+    """Peak resident set size in bytes, or None if unavailable."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class StageStats:
+    """
+    Collects one entry per stage, in the order the stages ran. 'profile'
+    ("cprofile" or "tracemalloc") wraps the stages named in
+    'profile_stages' (all stages if None); the profile is written to
+    'profile_out' (stderr by default) when the stage ends.
+    """
+
+    def __init__(self, profile=None, profile_stages=None, profile_out=None):
+        if profile is not None and profile not in PROFILERS:
+            raise ValueError(f"unknown profiler {profile!r}")
+        self.profile = profile
+        self.profile_stages = set(profile_stages) if profile_stages else None
+        self.profile_out = profile_out
+        self.stages = []
+        self.start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name, **counts):
+        entry = {"stage": name, **counts}
+        per_stage_rss = _reset_peak_rss()
+        profiling = self.profile and (self.profile_stages is None or name in self.profile_stages)
+        if profiling:
+            profiler = self._start_profile()
+        start = time.perf_counter()
+        try:
+            yield entry
+        finally:
+            entry["seconds"] = time.perf_counter() - start
+            if profiling:
+                self._stop_profile(name, profiler)
+            entry["peak_rss"] = _peak_rss()
+            entry["peak_rss_scope"] = "stage" if per_stage_rss else "process"
+            self.stages.append(entry)
+
+    def _start_profile(self):
+        if self.profile == "cprofile":
+            profiler = cProfile.Profile()
+            profiler.enable()
+            return profiler
+        tracemalloc.start(25)
+        return None
+
+    def _stop_profile(self, name, profiler):
+        out = self.profile_out or sys.stderr
+        print(f"--- {self.profile} profile of stage '{name}' ---", file=out)
+        if self.profile == "cprofile":
+            profiler.disable()
+            buf = io.StringIO()
+            pstats.Stats(profiler, stream=buf).sort_stats("cumulative").print_stats(25)
+            out.write(buf.getvalue())
+            return
+        snapshot = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"traced peak: {peak / 2**20:.1f} MiB", file=out)
+        for stat in snapshot.statistics("lineno")[:15]:
+            print(f"  {stat}", file=out)
+
+    def report(self):
+        return {
+            "pid": os.getpid(),
+            "total_seconds": time.perf_counter() - self.start,
+            "stages": self.stages,
+        }
+
+    def write_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+    def summary(self):
+        lines = ["=== Stage stats ==="]
+        for entry in self.stages:
+            rss = entry["peak_rss"]
+            rss = f"{rss / 2**20:8.1f} MiB" if rss is not None else "       n/a"
+            counts = ", ".join(f"{k}={v}" for k, v in entry.items()
+                               if k not in ("stage", "seconds", "peak_rss", "peak_rss_scope"))
+            lines.append(f"{entry['stage']:<20}{entry['seconds'] * 1000:10.1f} ms  {rss}  {counts}")
+        lines.append(f"{'total':<20}{(time.perf_counter() - self.start) * 1000:10.1f} ms")
+        return "\n".join(lines)
+
+
+def add_stats_arguments(arg_parser):
+    """The --stats/--stats-json/--profile options shared by the entry points."""
+    arg_parser.add_argument("--stats", action="store_true",
+                            help="print wall time, counts and peak RSS per stage to stderr")
+    arg_parser.add_argument("--stats-json", metavar="PATH",
+                            help="write the per-stage stats as JSON to PATH")
+    arg_parser.add_argument("--profile", choices=PROFILERS,
+                            help="run stages under this profiler and print the result to stderr")
+    arg_parser.add_argument("--profile-stage", action="append", metavar="STAGE",
+                            help="with --profile, only profile STAGE (repeatable; default: all)")
+
+
+def stats_from_args(args):
+    return StageStats(profile=args.profile, profile_stages=args.profile_stage)
+
+
+def finish_stats(stats, args):
+    if args.stats:
+        print(stats.summary(), file=sys.stderr)
+    if args.stats_json:
+        stats.write_json(args.stats_json)
@@ -0,0 +1,95 @@
+from array import array
+
+
+class SymbolTable:
+    """
+    Hierarchical names ("counter.u_counter_logic.count") interned as a
+    prefix tree with dense integer ids. Each id is one node of the tree: its
+    parent's id and its last dotted component, so a name is stored once per
+    distinct component rather than once per full path. Every prefix gets an
+    id too ("counter", "counter.u_counter_logic").
+
+    Building a child name is a single dict lookup on (parent id, component)
+    with no string concatenation; the full string is only put together by
+    name(). Any string round-trips, since names are split and joined on '.'.
+    """
+
+    ROOT = -1
+
+    def __init__(self):
+        self.parent = array('i')
+        self.component = []
+        self._ids = {}
+        self._names = {}
+
+    def __len__(self):
+        return len(self.component)
+
+    def child(self, parent, component):
+        """Id of 'component' under 'parent' (ROOT for a top-level name)."""
+        key = (parent, component)
+        i = self._ids.get(key)
+        if i is None:
+            i = self._ids[key] = len(self.component)
+            self.parent.append(parent)
+            self.component.append(component)
+        return i
+
+    def intern_path(self, parent, components):
+        for c in components:
+            parent = self.child(parent, c)
+        return parent
+
+    def intern_paths(self, parent, paths):
+        """
+        [intern_path(parent, p) for p in paths], in one call: stamping a
+        module's names under an instance prefix does this once per instance.
+        Entries that are not tuples come back as None.
+        """
+        ids = self._ids
+        out = []
+        for path in paths:
+            if not isinstance(path, tuple):
+                out.append(None)
+                continue
+            i = parent
+            for c in path:
+                j = ids.get((i, c))
+                if j is None:
+                    j = self.child(i, c)
+                i = j
+            out.append(i)
+        return out
+
+    def intern(self, name):
+        return self.intern_path(self.ROOT, name.split('.'))
+
+    def lookup(self, name):
+        """Id of 'name', or None if it was never interned."""
+        i = self.ROOT
+        for c in name.split('.'):
+            i = self._ids.get((i, c))
+            if i is None:
+                return None
+        return i
+
+    def name(self, i):
+        """The full dotted name of id 'i'. Cached along with its prefixes."""
+        name = self._names.get(i)
+        if name is None:
+            p = self.parent[i]
+            if p == self.ROOT:
+                name = self.component[i]
+            else:
+                name = self.name(p) + "." + self.component[i]
+            self._names[i] = name
+        return name
+
+    def names(self):
+        """Every name, indexed by id. A parent always has a lower id than its children."""
+        parent, component = self.parent, self.component
+        names = []
+        for i, c in enumerate(component):
+            p = parent[i]
+            names.append(c if p == self.ROOT else names[p] + "." + c)
+        return names
@@ -0,0 +1,169 @@
+from array import array
+
+
+class EventStore:
+    """
+    Columnar storage for VCD value changes.
+
+    Event i is (times[i], signals[sigs[i]], values[val_offsets[i]:val_offsets[i + 1]]):
+      - times:       int64 simulation time
+      - sigs:        int32 index into 'signals' (VCD id codes or full names)
+      - val_offsets: int64 offsets into 'values', one packed ASCII buffer
+
+    That is ~20 bytes per value change instead of a tuple of Python objects.
+    Iterating or indexing still gives (time, signal, value) tuples, so the
+    store can be passed anywhere a list of events was expected. The columns
+    may also be read-only memoryviews (see vcd_cache), in which case the
+    store cannot be appended to.
+    """
+
+    def __init__(self, signals=()):
+        self.times = array('q')
+        self.sigs = array('i')
+        self.val_offsets = array('q', [0])
+        self.values = bytearray()
+        self.signals = list(signals)
+        self._sig_index = {s: i for i, s in enumerate(self.signals)}
+
+    def signal_index(self, sig):
+        idx = self._sig_index.get(sig)
+        if idx is None:
+            idx = len(self.signals)
+            self.signals.append(sig)
+            self._sig_index[sig] = idx
+        return idx
+
+    def append(self, t, sig, val):
+        self.append_indexed(t, self.signal_index(sig), val.encode('ascii'))
+
+    def append_indexed(self, t, sig_idx, raw_val):
+        self.times.append(t)
+        self.sigs.append(sig_idx)
+        self.values += raw_val
+        self.val_offsets.append(len(self.values))
+
+    def raw_value(self, i):
+        return bytes(self.values[self.val_offsets[i]:self.val_offsets[i + 1]])
+
+    def value(self, i):
+        return str(self.values[self.val_offsets[i]:self.val_offsets[i + 1]], 'ascii')
+
+    def __len__(self):
+        return len(self.times)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        return (self.times[i], self.signals[self.sigs[i]], self.value(i))
+
+    def __iter__(self):
+        times, sigs, offs, values, signals = (
+            self.times, self.sigs, self.val_offsets, self.values, self.signals)
+        for i in range(len(times)):
+            yield (times[i], signals[sigs[i]], str(values[offs[i]:offs[i + 1]], 'ascii'))
+
+    def relabel(self, names):
+        """
+        Return a store whose signals are renamed through 'names' (old signal ->
+        new name). Several old signals may collapse onto one name. The time
+        and value columns are shared, only the signal column is rewritten.
+        """
+        out = EventStore()
+        remap = array('i', (out.signal_index(names.get(s, s)) for s in self.signals))
+        out.times = self.times
+        out.val_offsets = self.val_offsets
+        out.values = self.values
+        out.sigs = array('i', (remap[s] for s in self.sigs))
+        return out
+
+    def dedup_changes(self):
+        """
+        Drop events that do not change their signal's value. Works on the
+        signal index column with one last-value slot per signal, so there is
+        no per-event hashing of names.
+        """
+        out = ChangeStore(self.signals)
+        n_sigs = len(self.signals)
+        last_val = [None] * n_sigs
+        last_change = array('q', [-1]) * n_sigs
+
+        times, sigs, offs, values = self.times, self.sigs, self.val_offsets, self.values
+        for i in range(len(times)):
+            s = sigs[i]
+            raw = values[offs[i]:offs[i + 1]]
+            if raw != last_val[s]:
+                last_val[s] = raw
+                out.prev.append(last_change[s])
+                last_change[s] = len(out.times)
+                out.append_indexed(times[i], s, raw)
+        return out
+
+
+class ChangeStore(EventStore):
+    """
+    Output of compute_signal_changes in columnar form. 'prev' holds the index
+    of the same signal's previous change (-1 if none), which is where the
+    old value comes from. Iterates as (time, signal, old_value, new_value).
+
+    A store cut out of a larger one (see slice_columns) keeps the old values
+    that lie before the cut in 'seeds': change index -> raw old value.
+    """
+
+    def __init__(self, signals=()):
+        super().__init__(signals)
+        self.prev = array('q')
+        self.seeds = {}
+
+    def old_value(self, i):
+        p = self.prev[i]
+        if p >= 0:
+            return self.value(p)
+        raw = self.seeds.get(i)
+        return str(raw, 'ascii') if raw is not None else None
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        return (self.times[i], self.signals[self.sigs[i]], self.old_value(i), self.value(i))
+
+    def __iter__(self):
+        times, sigs, offs, values, signals, prev, seeds = (
+            self.times, self.sigs, self.val_offsets, self.values, self.signals, self.prev, self.seeds)
+        for i in range(len(times)):
+            p = prev[i]
+            if p >= 0:
+                old = str(values[offs[p]:offs[p + 1]], 'ascii')
+            else:
+                raw = seeds.get(i)
+                old = str(raw, 'ascii') if raw is not None else None
+            yield (times[i], signals[sigs[i]], old, str(values[offs[i]:offs[i + 1]], 'ascii'))
+
+    def slice_columns(self, lo, hi):
+        """
+        Changes lo..hi-1 as a tuple of compact columns, without the signal
+        names, e.g. to hand a time shard to another process; from_columns
+        turns it back into a store. Costs ~30 bytes per change to pickle.
+        """
+        offs, values, prev = self.val_offsets, self.values, self.prev
+        base = offs[lo]
+        val_offsets = array('q', (o - base for o in offs[lo:hi + 1]))
+        local_prev = array('q')
+        seeds = {}
+        for i in range(lo, hi):
+            p = prev[i]
+            if p >= lo:
+                local_prev.append(p - lo)
+            else:
+                local_prev.append(-1)
+                if p >= 0:
+                    seeds[i - lo] = bytes(values[offs[p]:offs[p + 1]])
+                elif i in self.seeds:
+                    seeds[i - lo] = self.seeds[i]
+        return (array('q', self.times[lo:hi]), array('i', self.sigs[lo:hi]), val_offsets,
+                bytes(values[base:offs[hi]]), local_prev, seeds)
+
+    @classmethod
+    def from_columns(cls, signals, columns):
+        out = cls(signals)
+        out.times, out.sigs, out.val_offsets, out.values, out.prev, out.seeds = columns
+        return out
@@ -0,0 +1,172 @@
+import json
+import struct
+from collections import namedtuple
+
+# Structured analysis records. analyze_dependency_records yields these; a
+# sink turns them into output as they arrive, so nothing is buffered.
+
+Change = namedtuple("Change", "time signal old new")
+Cause = namedtuple("Cause", "time driver signal new look_time")
+MultipleDrivers = namedtuple("MultipleDrivers", "time signal drivers")
+
+
+def format_record(record):
+    """The simulation-log line for 'record'."""
+    if isinstance(record, Change):
+        return f"Time {record.time}: {record.signal} changed from {record.old} to {record.new}."
+    if isinstance(record, Cause):
+        return (f"   => {record.driver} possibly caused {record.signal} to change to {record.new} "
+                f"at time {record.look_time}")
+    return (f"Time {record.time}: Signal {record.signal} has multiple possible drivers: "
+            f"{', '.join(record.drivers)}")
+
+
+class LogSink:
+    """Base sink: write(record) for each record, then close()."""
+
+    def __init__(self, f, flush=False):
+        self.f = f
+        self.flush = flush
+
+    def write(self, record):
+        self._write(record)
+        if self.flush:
+            self.f.flush()
+
+    def _write(self, record):
+        raise NotImplementedError
+
+    def close(self):
+        self.f.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TextSink(LogSink):
+    """
+    The plain-text simulation log, one line per record. With 'index' (a
+    log_index.LogIndexWriter), each record is added to it with the byte
+    offset of its line, counted from 'offset'.
+    """
+
+    def __init__(self, f, flush=False, index=None, offset=0):
+        super().__init__(f, flush)
+        self.index = index
+        self.offset = offset
+
+    def _write(self, record):
+        line = format_record(record) + "\n"
+        self.f.write(line)
+        if self.index is not None:
+            self.index.add(self.offset, record)
+            self.offset += len(line.encode())
+
+
+class JsonlSink(LogSink):
+    """One JSON object per line, tagged with the record kind."""
+
+    KINDS = {Change: "change", Cause: "cause", MultipleDrivers: "multiple_drivers"}
+
+    def _write(self, record):
+        obj = {"kind": self.KINDS[type(record)], **record._asdict()}
+        self.f.write(json.dumps(obj) + "\n")
+
+
+# Binary log (BinarySink / read_binary_log), little-endian:
+#
+#   MAGIC, then a stream of tagged records
+#   'S' u32 len, utf-8       defines the next string id (signal names)
+#   'C' i64 time, u32 sig, value old, value new
+#   'A' i64 time, u32 driver, u32 sig, value new, i64 look_time
+#   'M' i64 time, u32 sig, u32 n, n * u32 driver
+#
+# A value is u32 len + ascii, with len NO_VALUE standing for None. Signal
+# names are written once and referred to by id afterwards.
+
+MAGIC = b"MTLOG\x01"
+NO_VALUE = 0xFFFFFFFF
+
+_u32 = struct.Struct("<I")
+_change = struct.Struct("<cqI")
+_cause = struct.Struct("<cqII")
+_multi = struct.Struct("<cqII")
+_i64 = struct.Struct("<q")
+
+
+class BinarySink(LogSink):
+    """Compact binary log; 'f' must be opened in binary mode."""
+
+    def __init__(self, f, flush=False):
+        super().__init__(f, flush)
+        self.ids = {}
+        f.write(MAGIC)
+
+    def _sig(self, name):
+        i = self.ids.get(name)
+        if i is None:
+            i = self.ids[name] = len(self.ids)
+            raw = name.encode()
+            self.f.write(b"S" + _u32.pack(len(raw)) + raw)
+        return i
+
+    def _value(self, val):
+        if val is None:
+            return _u32.pack(NO_VALUE)
+        raw = val.encode("ascii")
+        return _u32.pack(len(raw)) + raw
+
+    def _write(self, record):
+        if isinstance(record, Change):
+            sig = self._sig(record.signal)
+            self.f.write(_change.pack(b"C", record.time, sig)
+                         + self._value(record.old) + self._value(record.new))
+        elif isinstance(record, Cause):
+            driver, sig = self._sig(record.driver), self._sig(record.signal)
+            self.f.write(_cause.pack(b"A", record.time, driver, sig)
+                         + self._value(record.new) + _i64.pack(record.look_time))
+        else:
+            sig = self._sig(record.signal)
+            drivers = [self._sig(d) for d in record.drivers]
+            self.f.write(_multi.pack(b"M", record.time, sig, len(drivers))
+                         + b"".join(_u32.pack(d) for d in drivers))
+
+
+def read_binary_log(f):
+    """Yield the records of a log written by BinarySink."""
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError("not a MoonTrace binary log")
+    names = []
+
+    def u32():
+        return _u32.unpack(f.read(4))[0]
+
+    def value():
+        n = u32()
+        return None if n == NO_VALUE else f.read(n).decode("ascii")
+
+    while True:
+        tag = f.read(1)
+        if not tag:
+            return
+        if tag == b"S":
+            names.append(f.read(u32()).decode())
+        elif tag == b"C":
+            _, t, sig = _change.unpack(tag + f.read(_change.size - 1))
+            old = value()
+            yield Change(t, names[sig], old, value())
+        elif tag == b"A":
+            _, t, driver, sig = _cause.unpack(tag + f.read(_cause.size - 1))
+            new = value()
+            yield Cause(t, names[driver], names[sig], new, _i64.unpack(f.read(8))[0])
+        elif tag == b"M":
+            _, t, sig, n = _multi.unpack(tag + f.read(_multi.size - 1))
+            yield MultipleDrivers(t, names[sig], tuple(names[u32()] for _ in range(n)))
+        else:
+            raise ValueError(f"bad record tag {tag!r}")
+
+
+SINKS = {"text": TextSink, "jsonl": JsonlSink, "binary": BinarySink}
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+
+from atomic_write import atomic_write
+from event_store import EventStore
+
+# Sidecar cache of a parsed VCD: '<dump>.mtcache' next to the dump.
+#
+# Layout:
+#   MAGIC | u64 header length | JSON header | pad to 8 |
+#   times (int64 * n) | val_offsets (int64 * (n + 1)) | sigs (int32 * n) | values
+#
+# The columns are mapped straight back as memoryviews, so loading a cached
+# dump costs an mmap and a small JSON parse regardless of its size.
+
+# bump when the parsed representation changes (v2: hierarchical names,
+# v3: every alias name of an id code)
+MAGIC = b"MTVCDC3\n"
+CACHE_SUFFIX = ".mtcache"
+
+_SAMPLE_SIZE = 1 << 20
+_SAMPLE_COUNT = 16
+
+
+def cache_path_for(vcd_file_path):
+    return vcd_file_path + CACHE_SUFFIX
+
+
+def vcd_fingerprint(vcd_file_path):
+    """
+    Identity of a dump: resolved path, size, mtime and a content hash. The
+    hash covers the first and last MiB plus evenly spaced 1 MiB samples in
+    between, which catches rewrites that keep size and mtime without reading
+    a multi-GB file end to end on every run.
+    """
+    st = os.stat(vcd_file_path)
+    h = hashlib.blake2b(digest_size=16)
+    with open(vcd_file_path, 'rb') as f:
+        if st.st_size <= _SAMPLE_SIZE * (_SAMPLE_COUNT + 2):
+            h.update(f.read())
+        else:
+            stride = (st.st_size - _SAMPLE_SIZE) // (_SAMPLE_COUNT + 1)
+            for k in range(_SAMPLE_COUNT + 2):
+                f.seek(k * stride)
+                h.update(f.read(_SAMPLE_SIZE))
+    return {
+        "path": os.path.realpath(vcd_file_path),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "hash": h.hexdigest(),
+    }
+
+
+def save_cache(cache_path, key, store, id_to_signal):
+    header = json.dumps({
+        "key": key,
+        "byteorder": sys.byteorder,
+        "n_events": len(store),
+        "n_values": len(store.values),
+        "signals": store.signals,
+        "id_to_signal": id_to_signal,
+    }).encode()
+    pad = -(len(MAGIC) + 8 + len(header)) % 8
+
+    with atomic_write(cache_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        f.write(b'\0' * pad)
+        for column in (store.times, store.val_offsets, store.sigs, store.values):
+            f.write(column)
+
+
+def load_cache(cache_path, key):
+    """
+    Return (EventStore, id_to_signal) backed by the mapped cache file, or
+    None if there is no cache or it was written for a different dump.
+    """
+    try:
+        f = open(cache_path, 'rb')
+    except OSError:
+        return None
+    with f:
+        if os.fstat(f.fileno()).st_size < len(MAGIC) + 8:
+            return None
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    try:
+        if mm[:len(MAGIC)] != MAGIC:
+            return None
+        (header_len,) = struct.unpack_from('<Q', mm, len(MAGIC))
+        pos = len(MAGIC) + 8
+        header = json.loads(mm[pos:pos + header_len])
+        if header["key"] != key or header["byteorder"] != sys.byteorder:
+            return None
+        pos += header_len + (-(pos + header_len) % 8)
+    except (ValueError, KeyError, struct.error):
+        return None
+
+    n = header["n_events"]
+    if pos + 20 * n + 8 + header["n_values"] > len(mm):
+        return None  # truncated write
+    view = memoryview(mm)
+    store = EventStore(header["signals"])
+    store.times = view[pos:pos + 8 * n].cast('q')
+    pos += 8 * n
+    store.val_offsets = view[pos:pos + 8 * (n + 1)].cast('q')
+    pos += 8 * (n + 1)
+    store.sigs = view[pos:pos + 4 * n].cast('i')
+    pos += 4 * n
+    store.values = view[pos:pos + header["n_values"]]
+    return store, header["id_to_signal"]
+
+
+def cached_parse(vcd_file_path, parse):
+    """
+    parse(vcd_file_path) -> (EventStore, id_to_signal), memoized on disk.
+    A stale or unreadable cache is simply re-parsed and overwritten.
+    """
+    key = vcd_fingerprint(vcd_file_path)
+    cache_path = cache_path_for(vcd_file_path)
+    hit = load_cache(cache_path, key)
+    if hit is not None:
+        return hit
+
+    store, id_to_signal = parse(vcd_file_path)
+    try:
+        save_cache(cache_path, key, store, id_to_signal)
+    except OSError as e:
+        print(f"[Warning] Could not write VCD cache {cache_path}: {e}", file=sys.stderr)
+    return store, id_to_signal
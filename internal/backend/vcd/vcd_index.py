@@ -0,0 +1,247 @@
+import bisect
+import io
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from atomic_write import atomic_write
+from vcd_cache import vcd_fingerprint
+
+# Sidecar timestamp index for a VCD: '<dump>.mtidx'.
+#
+# Layout:
+#   MAGIC | u64 header length | JSON header | pad to 8 |
+#   times          (int64 * n)        time of each checkpoint's '#time' line
+#   offsets        (int64 * n)        byte offset of that line in the dump
+#   state_offsets  (int64 * (n + 1))  into 'states'
+#   states         one section per checkpoint: 'id value' lines
+#
+# A checkpoint is the full signal state in front of its '#time' line, one
+# per CHECKPOINT_STRIDE bytes, so the state at any t0 can be rebuilt by
+# replaying at most one stride. A window bisects the mapped times and
+# decodes the state of a single checkpoint; the others are never read.
+#
+# Checkpoint states keep last-write order, so replaying them through
+# compute_signal_changes resolves id codes that share a name the same way a
+# full pass would.
+
+MAGIC = b"MTVIDX\n"
+INDEX_SUFFIX = ".mtidx"
+INDEX_VERSION = 4  # v2: hierarchical names, v3: every alias name, v4: binary layout
+CHECKPOINT_STRIDE = 16 * 1024 * 1024
+
+
+def index_path_for(vcd_file_path):
+    return vcd_file_path + INDEX_SUFFIX
+
+
+def _read_header(f):
+    from vcd_parser import parse_vcd_header
+
+    lines = []
+    for line in iter(f.readline, b''):
+        lines.append(line)
+        if line.lstrip().startswith(b'$enddefinitions'):
+            break
+    id_to_signal = parse_vcd_header(io.StringIO(b''.join(lines).decode()))
+    return id_to_signal, f.tell()
+
+
+def _value_change(line):
+    c = line[:1]
+    if (c == b'0' or c == b'1') and len(line) > 1:
+        return line[1:].decode(), c.decode()
+    if c == b'b':
+        parts = line.split()
+        if len(parts) == 2:
+            return parts[1].decode(), parts[0][1:].decode()
+    return None
+
+
+def _parse_time(line):
+    try:
+        return int(line[1:])
+    except ValueError:
+        return None
+
+
+def _encode_state(state):
+    return "".join(f"{vid} {val}\n" for vid, val in state.items()).encode()
+
+
+class VcdIndex:
+    """
+    The checkpoints of an index held in 'buf' (the mapped sidecar, or the
+    bytes just built). 'times' and 'offsets' are int64 views; a checkpoint's
+    state is only decoded when asked for. Raises ValueError if 'buf' is not
+    an index for 'key'.
+    """
+
+    def __init__(self, buf, key):
+        if buf[:len(MAGIC)] != MAGIC or len(buf) < len(MAGIC) + 8:
+            raise ValueError("not a VCD index")
+        try:
+            (header_len,) = struct.unpack_from('<Q', buf, len(MAGIC))
+            pos = len(MAGIC) + 8
+            header = json.loads(bytes(buf[pos:pos + header_len]))
+            if (header["version"] != INDEX_VERSION or header["key"] != key
+                    or header["byteorder"] != sys.byteorder):
+                raise ValueError("stale VCD index")
+            n = header["n_checkpoints"]
+        except (KeyError, TypeError, struct.error) as e:
+            raise ValueError(f"unreadable VCD index: {e}")
+        pos += header_len + (-(pos + header_len) % 8)
+        if pos + 8 * (3 * n + 1) > len(buf):
+            raise ValueError("truncated VCD index")
+
+        view = memoryview(buf)
+        self.key = key
+        self.id_to_signal = header["id_to_signal"]
+        self.times = view[pos:pos + 8 * n].cast('q')
+        pos += 8 * n
+        self.offsets = view[pos:pos + 8 * n].cast('q')
+        pos += 8 * n
+        self._state_offsets = view[pos:pos + 8 * (n + 1)].cast('q')
+        pos += 8 * (n + 1)
+        self._states = view[pos:]
+        if self._state_offsets[-1] > len(self._states):
+            raise ValueError("truncated VCD index")
+
+    def __len__(self):
+        return len(self.times)
+
+    def checkpoint(self, k):
+        """(time, offset, state) of checkpoint k; state maps id code -> value."""
+        raw = self._states[self._state_offsets[k]:self._state_offsets[k + 1]]
+        state = {}
+        for line in bytes(raw).decode().splitlines():
+            vid, val = line.split(" ")
+            state[vid] = val
+        return self.times[k], self.offsets[k], state
+
+
+def build_vcd_index(vcd_file_path, checkpoint_stride=CHECKPOINT_STRIDE):
+    """
+    One streaming pass over the dump. Writes and returns the index.
+    """
+    times = array('q')
+    offsets = array('q')
+    states = []
+    state = {}
+
+    with open(vcd_file_path, 'rb') as f:
+        id_to_signal, header_end = _read_header(f)
+        times.append(0)
+        offsets.append(header_end)
+        states.append(b"")
+        last_checkpoint = offset = header_end
+
+        for line in f:
+            s = line.strip()
+            if s[:1] == b'#':
+                t = _parse_time(s)
+                if t is not None and offset - last_checkpoint >= checkpoint_stride:
+                    times.append(t)
+                    offsets.append(offset)
+                    states.append(_encode_state(state))
+                    last_checkpoint = offset
+            else:
+                change = _value_change(s)
+                if change:
+                    vid, val = change
+                    state.pop(vid, None)
+                    state[vid] = val
+            offset += len(line)
+
+    key = vcd_fingerprint(vcd_file_path)
+    header = json.dumps({
+        "version": INDEX_VERSION,
+        "key": key,
+        "byteorder": sys.byteorder,
+        "n_checkpoints": len(times),
+        "id_to_signal": id_to_signal,
+    }).encode()
+    state_offsets = array('q', [0])
+    for raw in states:
+        state_offsets.append(state_offsets[-1] + len(raw))
+    parts = [MAGIC, struct.pack('<Q', len(header)), header,
+             b'\0' * (-(len(MAGIC) + 8 + len(header)) % 8),
+             times, offsets, state_offsets] + states
+    with atomic_write(index_path_for(vcd_file_path), 'wb') as f:
+        for part in parts:
+            f.write(part)
+    return VcdIndex(b"".join(parts), key)
+
+
+def load_vcd_index(vcd_file_path, build=True):
+    """
+    Load the sidecar index, rebuilding it when missing or stale (unless
+    'build' is False, in which case None is returned).
+    """
+    try:
+        with open(index_path_for(vcd_file_path), 'rb') as f:
+            if os.fstat(f.fileno()).st_size:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                return VcdIndex(mm, vcd_fingerprint(vcd_file_path))
+    except (OSError, ValueError):
+        pass
+    return build_vcd_index(vcd_file_path) if build else None
+
+
+def extract_window(vcd_file_path, t0, t1, index=None):
+    """
+    Events with t0 <= time <= t1, read by seeking instead of parsing the
+    whole dump. Returns (events, id_to_signal, state_at_t0): 'events' is an
+    iterator of (time, var_id, value) and 'state_at_t0' maps every id code
+    seen before t0 to its value just before t0, in last-write order.
+    """
+    if index is None:
+        index = load_vcd_index(vcd_file_path)
+
+    # a checkpoint is the state in front of its '#time' line, so it may be
+    # used for any t0 >= that time
+    k = max(bisect.bisect_right(index.times, t0) - 1, 0)
+    current_time, offset, state = index.checkpoint(k)
+
+    f = open(vcd_file_path, 'rb')
+    f.seek(offset)
+    reached = False
+    for line in f:
+        s = line.strip()
+        if s[:1] == b'#':
+            t = _parse_time(s)
+            if t is not None:
+                current_time = t
+                if t >= t0:
+                    reached = True
+                    break
+            continue
+        change = _value_change(s)
+        if change:
+            vid, val = change
+            state.pop(vid, None)
+            state[vid] = val
+
+    events = _iter_window(f, current_time, t1, reached and current_time <= t1)
+    return events, index.id_to_signal, state
+
+
+def _iter_window(f, current_time, t1, in_range):
+    with f:
+        if not in_range:
+            return
+        for line in f:
+            s = line.strip()
+            if s[:1] == b'#':
+                t = _parse_time(s)
+                if t is not None:
+                    if t > t1:
+                        return
+                    current_time = t
+                continue
+            change = _value_change(s)
+            if change:
+                yield (current_time, change[0], change[1])
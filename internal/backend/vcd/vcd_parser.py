@@ -1,185 +1,948 @@
+import argparse
+import bisect
+import io
+import itertools
+import mmap
 import re
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from collections import defaultdict, deque
-import json
 import sys
 import os
+import time
 from pathlib import Path
 
-def parse_vcd_to_events(vcd_file_path):
-    events = []
-    current_time = 0
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "shared"))
+
+from dep_graph import GRAPH_SUFFIX, DependencyGraph, StoredReachability, load_dependency_graph
+from event_store import ChangeStore, EventStore
+from log_index import LogIndexWriter, log_index_path_for
+from log_sink import SINKS, Cause, Change, MultipleDrivers, TextSink, format_record
+from reachability import Reachability
+from stage_stats import add_stats_arguments, finish_stats, stats_from_args
+from vcd_cache import cached_parse
+from vcd_index import extract_window
+
+def parse_vcd_header(f):
+    """
+    Read the VCD declaration section up to '$enddefinitions', returning
+    id_to_signal: id code -> [full hierarchical names], built from the
+    enclosing $scope names with the same dotted convention as code/parser.py
+    (e.g. "TOP.counter.u_counter_logic.count"). A code has one name per $var
+    declared with it, in declaration order: Verilator gives a net the same
+    code in every scope it is visible in, e.g. a clock passed down through
+    ports. 'f' is left positioned at the first value-change line.
+    """
     id_to_signal = {}
-    
-    with open(vcd_file_path, 'r') as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-    
-            if line.startswith('$var '):
-                match = re.match(
-                    r'^\$var\s+\S+\s+(\d+)\s+(\S+)\s+(\S+).*\$end',
-                    line
-                )
-                if match:
-                    width_str, var_id, var_name = match.groups()
-                    id_to_signal[var_id] = var_name
-                continue
-            
-            if line.startswith('#'):
-                try:
-                    current_time = int(line[1:])
-                except ValueError:
-                    pass
-                continue
-            
-
-            if (line[0] in ['0','1']) and len(line) > 1:
-                new_val = line[0]
-                var_id = line[1:]
-                events.append((current_time, var_id, new_val))
-                continue
-            
-            if line.startswith('b'):
-                parts = line.split()
-                if len(parts) == 2:
-                    bin_val = parts[0][1:]  # remember to remove the leading 'b'
-                    var_id = parts[1]
-                    events.append((current_time, var_id, bin_val))
-                continue
-
-    events.sort(key=lambda x: x[0])  # sort by time
-    return events, id_to_signal
-
-def label_events_with_names(events, id_to_signal, dependency_graph):
-
-    labeled = []
-    for (t, vid, val) in events:
-        short_name = id_to_signal.get(vid, f"<unknown:{vid}>")
-        
-        if short_name in dependency_graph:
-            full_name = short_name
-        else:
-            candidates = [k for k in dependency_graph.keys() if short_name in k]
-            values = [k for k in dependency_graph.values()]
-            print("values",values)
-            if candidates:
-                full_name = candidates[0]
-            elif values:
-                full_name = values[0][0]
+    scopes = []
+    for line in f:
+        line = line.strip()
+        if line.startswith('$var '):
+            _add_var(line, id_to_signal, scopes)
+        elif line.startswith('$scope'):
+            parts = line.split()  # $scope module <name> $end
+            if len(parts) >= 3:
+                scopes.append(parts[2])
+        elif line.startswith('$upscope'):
+            if scopes:
+                scopes.pop()
+        elif line.startswith('$enddefinitions'):
+            break
+    return id_to_signal
+
+
+def _add_var(line, id_to_signal, scopes=()):
+    match = re.match(
+        r'^\$var\s+\S+\s+(\d+)\s+(\S+)\s+(\S+).*\$end',
+        line
+    )
+    if match:
+        width_str, var_id, var_name = match.groups()
+        names = id_to_signal.setdefault(var_id, [])
+        name = ".".join([*scopes, var_name])
+        if name not in names:
+            names.append(name)
+
+
+def _iter_value_changes(f, id_to_signal):
+    with f:
+        yield from _value_changes(f, id_to_signal)
+
+
+def _value_changes(lines, id_to_signal):
+    current_time = 0
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+
+        if line.startswith('$var '):
+            _add_var(line, id_to_signal)
+            continue
+
+        if line.startswith('#'):
+            try:
+                current_time = int(line[1:])
+            except ValueError:
+                pass
+            continue
+
+        if (line[0] in ['0','1']) and len(line) > 1:
+            new_val = line[0]
+            var_id = line[1:]
+            yield (current_time, var_id, new_val)
+            continue
+
+        if line.startswith('b'):
+            parts = line.split()
+            if len(parts) == 2:
+                bin_val = parts[0][1:]  # remember to remove the leading 'b'
+                var_id = parts[1]
+                yield (current_time, var_id, bin_val)
+            continue
+
+
+def iter_vcd_events(vcd_file_path):
+    """
+    Streaming variant of parse_vcd_to_events. The header is read eagerly so
+    id_to_signal is complete on return; the returned iterator then yields
+    (time, var_id, value) in file order without holding the dump in memory.
+    VCD timestamps are monotonic, so file order is already time order.
+    """
+    f = open(vcd_file_path, 'r')
+    try:
+        id_to_signal = parse_vcd_header(f)
+    except Exception:
+        f.close()
+        raise
+    return _iter_value_changes(f, id_to_signal), id_to_signal
+
+
+def follow_vcd_events(vcd_file_path, poll_interval=0.5, idle_timeout=None):
+    """
+    Like iter_vcd_events, but for a dump that is still being written: at end
+    of file the iterator waits for more lines instead of stopping, so events
+    come out while the simulator runs. A trailing partial line is held back
+    until its newline arrives. Iteration ends once the file has not grown
+    for 'idle_timeout' seconds (never, if None). Blocks until the header is
+    complete.
+    """
+    f = open(vcd_file_path, 'r')
+    try:
+        lines = _follow_lines(f, poll_interval, idle_timeout)
+        id_to_signal = parse_vcd_header(lines)
+    except Exception:
+        f.close()
+        raise
+
+    def events():
+        with f:
+            yield from _value_changes(lines, id_to_signal)
+    return events(), id_to_signal
+
+
+def _follow_lines(f, poll_interval, idle_timeout):
+    pending = ''
+    last_growth = time.monotonic()
+    while True:
+        line = f.readline()
+        if line:
+            last_growth = time.monotonic()
+            if line.endswith('\n'):
+                yield pending + line
+                pending = ''
             else:
-                full_name = short_name  
+                pending += line
+            continue
+        if idle_timeout is not None and time.monotonic() - last_growth >= idle_timeout:
+            if pending:
+                yield pending
+            return
+        time.sleep(poll_interval)
 
-        labeled.append((t, full_name, val))
-    return labeled
 
-def compute_signal_changes(labeled_events):
-    changes = []
-    current_vals = {}
-    for (t, sig, val) in labeled_events:
-        old_val = current_vals.get(sig, None)
-        if old_val != val:
-            changes.append((t, sig, old_val, val))
-            current_vals[sig] = val
-    return changes
+def parse_vcd_to_events(vcd_file_path):
+    events, id_to_signal = iter_vcd_events(vcd_file_path)
+    store = EventStore(id_to_signal)
+    for (t, var_id, val) in events:
+        store.append(t, var_id, val)
+    return store, id_to_signal
 
 
-# hopping bfs 
+# Parallel parsing: the header is read once from an mmap of the file, the
+# value-change section is cut at '#<time>' line starts, and each chunk is
+# parsed by a worker straight from its own mmap. Chunk results come back as
+# raw columns and are concatenated in file order, which is time order.
 
-def build_descendants_map(edges):
+_chunk_state = {}
 
-    from collections import deque, defaultdict
 
-    descendants_of = defaultdict(set)
+def _init_chunk_worker(vcd_file_path, vid_index):
+    with open(vcd_file_path, 'rb') as f:
+        _chunk_state['mm'] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    _chunk_state['vid_index'] = vid_index
 
-    for driver in edges.keys():
-        visited = set()
-        queue = deque([driver])
-        while queue:
-            current = queue.popleft()
-            if current in edges:
-                for nxt in edges[current]:
-                    if nxt not in visited:
-                        visited.add(nxt)
-                        queue.append(nxt)
-        descendants_of[driver] = visited
 
-    return descendants_of
+def _parse_chunk(bounds):
+    start, end = bounds
+    vid_index = _chunk_state['vid_index']
+    extra_vids = {}     # ids not declared in the header, local to this chunk
+    declared = {}       # stray $var lines after the header
+    times = array('q')
+    sigs = array('i')
+    val_offsets = array('q')
+    values = bytearray()
 
-def analyze_dependencies_possible(changes, edges, time_window=10):
+    current_time = 0
+    for line in _chunk_state['mm'][start:end].split(b'\n'):
+        line = line.strip()
+        if not line:
+            continue
+
+        c = line[:1]
+        if c == b'#':
+            try:
+                current_time = int(line[1:])
+            except ValueError:
+                pass
+            continue
+
+        if c == b'0' or c == b'1':
+            if len(line) < 2:
+                continue
+            val = c
+            var_id = line[1:]
+        elif c == b'b':
+            parts = line.split()
+            if len(parts) != 2:
+                continue
+            val = parts[0][1:]
+            var_id = parts[1]
+        else:
+            if line.startswith(b'$var '):
+                _add_var(line.decode(), declared)
+            continue
+
+        var_id = var_id.decode()
+        idx = vid_index.get(var_id)
+        if idx is None:
+            idx = extra_vids.setdefault(var_id, len(vid_index) + len(extra_vids))
+        times.append(current_time)
+        sigs.append(idx)
+        values += val
+        val_offsets.append(len(values))
+
+    return times, sigs, val_offsets, values, list(extra_vids), declared
+
+
+def _split_vcd_body(mm, start, end, n_chunks):
+    bounds = []
+    step = max((end - start) // n_chunks, 1)
+    pos = start
+    while pos < end:
+        cut = mm.find(b'\n#', min(pos + step, end), end)
+        cut = end if cut < 0 else cut + 1
+        bounds.append((pos, cut))
+        pos = cut
+    return bounds
+
+
+def _merge_chunks(store, id_to_signal, results):
+    n_declared = len(store.signals)
+    for times, sigs, val_offsets, values, extra_vids, declared in results:
+        if extra_vids:
+            remap = array('i', range(n_declared))
+            remap.extend(store.signal_index(v) for v in extra_vids)
+            sigs = array('i', map(remap.__getitem__, sigs))
+        for vid, names in declared.items():
+            known = id_to_signal.setdefault(vid, [])
+            known.extend(n for n in names if n not in known)
+        # chunk offsets start at 0; shifting them with a C-level map and
+        # concatenating whole arrays keeps the merge off the bytecode loop
+        base = len(store.values)
+        if base:
+            val_offsets = array('q', map(base.__add__, val_offsets))
+        store.times += times
+        store.sigs += sigs
+        store.val_offsets += val_offsets
+        store.values += values
+
+
+def parse_vcd_parallel(vcd_file_path, workers=None):
+    """
+    Same result as parse_vcd_to_events, with the value-change section split
+    across a process pool. 'workers' defaults to the number of CPUs.
+    """
+    workers = workers or os.cpu_count() or 1
+    with open(vcd_file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return EventStore(), {}
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            header_end = mm.find(b'$enddefinitions')
+            if header_end < 0:
+                header_end = len(mm)
+            else:
+                nl = mm.find(b'\n', header_end)
+                header_end = len(mm) if nl < 0 else nl + 1
+            id_to_signal = parse_vcd_header(io.StringIO(mm[:header_end].decode()))
+            # a few chunks per worker keeps the pool busy when chunks are uneven
+            bounds = _split_vcd_body(mm, header_end, len(mm), workers * 4)
+
+    store = EventStore(id_to_signal)
+    vid_index = {vid: i for i, vid in enumerate(store.signals)}
+    if workers == 1 or len(bounds) <= 1:
+        _init_chunk_worker(vcd_file_path, vid_index)
+        try:
+            _merge_chunks(store, id_to_signal, map(_parse_chunk, bounds))
+        finally:
+            _chunk_state.pop('mm').close()
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_chunk_worker,
+                                 initargs=(vcd_file_path, vid_index)) as pool:
+            _merge_chunks(store, id_to_signal, pool.map(_parse_chunk, bounds))
+    return store, id_to_signal
+
+
+class SignalNameResolver:
+    """
+    Maps VCD id codes to dependency-graph names. Each id code is resolved
+    once and memoized, so labeling an event is a single dict lookup.
+
+    Resolution order for a hierarchical VCD name "TOP.counter.u_x.count":
+      1. the longest scope suffix that is a graph node ("counter.u_x.count")
+      2. the longest scope suffix that ends some graph node's name, via a
+         suffix index built once over the graph ("u_x.count" -> "soc.counter.u_x.count"),
+         as long as it ends only one node's name
+      3. the VCD name itself
+    A code declared under several names (aliases) takes the first of them,
+    in declaration order, that a step matches, trying every name at step 1
+    before any at step 2. Declarations run top-down, so a net seen in
+    several scopes is named after the outermost one the graph knows.
+    """
+
+    def __init__(self, id_to_signal, dependency_graph):
+        self.id_to_signal = id_to_signal
+        self.nodes = set()
+        self.by_suffix = {}
+        for driver, driven in dependency_graph.items():
+            self._add_node(driver)
+            for d in driven:
+                self._add_node(d)
+        self._memo = {}
+
+    def _add_node(self, node):
+        if node in self.nodes:
+            return
+        self.nodes.add(node)
+        parts = node.split('.')
+        for i in range(1, len(parts)):
+            suffix = ".".join(parts[i:])
+            # a suffix shared by several nodes is ambiguous and maps to None
+            self.by_suffix[suffix] = None if suffix in self.by_suffix else node
+
+    def resolve(self, vid):
+        name = self._memo.get(vid)
+        if name is None:
+            name = self._memo[vid] = self._lookup(self.id_to_signal.get(vid) or [f"<unknown:{vid}>"])
+        return name
+
+    def aliases(self):
+        """
+        Every name a signal of the VCD goes by -> the name its changes are
+        labeled with: the label itself, each declared VCD name and what
+        that name would resolve to on its own.
+        """
+        out = {}
+        for vid, names in self.id_to_signal.items():
+            label = self.resolve(vid)
+            for name in names:
+                out.setdefault(name, label)
+                out.setdefault(self._lookup([name]), label)
+        for vid in self.id_to_signal:
+            out[self.resolve(vid)] = self.resolve(vid)
+        return out
+
+    def _lookup(self, names):
+        suffixes = []
+        for name in names:
+            parts = name.split('.')
+            suffixes.append([".".join(parts[i:]) for i in range(len(parts))])
+        for candidates in suffixes:
+            for candidate in candidates:
+                if candidate in self.nodes:
+                    return candidate
+        for candidates in suffixes:
+            for candidate in candidates:
+                if candidate in self.by_suffix:
+                    node = self.by_suffix[candidate]
+                    if node is not None:
+                        return node
+                    break  # the shorter suffixes are ambiguous as well
+        return names[0]
+
+
+def label_events_with_names(events, id_to_signal, dependency_graph, resolver=None):
+    if resolver is None:
+        resolver = SignalNameResolver(id_to_signal, dependency_graph)
+    # Columnar events only need each id code resolved once.
+    if isinstance(events, EventStore):
+        return events.relabel({vid: resolver.resolve(vid) for vid in events.signals})
+    return _iter_labeled(events, resolver)
+
+
+def _iter_labeled(events, resolver):
+    resolve = resolver.resolve
+    for (t, vid, val) in events:
+        yield (t, resolve(vid), val)
 
-    changes_by_time = defaultdict(list)
-    for (t, sig, ov, nv) in changes:
-        changes_by_time[t].append((sig, ov, nv))
 
-    descendants_of = build_descendants_map(edges)
+def compute_signal_changes(labeled_events, initial_values=None):
+    # 'initial_values' (signal -> value) seeds the state when the events start
+    # mid-simulation, e.g. from vcd_index.extract_window.
+    if isinstance(labeled_events, EventStore) and not initial_values:
+        return labeled_events.dedup_changes()
+    return _iter_changes(labeled_events, initial_values)
 
-    log_messages = []
 
-    all_times = sorted(changes_by_time.keys())
+def _iter_changes(labeled_events, initial_values=None):
+    current_vals = dict(initial_values or {})
+    for (t, sig, val) in labeled_events:
+        old_val = current_vals.get(sig, None)
+        if old_val != val:
+            yield (t, sig, old_val, val)
+            current_vals[sig] = val
 
-    drivers_by_signal = defaultdict(lambda: defaultdict(set))
-    for t in all_times:
-        changes = defaultdict(list)
-        for (driver_sig, old_val, new_val) in changes_by_time[t]:
-            msg = f"Time {t}: {driver_sig} changed from {old_val} to {new_val}."
-            log_messages.append(msg)
-            
-            if driver_sig in descendants_of:
-                possible_descendants = descendants_of[driver_sig]
-        
-                # TODO: remove this timr range or only adjust it to account for 1 clk cycle delays
-                for look_time in range(t, t + time_window + 1):
-                    if look_time in changes_by_time:
-                        for (dsig, d_old, d_new) in changes_by_time[look_time]:
-                            print("Dsig", dsig, driver_sig,  possible_descendants)
-                            if dsig in possible_descendants:
-                                drivers_by_signal[look_time][dsig].add(driver_sig)
-                                cmsg = (f"   => {driver_sig} possibly caused {dsig} to change to {d_new} "
-                                      f"at time {look_time}")
-                                log_messages.append(cmsg)
-        if t in drivers_by_signal:
-            for signal, drivers in drivers_by_signal[t].items():
-                if len(drivers) > 1:
-                    multi_driver_msg = f"Time {t}: Signal {signal} has multiple possible drivers: {', '.join(sorted(drivers))}"
-                    log_messages.append(multi_driver_msg)
-
-    return log_messages
 
+# multi-hop reachability: SCC condensation + lazily computed bitset closure
 
-def main():
-    if len(sys.argv) > 1:
-        vcd_file = sys.argv[1]
+def build_descendants_map(edges):
+    # Behaves like the old {driver: set(descendants)} dict, but without a BFS
+    # and a full set per driver; see reachability.Reachability. A .mtgraph
+    # written with --reachability brings its closure along.
+    if isinstance(edges, Reachability):
+        return edges
+    if isinstance(edges, DependencyGraph):
+        return edges.reachability()
+    return Reachability(edges)
+
+
+# Clock-cycle causality: instead of a fixed time window, an effect is
+# attributed to a driver change at t if it happens by the N-th active clock
+# edge after t. Changes at the same time as an edge belong to that edge, so
+# "after" is strict and the closing edge itself is inclusive. Only a clean
+# 0 -> 1 (posedge) or 1 -> 0 (negedge) transition is an edge; x -> 1 is not.
+
+EDGE_TRANSITION = {"posedge": ("0", "1"), "negedge": ("1", "0")}
+# changes to look at when detecting a clock, or beyond the initial dump
+# when waiting for a named clock's first edge
+CLOCK_PROBE = 10000
+
+
+class ClockError(ValueError):
+    """A named clock has no active edge, so its windows would never close."""
+
+
+class ClockEdges:
+    """
+    Active edge times of a clock, added in time order, and the windows they
+    close: a change at t is closed by the 'cycles'-th edge strictly after t.
+    The serial analysis and the shard planner both go through this, so they
+    agree on what an edge is and where a window ends.
+    """
+
+    def __init__(self, edge, cycles=1):
+        self.inactive, self.active = EDGE_TRANSITION[edge]
+        self.cycles = cycles
+        self.times = array('q')
+
+    def add(self, t, old, new):
+        """Take a change of the clock at t; returns whether it is an edge."""
+        if new != self.active or old != self.inactive:
+            return False
+        if not self.times or self.times[-1] < t:
+            self.times.append(t)
+        return True
+
+    def window_end(self, t):
+        """The edge closing the window opened at t, or None if it is not in yet."""
+        i = bisect.bisect_right(self.times, t) + self.cycles - 1
+        return self.times[i] if i < len(self.times) else None
+
+    def forget(self, t):
+        """Drop the edges at or before t, which no later window can end on."""
+        if self.times and self.times[0] <= t:
+            del self.times[:bisect.bisect_right(self.times, t)]
+
+
+def detect_clock(changes, sample=CLOCK_PROBE):
+    """
+    Pick the signal that looks most like a clock among the first 'sample'
+    changes: only toggles between 0 and 1, and rises at the most regular
+    period, weighted by how often it rises. Returns (name or None, changes),
+    where the second item replays everything that was read.
+    """
+    if isinstance(changes, EventStore):
+        head = itertools.islice(changes, sample)
     else:
-        vcd_file = "counter_tb.vcd"
+        changes = iter(changes)
+        head = list(itertools.islice(changes, sample))
+    rises = defaultdict(list)
+    not_clock = set()
+    for (t, sig, old, new) in head:
+        if new not in ('0', '1'):
+            not_clock.add(sig)
+        elif new == '1' and old == '0':
+            rises[sig].append(t)
+
+    best, best_score = None, 0
+    for sig, times in rises.items():
+        if sig in not_clock or len(times) < 4:
+            continue
+        periods = [b - a for a, b in zip(times, times[1:])]
+        if min(periods) <= 0:
+            continue
+        score = len(times) * min(periods) / max(periods)
+        if score > best_score:
+            best, best_score = sig, score
+    if not isinstance(changes, EventStore):
+        changes = itertools.chain(head, changes)
+    return best, changes
+
+
+def analyze_dependencies_possible(changes, edges, time_window=10, clock=None, cycles=1,
+                                  edge="posedge", max_unclocked=None):
+    """analyze_dependency_records, formatted as simulation-log lines."""
+    for record in analyze_dependency_records(changes, edges, time_window, clock, cycles, edge,
+                                             max_unclocked):
+        yield format_record(record)
+
+
+def analyze_dependency_records(changes, edges, time_window=10, clock=None, cycles=1,
+                               edge="posedge", max_unclocked=None):
+    """
+    Consume 'changes' (time-ordered (t, sig, old, new) tuples, e.g. straight
+    from compute_signal_changes) and yield log_sink records as soon as each
+    timestamp's causal window [t, t + time_window] has been seen. Only the
+    changes inside the open window are kept in memory.
+
+    With 'clock' set to a signal name, the window instead runs from t to the
+    'cycles'-th 'edge' of that clock after t. Edge times are collected as
+    the clock's changes stream past and looked up with bisect. Until the
+    clock's first edge no window can close, so every change is held; with
+    'max_unclocked' set, ClockError is raised once that many changes have
+    arrived without one (a clock that never ticks would otherwise keep the
+    whole trace open).
+
+    The window join never steps through time units: each signal with a
+    change in the open window keeps a sorted array of its change times, and
+    a driver's effects are found by bisecting those arrays for the signals
+    that are its descendants. Cost follows the changes that exist, not the
+    width of the window or the timescale.
+    """
+    reach = build_descendants_map(edges)
+
+    # Signals are handled as dense ids: graph nodes keep their Reachability
+    # id, anything else is numbered after them. Names are only looked up
+    # again when a record is emitted.
+    n_nodes = len(reach.nodes)
+    node_index, comp_of, closure_bits = reach.index, reach.comp_of, reach.closure_bits
+    is_driver = bytearray(n_nodes)
+    for driver in reach.drivers:
+        is_driver[node_index[driver]] = 1
+    extra_ids = {}
+    extra_names = []
+
+    def id_of(sig):
+        i = node_index.get(sig)
+        if i is None:
+            i = extra_ids.get(sig)
+            if i is None:
+                i = extra_ids[sig] = n_nodes + len(extra_names)
+                extra_names.append(sig)
+        return i
+
+    def name_of(i):
+        return reach.nodes[i] if i < n_nodes else extra_names[i - n_nodes]
+
+    # time -> [(sig id, old, new)], for the times whose window is still open
+    changes_by_time = {}
+    pending = deque()
+    # sig id -> ascending change times / (seq, time, sig id, new) in the open window
+    times_of = {}
+    entries_of = {}
+    seq = 0
+
+    # the edges of 'clock' that can still close an open window
+    clock_edges = ClockEdges(edge, cycles) if clock is not None else None
+    clock_id = id_of(clock) if clock is not None else None
+    clock_seen = clock is None
+
+    def window_end(t):
+        return t + time_window if clock_edges is None else clock_edges.window_end(t)
+
+    drivers_by_signal = defaultdict(lambda: defaultdict(set))
 
-    current_path = Path(__file__).resolve()
-    script_dir = current_path.parent 
+    def report(t):
+        t_end = window_end(t)
+        if t_end is None:
+            # end of the dump before the closing edge: take what is there
+            t_end = float('inf')
+        for (driver, old_val, new_val) in changes_by_time[t]:
+            driver_sig = name_of(driver)
+            yield Change(t, driver_sig, old_val, new_val)
+
+            if driver < n_nodes and is_driver[driver]:
+                # bitset over components of everything the driver reaches
+                possible_descendants = closure_bits(comp_of[driver])
+
+                hits = []
+                for dsig, times in times_of.items():
+                    if dsig < n_nodes and possible_descendants >> comp_of[dsig] & 1:
+                        # everything before t has been dropped, so the hits
+                        # are a prefix of the array
+                        hits.extend(entries_of[dsig][:bisect.bisect_right(times, t_end)])
+                # seq follows arrival order, which is time order
+                hits.sort()
+                for (_, look_time, dsig, d_new) in hits:
+                    drivers_by_signal[look_time][dsig].add(driver)
+                    yield Cause(t, driver_sig, name_of(dsig), d_new, look_time)
+        # nothing later can look back at t, so its state can go; t is the
+        # oldest open time, so its changes sit at the front of each array
+        for (sig, _, _) in changes_by_time.pop(t):
+            times = times_of[sig]
+            if len(times) == 1:
+                del times_of[sig], entries_of[sig]
+            else:
+                del times[0], entries_of[sig][0]
+        if clock_edges is not None:
+            clock_edges.forget(t)
+        for signal, drivers in drivers_by_signal.pop(t, {}).items():
+            if len(drivers) > 1:
+                yield MultipleDrivers(t, name_of(signal), tuple(sorted(name_of(d) for d in drivers)))
+
+    for (t, sig_name, ov, nv) in changes:
+        sig = id_of(sig_name)
+        if sig == clock_id and clock_edges.add(t, ov, nv):
+            clock_seen = True
+        elif not clock_seen and max_unclocked is not None and seq >= max_unclocked:
+            raise ClockError(f"clock '{clock}' has no {edge} in the first {seq} changes")
+        # every change up to t - 1 is in, so any window ending before t is
+        # complete; window ends grow with t, so only the front needs checking
+        while pending:
+            t_end = window_end(pending[0])
+            if t_end is None or t_end >= t:
+                break
+            yield from report(pending.popleft())
+        if t not in changes_by_time:
+            changes_by_time[t] = []
+            pending.append(t)
+        changes_by_time[t].append((sig, ov, nv))
+        if sig not in times_of:
+            times_of[sig] = array('q')
+            entries_of[sig] = []
+        times_of[sig].append(t)
+        entries_of[sig].append((seq, t, sig, nv))
+        seq += 1
+
+    while pending:
+        yield from report(pending.popleft())
+
+
+# Time-sharded analysis: the stored changes are cut into shards of whole
+# timestamps, each analyzed serially in a worker. A shard also carries a
+# lead-in (earlier changes whose windows reach into it, so multiple-driver
+# detection sees every driver) and a tail (changes up to the window end of
+# its last timestamp). Workers keep only the records of the timestamps they
+# own, so concatenating shards in order gives exactly the serial output.
+#
+# Shards travel as column slices (ChangeStore.slice_columns) and are cut
+# only as workers free up: a few per worker are in flight, and each one's
+# records are passed on as soon as it and every shard before it are done.
+
+SHARD_CHANGES = 1 << 18  # shards are cut to at most about this many changes
+SHARDS_IN_FLIGHT = 2     # per worker
+
+_shard_state = {}
+
+
+def _init_shard_worker(edges, signals, options):
+    _shard_state['reach'] = build_descendants_map(edges)
+    _shard_state['signals'] = signals
+    _shard_state['options'] = options
+
+
+def _analyze_shard(shard):
+    t_first, t_stop, columns = shard
+    changes = ChangeStore.from_columns(_shard_state['signals'], columns)
+    records = analyze_dependency_records(changes, _shard_state['reach'], **_shard_state['options'])
+    return [r for r in records if t_first <= r.time < t_stop]
+
+
+def _stored_clock_edges(store, clock, edge, cycles=1, limit=None):
+    # the ClockEdges of 'clock' in a ChangeStore, up to its first 'limit' edges
+    clock_edges = ClockEdges(edge, cycles)
+    if clock not in store.signals:
+        return clock_edges
+    clock_idx = store.signals.index(clock)
+    times, sigs = store.times, store.sigs
+    for i in range(len(times)):
+        if sigs[i] == clock_idx:
+            if (clock_edges.add(times[i], store.old_value(i), store.value(i))
+                    and limit is not None and len(clock_edges.times) >= limit):
+                break
+    return clock_edges
+
+
+def _shard_bounds(store, n_shards, time_window, clock, cycles, edge):
+    """(t_first, t_stop, lo, hi) per shard: owned times and the index slice."""
+    times = store.times
+    n = len(times)
+    clock_edges = _stored_clock_edges(store, clock, edge, cycles) if clock else None
+    if clock and not clock_edges.times:
+        # every window would stay open to the end of the trace
+        raise ClockError(f"clock '{clock}' has no {edge}")
+
+    def window_end(t):
+        return t + time_window if clock_edges is None else clock_edges.window_end(t)
+
+    def lead_in(t):
+        # earliest time whose window reaches t
+        if clock_edges is None:
+            return t - time_window
+        edge_times = clock_edges.times
+        j = bisect.bisect_left(edge_times, t) - cycles
+        return edge_times[j] if j >= 0 else times[0]
+
+    starts = sorted({times[k * n // n_shards] for k in range(n_shards)})
+    bounds = []
+    for k, t_first in enumerate(starts):
+        stop = bisect.bisect_left(times, starts[k + 1]) if k + 1 < len(starts) else n
+        t_stop = times[stop] if stop < n else times[-1] + 1
+        t_end = window_end(times[stop - 1])
+        hi = n if t_end is None else bisect.bisect_right(times, t_end)
+        lo = bisect.bisect_left(times, lead_in(t_first))
+        bounds.append((t_first, t_stop, lo, hi))
+    return bounds
+
+
+def analyze_dependencies_parallel(changes, edges, time_window=10, clock=None, cycles=1,
+                                  edge="posedge", max_unclocked=None, workers=None):
+    """
+    Same records as analyze_dependency_records, with the analysis split
+    into time shards across a process pool. 'changes' must be stored (a
+    ChangeStore from compute_signal_changes); anything else, or a single
+    worker, runs serially. 'workers' defaults to the number of CPUs.
+    """
+    workers = workers or os.cpu_count() or 1
+    options = dict(time_window=time_window, clock=clock, cycles=cycles, edge=edge)
+    if workers == 1 or not isinstance(changes, ChangeStore) or not len(changes):
+        yield from analyze_dependency_records(changes, edges, max_unclocked=max_unclocked, **options)
+        return
+
+    n_shards = max(workers * 4, len(changes) // SHARD_CHANGES)
+    bounds = _shard_bounds(changes, n_shards, time_window, clock, cycles, edge)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_shard_worker,
+                             initargs=(edges, changes.signals, options)) as pool:
+        in_flight = deque()
+        for (t_first, t_stop, lo, hi) in bounds:
+            in_flight.append(pool.submit(_analyze_shard, (t_first, t_stop, changes.slice_columns(lo, hi))))
+            if len(in_flight) >= workers * SHARDS_IN_FLIGHT:
+                yield from in_flight.popleft().result()
+        while in_flight:
+            yield from in_flight.popleft().result()
 
 
-    # TODO: update this file path automatically based on users codebase structure 
-    # dep_json = "dependency_graph.json"
-    dep_json = script_dir / "../../../dependency_graph.json"
-    if not os.path.isfile(dep_json):
-        print(f"Error: no '{dep_json}' found.")
+def main():
+    arg_parser = argparse.ArgumentParser(description="Trace signal activity in a VCD against a dependency graph.")
+    arg_parser.add_argument("vcd_file", nargs="?", default="counter_tb.vcd")
+    arg_parser.add_argument("--graph", metavar="PATH",
+                            help=f"dependency graph from code/parser.py ({GRAPH_SUFFIX} or JSON; default: "
+                                 f"dependency_graph{GRAPH_SUFFIX} or dependency_graph.json at the repo root)")
+    arg_parser.add_argument("--stream", action="store_true",
+                            help="constant-memory mode: pipe events through without storing them")
+    arg_parser.add_argument("--jobs", type=int, default=1,
+                            help="parse and analyze the VCD with this many processes (0 = all cores)")
+    arg_parser.add_argument("--no-cache", action="store_true",
+                            help="do not read or write the parsed-VCD cache next to the dump")
+    arg_parser.add_argument("--window", nargs=2, type=int, metavar=("T0", "T1"),
+                            help="only analyze [T0, T1], seeking via the timestamp index next to the dump")
+    arg_parser.add_argument("--follow", action="store_true",
+                            help="keep reading the VCD as the simulator appends to it (implies --stream)")
+    arg_parser.add_argument("--poll", type=float, default=0.5, metavar="SECONDS",
+                            help="with --follow, how long to wait before checking the VCD for new lines")
+    arg_parser.add_argument("--idle-timeout", type=float, metavar="SECONDS",
+                            help="with --follow, stop once the VCD has not grown for this long "
+                                 "(default: run until interrupted)")
+    arg_parser.add_argument("--clock", metavar="SIGNAL",
+                            help="attribute effects by clock cycles of SIGNAL ('auto' to detect it) "
+                                 "instead of a fixed time window")
+    arg_parser.add_argument("--cycles", type=int, default=1,
+                            help="with --clock, how many active edges an effect may lag its cause")
+    arg_parser.add_argument("--edge", choices=sorted(EDGE_TRANSITION), default="posedge",
+                            help="with --clock, which clock edge is active")
+    arg_parser.add_argument("--format", choices=sorted(SINKS), default="text",
+                            help="simulation log format (default: text)")
+    arg_parser.add_argument("--output", "-o", metavar="PATH",
+                            help="write the simulation log to PATH instead of stdout")
+    # The index is built in memory as the log is written, so it is only on by
+    # default when the log is bounded anyway (not with --stream or --follow).
+    arg_parser.add_argument("--log-index", dest="log_index", action="store_true", default=None,
+                            help="with a text log in --output, write its signal/time index next to it "
+                                 "(default unless --stream or --follow; not with --follow)")
+    arg_parser.add_argument("--no-log-index", dest="log_index", action="store_false",
+                            help="do not write the log index")
+    add_stats_arguments(arg_parser)
+    args = arg_parser.parse_args()
+    if args.cycles < 1:
+        arg_parser.error("--cycles must be at least 1")
+    if args.follow and args.window:
+        arg_parser.error("--follow cannot be combined with --window")
+    if args.follow and args.log_index:
+        arg_parser.error("--follow cannot be combined with --log-index")
+    if args.log_index is None:
+        args.log_index = not (args.stream or args.follow)
+    vcd_file = args.vcd_file
+
+    dep_path = args.graph
+    if dep_path is None:
+        # TODO: update this file path automatically based on users codebase structure
+        repo_dir = Path(__file__).resolve().parent / "../../.."
+        candidates = [repo_dir / ("dependency_graph" + GRAPH_SUFFIX), repo_dir / "dependency_graph.json"]
+        dep_path = next((c for c in candidates if os.path.isfile(c)), candidates[-1])
+    if not os.path.isfile(dep_path):
+        print(f"Error: no '{dep_path}' found.")
         sys.exit(1)
 
-    with open(dep_json, "r") as f:
-        dependency_graph = json.load(f)
+    stats = stats_from_args(args)
+    with stats.stage("load_graph") as st:
+        dependency_graph = load_dependency_graph(dep_path)
+        st["drivers"] = len(dependency_graph)
+        if isinstance(dependency_graph, DependencyGraph):
+            st["edges"] = dependency_graph.n_edges
+        else:
+            st["edges"] = sum(len(driven) for driven in dependency_graph.values())
 
     if not os.path.isfile(vcd_file):
         print(f"Error: VCD file '{vcd_file}' not found.")
         sys.exit(1)
 
-    events, id_to_signal = parse_vcd_to_events(vcd_file)
-    labeled_events = label_events_with_names(events, id_to_signal, dependency_graph)
-    changes = compute_signal_changes(labeled_events)
-    time_window = 1
-    log_messages = analyze_dependencies_possible(changes, dependency_graph, time_window=time_window)
+    # With --stream, --follow and --window the parse, label and changes stages
+    # only set up generators; their work is timed as part of 'analysis'.
+    with stats.stage("parse_vcd") as st:
+        initial_values = None
+        if args.window:
+            t0, t1 = args.window
+            events, id_to_signal, state = extract_window(vcd_file, t0, t1)
+        elif args.follow:
+            # Same generator pipeline as --stream, reading new lines as the
+            # simulator appends them. Every stage only holds per-signal state and
+            # the open causal window, so memory stays bounded however long it runs.
+            events, id_to_signal = follow_vcd_events(vcd_file, args.poll, args.idle_timeout)
+        elif args.stream:
+            # Each stage is a generator, so events flow through one at a time and
+            # messages are printed while the dump is still being read.
+            events, id_to_signal = iter_vcd_events(vcd_file)
+        else:
+            if args.jobs != 1:
+                parse = partial(parse_vcd_parallel, workers=args.jobs or None)
+            else:
+                parse = parse_vcd_to_events
+            if args.no_cache:
+                events, id_to_signal = parse(vcd_file)
+            else:
+                events, id_to_signal = cached_parse(vcd_file, parse)
+        st["signals"] = len(id_to_signal)
+        if isinstance(events, EventStore):
+            st["events"] = len(events)
+
+    with stats.stage("label") as st:
+        resolver = SignalNameResolver(id_to_signal, dependency_graph)
+        if args.window:
+            # state is in last-write order, so the last id code wins when several share a name
+            initial_values = {name: val for (_, name, val) in label_events_with_names(
+                [(t0, vid, val) for vid, val in state.items()], id_to_signal, dependency_graph, resolver)}
+        labeled_events = label_events_with_names(events, id_to_signal, dependency_graph, resolver)
+        if isinstance(labeled_events, EventStore):
+            st["names"] = len(labeled_events.signals)
+
+    with stats.stage("changes") as st:
+        changes = compute_signal_changes(labeled_events, initial_values)
+        if isinstance(changes, EventStore):
+            st["changes"] = len(changes)
+        clock = args.clock
+        if clock == "auto":
+            clock, changes = detect_clock(changes)
+            if clock is None:
+                print("Error: could not detect a clock; name it with --clock.")
+                sys.exit(1)
+            print(f"Using clock '{clock}'", file=sys.stderr)
+        elif clock:
+            # Checked up front on every path: a clock without edges would
+            # keep every causal window open to the end of the trace.
+            known = resolver.aliases()
+            if clock not in known:
+                print(f"Error: clock '{clock}' is not a signal in '{vcd_file}'.")
+                sys.exit(1)
+            if known[clock] != clock:
+                clock = known[clock]
+                print(f"Using clock '{clock}'", file=sys.stderr)
+            if isinstance(changes, ChangeStore) and not _stored_clock_edges(changes, clock, args.edge, limit=1).times:
+                print(f"Error: clock '{clock}' has no {args.edge} in '{vcd_file}'.")
+                sys.exit(1)
+
+    with stats.stage("closure") as st:
+        # closures themselves are computed lazily during the analysis
+        reach = build_descendants_map(dependency_graph)
+        st["nodes"] = len(reach.nodes)
+        st["components"] = reach.n_components
+        st["closure"] = "stored" if isinstance(reach, StoredReachability) else "lazy"
 
-    print("\n=== Multi-Hop Dependency Analysis (Ignoring Intermediate Signals) ===")
-    for msg in log_messages:
-        print(msg)
+    time_window = 1
+    # Streamed changes cannot be checked for clock edges up front; past the
+    # initial value dump, a few thousand changes without one mean there are none.
+    max_unclocked = 2 * len(id_to_signal) + CLOCK_PROBE if clock else None
+    records = analyze_dependencies_parallel(changes, reach, time_window=time_window,
+                                            clock=clock, cycles=args.cycles, edge=args.edge,
+                                            max_unclocked=max_unclocked, workers=args.jobs)
+
+    binary = args.format == "binary"
+    if args.output:
+        out = open(args.output, "wb" if binary else "w")
+    else:
+        out = sys.stdout.buffer if binary else sys.stdout
+        if args.format == "text":
+            print("\n=== Multi-Hop Dependency Analysis (Ignoring Intermediate Signals) ===")
+    # A text log written to a file gets an index of its lines (see log_index)
+    log_index = None
+    if args.output and args.format == "text" and args.log_index:
+        log_index = LogIndexWriter()
+        sink = TextSink(out, flush=args.follow, index=log_index)
+    else:
+        sink = SINKS[args.format](out, flush=args.follow)
+    # Records go to the sink as they are produced, so output starts right away
+    # and nothing accumulates.
+    with stats.stage("analysis") as st, sink:
+        n_records = 0
+        try:
+            for record in records:
+                sink.write(record)
+                n_records += 1
+        except KeyboardInterrupt:
+            if not args.follow:
+                raise
+        except ClockError as e:
+            print(f"Error: {e}.", file=sys.stderr)
+            sys.exit(1)
+        st["records"] = n_records
+    if args.output:
+        out.close()
+    if log_index is not None:
+        with stats.stage("log_index") as st:
+            log_index.write(log_index_path_for(args.output), os.path.getsize(args.output))
+            st["signals"] = len(log_index.ids)
+            st["times"] = len(log_index.times)
+    finish_stats(stats, args)
 
 
 if __name__ == "__main__":
@@ -3,11 +3,126 @@ package ui
 
 import (
 	"bufio"
+	"encoding/json"
+	"errors"
+	"io"
 	"os/exec"
+	"sync"
 
 	"github.com/rivo/tview"
 )
 
+const appScript = "/Users/senagulhazir/Desktop/demo/moontrace/app/app.py"
+
+// pythonWorker is one long-lived "app.py --serve" process. Questions go to
+// its stdin as JSON lines and the answer streams back on its stdout, so the
+// interpreter, the API client and the parsed graph/log stay loaded between
+// questions. It is started on first use and again after it exits.
+type pythonWorker struct {
+	mu     sync.Mutex
+	cmd    *exec.Cmd
+	stdin  io.WriteCloser
+	stdout *bufio.Scanner
+	nextID int
+}
+
+type workerRequest struct {
+	ID           int      `json:"id"`
+	Prompt       string   `json:"prompt"`
+	Verification bool     `json:"verification,omitempty"`
+	FileName     string   `json:"fileName,omitempty"`
+	Description  string   `json:"description,omitempty"`
+	Files        []string `json:"files,omitempty"`
+}
+
+type workerReply struct {
+	ID    int    `json:"id"`
+	Chunk string `json:"chunk"`
+	Done  bool   `json:"done"`
+	Error string `json:"error"`
+}
+
+var worker pythonWorker
+
+func (w *pythonWorker) start() error {
+	cmd := exec.Command("python3", appScript, "--serve")
+	stdin, err := cmd.StdinPipe()
+	if err != nil {
+		return err
+	}
+	stdout, err := cmd.StdoutPipe()
+	if err != nil {
+		return err
+	}
+	if err := cmd.Start(); err != nil {
+		return err
+	}
+	scanner := bufio.NewScanner(stdout)
+	scanner.Buffer(make([]byte, 64*1024), 16*1024*1024)
+	w.cmd, w.stdin, w.stdout = cmd, stdin, scanner
+	return nil
+}
+
+func (w *pythonWorker) stop() {
+	if w.cmd == nil {
+		return
+	}
+	w.stdin.Close()
+	w.cmd.Process.Kill()
+	w.cmd.Wait()
+	w.cmd = nil
+}
+
+// Ask sends one question and calls onChunk with each piece of the answer as
+// it arrives. Questions are answered one at a time.
+func (w *pythonWorker) Ask(req workerRequest, onChunk func(string)) error {
+	w.mu.Lock()
+	defer w.mu.Unlock()
+
+	if w.cmd == nil {
+		if err := w.start(); err != nil {
+			return err
+		}
+	}
+	w.nextID++
+	req.ID = w.nextID
+	line, err := json.Marshal(req)
+	if err != nil {
+		return err
+	}
+	if _, err := w.stdin.Write(append(line, '\n')); err != nil {
+		w.stop()
+		return err
+	}
+
+	for w.stdout.Scan() {
+		var reply workerReply
+		if err := json.Unmarshal(w.stdout.Bytes(), &reply); err != nil {
+			continue
+		}
+		// an unreadable request is answered with an error and no id
+		if reply.ID != req.ID && !(reply.ID == 0 && reply.Error != "") {
+			continue
+		}
+		if reply.Error != "" {
+			return errors.New(reply.Error)
+		}
+		if reply.Chunk != "" {
+			onChunk(reply.Chunk)
+		}
+		if reply.Done {
+			return nil
+		}
+	}
+	// the worker went away mid-answer; the next question starts a new one
+	err = w.stdout.Err()
+	if err == nil {
+		err = io.ErrUnexpectedEOF
+	}
+	w.stop()
+	return err
+}
+
 func (v *Views) StreamPythonScript(prompt string, app *tview.Application, verification bool, fileName string, description string) {
 	var selectedFiles []string
 	for filePath, isSelected := range v.UploadedFiles {
@@ -15,8 +130,40 @@ func (v *Views) StreamPythonScript(prompt string, app *tview.Application, verifi
 			selectedFiles = append(selectedFiles, filePath)
 		}
 	}
+
+	req := workerRequest{
+		Prompt:       prompt,
+		Verification: verification,
+		FileName:     fileName,
+		Description:  description,
+		Files:        selectedFiles,
+	}
+	var responseBuffer string
+	err := worker.Ask(req, func(chunk string) {
+		responseBuffer += chunk
+		text := responseBuffer
+		app.QueueUpdateDraw(func() {
+			v.Response.SetText(text)
+		})
+	})
+	if err != nil {
+		v.Logger.Printf("python worker: %v", err)
+		if responseBuffer == "" {
+			// no worker (or it died before answering): run the script once
+			v.runPythonScript(prompt, app, verification, fileName, description, selectedFiles)
+		}
+	}
+	v.UpdateFileList(v.List, v.CurrDir)
+
+	app.QueueUpdateDraw(func() {
+		app.SetFocus(v.Pages)
+	})
+}
+
+// runPythonScript answers a single question with a fresh "python3 app.py" run.
+func (v *Views) runPythonScript(prompt string, app *tview.Application, verification bool, fileName string, description string, selectedFiles []string) {
 	// args := append([]string{"/Users/senagulhazir/Desktop/demo/moontrace/app/app.py", prompt}, selectedFiles...)
-	args := []string{"/Users/senagulhazir/Desktop/demo/moontrace/app/app.py", prompt}
+	args := []string{appScript, prompt}
 	if verification {
 		args = append(args, "--verification")
 	}
@@ -56,10 +203,5 @@ func (v *Views) StreamPythonScript(prompt string, app *tview.Application, verifi
 			v.Response.SetText(responseBuffer)
 		})
 	}
-	v.UpdateFileList(v.List, v.CurrDir)
 	cmd.Wait()
-
-	app.QueueUpdateDraw(func() {
-		app.SetFocus(v.Pages)
-	})
 }
@@ -0,0 +1,71 @@
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+# The backend and app modules are flat scripts that import each other by
+# name, so their directories go on the path the way each script puts them.
+REPO_DIR = Path(__file__).resolve().parent.parent
+BACKEND_DIR = REPO_DIR / "internal" / "backend"
+for d in (BACKEND_DIR / "vcd", BACKEND_DIR / "shared", BACKEND_DIR / "code",
+          BACKEND_DIR / "bench", REPO_DIR / "app"):
+    sys.path.insert(0, str(d))
+
+# A small design: clock and reset fan into a loop a -> c -> a, and every
+# net is a key of the graph so names resolve exactly.
+GRAPH = {
+    "clk": ["a", "b"],
+    "rst": ["a", "e"],
+    "a": ["c"],
+    "b": ["c", "d"],
+    "c": ["a", "e"],
+    "d": ["bus"],
+    "e": [],
+    "bus": [],
+}
+# (id code, name, width)
+NETS = [("!", "clk", 1), ('"', "rst", 1), ("#", "a", 1), ("$", "b", 1),
+        ("%", "c", 1), ("&", "d", 1), ("'", "e", 1), ("(", "bus", 8)]
+CLOCK_PERIOD = 10
+
+
+def write_trace(path, cycles=60, seed=0):
+    """
+    A VCD of the design above: 'clk' toggles every half period and the other
+    nets take random values a few times per cycle (not always a change, and
+    the bus now and then has x bits).
+    """
+    rng = random.Random(seed)
+    lines = ["$timescale 1ns $end", "$scope module top $end"]
+    lines += [f"$var wire {width} {code} {name} $end" for code, name, width in NETS]
+    lines += ["$upscope $end", "$enddefinitions $end", "#0", "0!", '1"']
+    lines += [f"0{code}" if width == 1 else f"b{'0' * width} {code}" for code, _, width in NETS[2:]]
+
+    def random_changes():
+        out = []
+        for code, _, width in rng.sample(NETS[2:], rng.randint(1, 3)):
+            if width == 1:
+                out.append(f"{rng.getrandbits(1)}{code}")
+            else:
+                bits = "".join(rng.choice("01" * 7 + "x") for _ in range(width))
+                out.append(f"b{bits} {code}")
+        return out
+
+    for k in range(1, cycles + 1):
+        t = k * CLOCK_PERIOD
+        lines += [f"#{t}", "1!"]
+        if k == 2:
+            lines.append('0"')
+        for dt in (1, 2, 3):
+            if rng.random() < 0.7:
+                lines += [f"#{t + dt}"] + random_changes()
+        lines += [f"#{t + CLOCK_PERIOD // 2}", "0!"] + random_changes()
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    return str(path)
+
+
+@pytest.fixture(scope="session")
+def trace(tmp_path_factory):
+    return write_trace(tmp_path_factory.mktemp("trace") / "trace.vcd")
@@ -0,0 +1,95 @@
+import io
+import json
+import os
+
+import pytest
+
+from response_cache import ResponseCache
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    # conversation history and the response cache go to the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("MOONTRACE_BACKEND", "stub")
+    import app
+    monkeypatch.setattr(app, "_store", None)
+    monkeypatch.setattr(app, "responses", ResponseCache(str(tmp_path / "response_cache")))
+    return app
+
+
+def serve_lines(app, *lines):
+    replies = io.StringIO()
+    app.serve(io.StringIO("".join(lines)), replies)
+    return [json.loads(line) for line in replies.getvalue().splitlines()]
+
+
+def test_serve_streams_each_answer(app, monkeypatch):
+    asked = []
+
+    def answer(prompt, verification, file_name, description=None, additional_files=None, emit=None):
+        asked.append((prompt, verification, file_name, description, additional_files))
+        emit("a ")
+        emit(prompt)
+    monkeypatch.setattr(app, "process_prompt", answer)
+
+    replies = serve_lines(app, json.dumps({"id": 1, "prompt": "why?"}) + "\n", "\n",
+                          json.dumps({"id": "b", "prompt": "tb", "verification": True, "fileName": "tb.v",
+                                      "files": ["x.v"]}) + "\n")
+    assert replies == [{"id": 1, "chunk": "a "}, {"id": 1, "chunk": "why?"}, {"id": 1, "done": True},
+                       {"id": "b", "chunk": "a "}, {"id": "b", "chunk": "tb"}, {"id": "b", "done": True}]
+    assert asked == [("why?", False, None, None, []), ("tb", True, "tb.v", None, ["x.v"])]
+
+
+@pytest.mark.parametrize("line, request_id", [("not json\n", None), ("[1]\n", None), ('{"id": 4}\n', 4)])
+def test_serve_rejects_unreadable_requests(app, monkeypatch, line, request_id):
+    monkeypatch.setattr(app, "process_prompt", lambda *a, **k: pytest.fail("answered a bad request"))
+    (reply,) = serve_lines(app, line)
+    assert reply["id"] == request_id and reply["error"].startswith("bad request")
+
+
+@pytest.mark.parametrize("files", ["graph.txt", [1], {"a": "b"}])
+def test_serve_rejects_bad_files(app, monkeypatch, files):
+    monkeypatch.setattr(app, "process_prompt", lambda *a, **k: pytest.fail("answered a bad request"))
+    replies = serve_lines(app, json.dumps({"id": 3, "prompt": "p", "files": files}) + "\n")
+    assert replies == [{"id": 3, "error": "bad request: 'files' must be a list of paths"}]
+
+
+@pytest.mark.parametrize("field, value, message", [
+    ("prompt", ["why?"], "'prompt' must be a string"),
+    ("fileName", 3, "'fileName' must be a string or null"),
+    ("description", {"a": 1}, "'description' must be a string or null"),
+])
+def test_serve_rejects_bad_fields_and_goes_on(app, monkeypatch, field, value, message):
+    monkeypatch.setattr(app, "process_prompt", lambda prompt, *a, emit=None, **k: emit(prompt))
+    bad = {"id": 1, "prompt": "p", field: value}
+    replies = serve_lines(app, json.dumps(bad) + "\n", json.dumps({"id": 2, "prompt": "ok"}) + "\n")
+    assert replies == [{"id": 1, "error": f"bad request: {message}"},
+                       {"id": 2, "chunk": "ok"}, {"id": 2, "done": True}]
+
+
+def test_serve_survives_a_failed_answer(app, monkeypatch):
+    def answer(prompt, *args, emit=None, **kwargs):
+        if prompt == "boom":
+            emit("partial")
+            raise OSError("history is read-only")
+        emit(prompt)
+    monkeypatch.setattr(app, "process_prompt", answer)
+    replies = serve_lines(app, json.dumps({"id": 1, "prompt": "boom"}) + "\n",
+                          json.dumps({"id": 2, "prompt": "ok"}) + "\n")
+    assert replies == [{"id": 1, "chunk": "partial"}, {"id": 1, "error": "OSError: history is read-only"},
+                       {"id": 2, "chunk": "ok"}, {"id": 2, "done": True}]
+
+
+def test_serve_answers_with_the_stub(app):
+    request = json.dumps({"id": 1, "prompt": "why is q x?"}) + "\n"
+    replies = serve_lines(app, request)
+    assert replies[-1] == {"id": 1, "done": True}
+    assert "".join(r.get("chunk", "") for r in replies).endswith("why is q x?")
+    # asked again in a new conversation: the same request, answered from the cache
+    app._store = None
+    os.remove("conversation_history.jsonl")
+    hits = app.responses.hits
+    again = serve_lines(app, request)
+    assert "".join(r.get("chunk", "") for r in again) == "".join(r.get("chunk", "") for r in replies)
+    assert app.responses.hits == hits + 1
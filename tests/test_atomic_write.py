@@ -0,0 +1,35 @@
+import os
+
+import pytest
+
+from atomic_write import atomic_write
+
+
+def test_replaces_the_file(tmp_path):
+    path = tmp_path / "sidecar"
+    path.write_text("old")
+    with atomic_write(str(path)) as f:
+        f.write("new")
+    assert path.read_text() == "new"
+    assert os.listdir(tmp_path) == ["sidecar"]
+
+
+def test_failed_write_leaves_no_tmp_file(tmp_path):
+    path = tmp_path / "sidecar"
+    path.write_text("old")
+    with pytest.raises(RuntimeError):
+        with atomic_write(str(path), "wb") as f:
+            f.write(b"half")
+            raise RuntimeError("disk full")
+    assert path.read_text() == "old"
+    assert os.listdir(tmp_path) == ["sidecar"]
+
+
+def test_failed_rename_leaves_no_tmp_file(tmp_path):
+    # a directory in the way makes the final rename fail
+    path = tmp_path / "sidecar"
+    path.mkdir()
+    with pytest.raises(OSError):
+        with atomic_write(str(path)) as f:
+            f.write("new")
+    assert os.listdir(tmp_path) == ["sidecar"]
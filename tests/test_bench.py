@@ -0,0 +1,55 @@
+import filecmp
+import time
+
+import bench
+from bench import compare, confirm, run
+from vcd_parser import SignalNameResolver, parse_vcd_to_events
+from workload import generate
+
+TINY = dict(modules=4, depth=2, fanout=2, signals=6, cycles=80, activity=0.3)
+
+
+def test_workload_is_reproducible(tmp_path):
+    first = generate(str(tmp_path / "a"), seed=1, **TINY)
+    again = generate(str(tmp_path / "b"), seed=1, **TINY)
+    other = generate(str(tmp_path / "c"), seed=2, **TINY)
+    assert all(filecmp.cmp(x, y, shallow=False) for x, y in zip(first, again))
+    assert not filecmp.cmp(first[1], other[1], shallow=False)
+
+
+def test_vcd_names_resolve_against_the_netlist(tmp_path):
+    xml_path, vcd_path = generate(str(tmp_path), **TINY)
+    graph = bench._load_code_parser().parse_verilator_xml_signals(xml_path, "top")
+    nodes = set(graph) | {n for driven in graph.values() for n in driven}
+    _, id_to_signal = parse_vcd_to_events(vcd_path)
+    resolver = SignalNameResolver(id_to_signal, graph)
+    assert {resolver.resolve(vid) for vid in id_to_signal} <= nodes
+
+
+def test_run_reports_every_stage(tmp_path):
+    xml_path, vcd_path = generate(str(tmp_path), **TINY)
+    report, _, _ = run(xml_path, vcd_path, repeat=1)
+    assert list(report) == [name for name, _ in bench.stages(xml_path, vcd_path, 1)]
+    for entry in report.values():
+        assert entry["seconds"] > 0 and entry["peak_bytes"] > 0
+
+
+def test_compare_flags_only_real_regressions():
+    baseline = {"parse": {"seconds": 1.0, "peak_bytes": 10 * 2 ** 20},
+                "tiny": {"seconds": 0.001, "peak_bytes": 1000}}
+    report = {"parse": {"seconds": 1.6, "peak_bytes": 11 * 2 ** 20},
+              "tiny": {"seconds": 0.003, "peak_bytes": 3000},   # ratio is high, delta is noise
+              "new": {"seconds": 9.0, "peak_bytes": 1}}        # no baseline yet
+    assert compare(report, baseline, tolerance=1.5) == [("parse", "seconds", 1.0, 1.6)]
+    assert compare(report, baseline, tolerance=2.0) == []
+
+
+def test_confirm_drops_timings_that_do_not_repeat():
+    funcs = {"noisy": lambda r: None, "slow": lambda r: time.sleep(0.05)}
+    regressions = [("noisy", "seconds", 0.01, 0.2), ("slow", "seconds", 0.01, 0.5),
+                   ("noisy", "peak_bytes", 1000, 10 ** 6)]
+    confirmed = confirm(regressions, {}, funcs, tolerance=1.5, runs=3)
+    # the noisy stage is fast when timed again; memory peaks are kept as measured
+    assert [(name, metric) for name, metric, _, _ in confirmed] == [("slow", "seconds"), ("noisy", "peak_bytes")]
+    assert 0.05 <= confirmed[0][3] < 0.5
+    assert confirm(regressions, {}, funcs, tolerance=1.5, runs=0) == regressions
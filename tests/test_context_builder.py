@@ -0,0 +1,105 @@
+import pytest
+
+from context_builder import build_context, estimate_tokens, fit_text, iter_log_blocks, load_graph, mentioned_times
+from dep_graph import graph_text, write_graph, write_graph_json
+
+GRAPH = {
+    "top.clk": ["top.u_ctr.count", "top.u_fifo.wptr"],
+    "top.u_ctr.en": ["top.u_ctr.count"],
+    "top.u_ctr.count": ["top.u_ctr.wrap"],
+    "top.u_ctr.wrap": ["top.irq"],
+    "top.u_fifo.wptr": ["top.u_fifo.full"],
+    "top.u_fifo.full": ["top.stall"],
+}
+
+
+def write_log(path, n=200):
+    """A simulation log with a count change every 10 time units and fifo noise in between."""
+    lines = []
+    for t in range(0, n * 10, 10):
+        lines.append(f"Time {t}: u_ctr.count changed from {t // 10} to {t // 10 + 1}.\n")
+        lines.append(f"   => u_ctr.en possibly caused u_ctr.count to change to {t // 10 + 1} at time {t}\n")
+        lines.append(f"Time {t + 5}: u_fifo.wptr changed from 0 to 1.\n")
+    with open(path, "w") as f:
+        f.writelines(lines)
+
+
+@pytest.fixture
+def files(tmp_path):
+    graph_path, log_path = str(tmp_path / "graph.txt"), str(tmp_path / "analysis.txt")
+    with open(graph_path, "w") as f:
+        f.write(graph_text(GRAPH) + "\n")
+    write_log(log_path)
+    return graph_path, log_path
+
+
+def test_mentioned_times():
+    assert mentioned_times("why at time 40?") == [(40, 40)]
+    assert mentioned_times("between t=50-10 and @7") == [(10, 50), (7, 7)]
+    assert mentioned_times("at 120ns, cycles 3 to 5") == [(120, 120), (3, 5)]
+    assert mentioned_times("what drives count?") == []
+
+
+def test_graph_formats_load_alike(files, tmp_path):
+    graph_path, _ = files
+    binary, text = str(tmp_path / "g.mtgraph"), str(tmp_path / "g.json")
+    write_graph(binary, GRAPH)
+    write_graph_json(text, GRAPH)
+    assert load_graph(graph_path) == GRAPH
+    assert dict(load_graph(binary).items()) == GRAPH
+    assert load_graph(text) == GRAPH
+
+
+def test_log_blocks_keep_their_causes():
+    lines = ["header\n", "Time 3: a changed from 0 to 1.\n", "   => b possibly caused a\n", "\n",
+             "Time 9: c changed from 1 to 0.\n"]
+    assert list(iter_log_blocks(lines)) == [
+        (3, "Time 3: a changed from 0 to 1.\n   => b possibly caused a\n"),
+        (9, "Time 9: c changed from 1 to 0.\n"),
+    ]
+
+
+def test_context_centers_on_the_question(files):
+    graph_path, log_path = files
+    context = build_context("why does count change at time 400?", graph_path, log_path, budget=300)
+    assert estimate_tokens(context["graph"]) + estimate_tokens(context["analysis"]) <= 300 + 2
+    # count's neighborhood, and not the fifo's
+    assert "top.u_ctr.en -> ['top.u_ctr.count']" in context["graph"]
+    assert "u_fifo.full" not in context["graph"]
+    assert "Time 400: u_ctr.count" in context["analysis"]
+    # the blocks around that time, in log order
+    times = [t for t, _ in iter_log_blocks(context["analysis"].splitlines(keepends=True))]
+    assert times == sorted(times) and len(times) > 1
+    assert all(abs(t - 400) <= 100 for t in times)
+
+
+def test_time_alone_picks_nearby_blocks(files):
+    graph_path, log_path = files
+    context = build_context("what happened at t=1005?", graph_path, log_path, budget=100)
+    times = [t for t, _ in iter_log_blocks(context["analysis"].splitlines(keepends=True))]
+    assert 1005 in times
+    assert all(abs(t - 1005) <= 200 for t in times)
+
+
+def test_nothing_recognized_gives_the_start_of_both(files):
+    graph_path, log_path = files
+    context = build_context("hello?", graph_path, log_path, budget=200)
+    assert context["analysis"].startswith("Time 0: u_ctr.count")
+    assert context["analysis"].endswith("... [truncated]\n")
+    assert context["graph"].startswith("  top.clk -> ")
+
+
+def test_missing_files_are_warned_about(tmp_path, capsys):
+    context = build_context("count?", str(tmp_path / "no.txt"), str(tmp_path / "no.log"))
+    assert context == {"graph": "", "analysis": ""}
+    assert capsys.readouterr().out.count("[Warning]") == 2
+
+
+def test_fit_text():
+    text = "".join(f"line {i:03}\n" for i in range(100))
+    cut, left = fit_text(text, 30)
+    assert cut.endswith("... [truncated]\n")
+    assert text.startswith(cut[:-len("... [truncated]\n")])
+    assert left < 3
+    assert fit_text(text, 10 ** 6) == (text, 10 ** 6 - sum(estimate_tokens(line)
+                                                           for line in text.splitlines(keepends=True)))
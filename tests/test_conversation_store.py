@@ -0,0 +1,86 @@
+import json
+import os
+
+from conversation_store import ConversationStore, import_legacy_history
+from context_builder import estimate_tokens
+
+
+def turn(store, i, size=40):
+    store.append("user", f"question {i} " + "q" * size)
+    store.append("assistant", f"answer {i} " + "a" * size)
+
+
+def test_turns_are_appended(tmp_path):
+    path = str(tmp_path / "history.jsonl")
+    store = ConversationStore(path)
+    digest = store.set_system_prompt("system 1")
+    turn(store, 0)
+    assert store.set_system_prompt("system 1") == digest
+    size = os.path.getsize(path)
+    turn(store, 1)
+    with open(path) as f:
+        lines = f.read().splitlines()
+    assert os.path.getsize(path) - size == sum(len(line) + 1 for line in lines[-2:])
+    # the prompt text is stored once, by hash
+    assert [json.loads(line)["type"] for line in lines] == ["system"] + ["message"] * 4
+    assert store.system_prompt() == "system 1"
+
+    again = ConversationStore(path)
+    assert again.messages == store.messages
+    assert [m["role"] for m in again.messages] == ["user", "assistant"] * 2
+    assert again.system_hash == digest
+
+
+def test_appends_from_another_process_are_seen(tmp_path):
+    path = str(tmp_path / "history.jsonl")
+    store, other = ConversationStore(path), ConversationStore(path)
+    turn(store, 0)
+    turn(other, 1)
+    assert [m["content"].split()[:2] for m in store.messages] == [
+        ["question", "0"], ["answer", "0"], ["question", "1"], ["answer", "1"]]
+
+
+def test_a_cut_off_line_is_skipped(tmp_path):
+    path = str(tmp_path / "history.jsonl")
+    turn(ConversationStore(path), 0)
+    with open(path, "a") as f:
+        f.write('{"type": "message", "role": "us')
+    assert len(ConversationStore(path).messages) == 2
+
+
+def test_compaction_keeps_the_history_bounded(tmp_path):
+    path = str(tmp_path / "history.jsonl")
+    store = ConversationStore(path, budget=200)
+    for i in range(30):
+        store.set_system_prompt(f"system {i}")
+        turn(store, i)
+        store.compact_if_needed()
+        assert store.tokens() <= 200
+    messages = store.messages
+    assert messages[0]["role"] == "user"
+    assert messages[-1]["content"].startswith("answer 29")
+    # the summary notes the newest of the dropped turns
+    assert store.summary and estimate_tokens(store.summary) <= 200 // 4 + 1
+    dropped = int(messages[0]["content"].split()[1]) - 1
+    assert f"answer {dropped}" in store.summary
+    # the prompts no longer referenced are removed turn by turn
+    assert os.listdir(store.prompts_dir) == [store.system_hash + ".txt"]
+    assert store.system_prompt() == "system 29"
+
+    again = ConversationStore(path, budget=200)
+    assert (again.messages, again.summary, again.system_hash) == (messages, store.summary, store.system_hash)
+    assert not store.compact_if_needed()
+
+
+def test_legacy_history_is_imported_once(tmp_path):
+    legacy = tmp_path / "conversation_history.json"
+    legacy.write_text(json.dumps([{"role": "system", "content": "old prompt"},
+                                  {"role": "user", "content": "q"}, {"role": "assistant", "content": None}]))
+    store = ConversationStore(str(tmp_path / "history.jsonl"))
+    import_legacy_history(store, str(legacy))
+    assert store.messages == [{"role": "user", "content": "q"}, {"role": "assistant", "content": ""}]
+    assert not legacy.exists() and (tmp_path / "conversation_history.json.imported").exists()
+
+    legacy.write_text("[]")
+    import_legacy_history(store, str(legacy))
+    assert legacy.exists() and len(store.messages) == 2
@@ -0,0 +1,122 @@
+import pickle
+import subprocess
+import sys
+
+import pytest
+
+from conftest import BACKEND_DIR, GRAPH
+from dep_graph import (DependencyGraph, StoredReachability, graph_text, load_dependency_graph, write_graph,
+                       write_graph_json)
+from reachability import Reachability
+from test_reachability import bfs_descendants, random_graph
+from vcd_parser import (analyze_dependencies_parallel, build_descendants_map, compute_signal_changes,
+                        label_events_with_names, parse_vcd_to_events)
+
+VCD_PARSER = str(BACKEND_DIR / "vcd" / "vcd_parser.py")
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "g.mtgraph")
+    write_graph(path, GRAPH)
+    graph = load_dependency_graph(path)
+    assert isinstance(graph, DependencyGraph)
+    assert not graph.has_reachability
+    assert list(graph) == list(GRAPH)
+    assert dict(graph.items()) == GRAPH
+    assert {d: graph[d] for d in graph} == GRAPH
+    assert len(graph) == len(GRAPH) and graph.n_edges == sum(map(len, GRAPH.values()))
+    assert "nope" not in graph
+    with pytest.raises(ValueError, match="without reachability"):
+        graph.descendants("clk")
+
+
+def test_driven_only_nodes_are_not_keys(tmp_path):
+    path = str(tmp_path / "g.mtgraph")
+    write_graph(path, {"a": ["b"], "b": ["c"]})
+    graph = load_dependency_graph(path)
+    assert graph.nodes() == ["a", "b", "c"]
+    assert list(graph) == ["a", "b"]
+    with pytest.raises(KeyError):
+        graph["c"]
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_stored_reachability_matches_bfs(tmp_path, seed):
+    edges = random_graph(seed)
+    path = str(tmp_path / "g.mtgraph")
+    write_graph(path, edges, reachability=True)
+    graph = load_dependency_graph(path)
+    assert graph.has_reachability
+    for a in graph.nodes():
+        expected = bfs_descendants(edges, a)
+        assert set(graph.descendants(a)) == expected
+        for b in graph.nodes():
+            assert graph.is_descendant(a, b) == (b in expected)
+    assert graph.descendants("unknown") == []
+    assert not graph.is_descendant("s0", "unknown")
+
+
+def test_json_export_loads_as_a_dict(tmp_path):
+    binary, text = str(tmp_path / "g.mtgraph"), str(tmp_path / "g.json")
+    write_graph(binary, GRAPH)
+    write_graph_json(text, GRAPH)
+    assert load_dependency_graph(text) == GRAPH
+    assert graph_text(load_dependency_graph(binary)) == graph_text(load_dependency_graph(text))
+    with pytest.raises(ValueError, match="not a MoonTrace dependency graph"):
+        DependencyGraph(text)
+
+
+def test_both_formats_give_the_same_log(trace, tmp_path):
+    logs = []
+    for name, writer in (("g.mtgraph", write_graph), ("g.json", write_graph_json)):
+        graph_path = str(tmp_path / name)
+        writer(graph_path, GRAPH)
+        out = subprocess.run([sys.executable, VCD_PARSER, trace, "--graph", graph_path, "--no-cache"],
+                             check=True, capture_output=True, text=True).stdout
+        logs.append(out)
+    assert "possibly caused" in logs[0]
+    assert logs[0] == logs[1]
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_stored_closure_matches_lazy(tmp_path, seed):
+    edges = random_graph(seed)
+    path = str(tmp_path / "g.mtgraph")
+    write_graph(path, edges, reachability=True)
+    stored = load_dependency_graph(path).reachability()
+    assert isinstance(stored, StoredReachability)
+    lazy = Reachability(edges)
+    assert sorted(stored.nodes) == sorted(lazy.nodes)
+    for a in lazy.nodes:
+        assert set(stored.descendants(a)) == set(lazy.descendants(a))
+        for b in lazy.nodes:
+            assert stored.is_descendant(a, b) == lazy.is_descendant(a, b)
+    copy = pickle.loads(pickle.dumps(stored))
+    assert set(copy.descendants("s0")) == set(stored.descendants("s0"))
+
+
+def test_closure_is_stored_per_component(tmp_path):
+    # a ring of registers is one component reaching itself, fed by a chain
+    n = 200
+    edges = {f"r{k}": [f"r{(k + 1) % n}"] for k in range(n)}
+    edges["in"] = ["r0"]
+    path = str(tmp_path / "g.mtgraph")
+    write_graph(path, edges, reachability=True)
+    graph = load_dependency_graph(path)
+    assert len(graph.members) == 2 and len(graph.closure.targets) == 2
+    assert set(graph.descendants("in")) == set(edges) - {"in"}
+    assert graph.is_descendant("r7", "r7") and not graph.is_descendant("r7", "in")
+
+
+def test_stored_closure_gives_the_same_log(trace, tmp_path):
+    store, id_to_signal = parse_vcd_to_events(trace)
+    changes = compute_signal_changes(label_events_with_names(store, id_to_signal, GRAPH))
+    logs = []
+    for reachability in (False, True):
+        path = str(tmp_path / f"g{reachability}.mtgraph")
+        write_graph(path, GRAPH, reachability=reachability)
+        graph = load_dependency_graph(path)
+        assert isinstance(build_descendants_map(graph), StoredReachability) == reachability
+        for workers in (1, 2):
+            logs.append(list(analyze_dependencies_parallel(changes, graph, time_window=3, workers=workers)))
+    assert logs[0] and all(log == logs[0] for log in logs)
@@ -0,0 +1,56 @@
+import random
+
+from event_store import ChangeStore, EventStore
+from vcd_parser import compute_signal_changes
+
+EVENTS = [(0, "!", "0"), (0, '"', "1010"), (5, "!", "1"), (5, "!", "1"),
+          (7, '"', "1010"), (9, "#", "x"), (12, '"', "zz01"), (12, "!", "0")]
+
+
+def store_of(events):
+    store = EventStore()
+    for (t, sig, val) in events:
+        store.append(t, sig, val)
+    return store
+
+
+def test_store_iterates_as_tuples():
+    store = store_of(EVENTS)
+    assert len(store) == len(EVENTS)
+    assert list(store) == EVENTS
+    assert store[3] == EVENTS[3]
+    assert store[-1] == EVENTS[-1]
+    assert store.signals == ["!", '"', "#"]
+
+
+def test_relabel_shares_columns_and_merges_names():
+    store = store_of(EVENTS)
+    relabeled = store.relabel({"!": "clk", '"': "bus", "#": "clk"})
+    assert relabeled.signals == ["clk", "bus"]
+    assert list(relabeled) == [(t, {"!": "clk", '"': "bus", "#": "clk"}[s], v) for (t, s, v) in EVENTS]
+    assert relabeled.times is store.times
+
+
+def test_dedup_matches_the_streamed_changes():
+    rng = random.Random(1)
+    events = [(t // 3, rng.choice("abcd"), rng.choice(["0", "1", "x", "01"])) for t in range(500)]
+    changes = compute_signal_changes(store_of(events))
+    assert isinstance(changes, ChangeStore)
+    streamed = list(compute_signal_changes(iter(events)))
+    assert list(changes) == streamed
+    assert [changes[i] for i in range(len(changes))] == streamed
+    assert changes.old_value(0) is None
+
+
+def test_slices_keep_old_values_from_before_the_cut():
+    rng = random.Random(4)
+    events = [(t, rng.choice("!\"#$"), rng.choice(["0", "1", "x", "1010"])) for t in range(300)]
+    changes = compute_signal_changes(store_of(events))
+    full = list(changes)
+    n = len(changes)
+    outer = ChangeStore.from_columns(changes.signals, changes.slice_columns(n // 4, n))
+    assert list(outer) == full[n // 4:]
+    # a slice of a slice takes its seeds along
+    inner = ChangeStore.from_columns(changes.signals, outer.slice_columns(n // 4, len(outer) - 3))
+    assert list(inner) == full[n // 2:n - 3]
+    assert inner[0] == full[n // 2]
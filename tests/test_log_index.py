@@ -0,0 +1,117 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import BACKEND_DIR, GRAPH
+from context_builder import build_context
+from dep_graph import graph_text, write_graph_json
+from log_index import LogIndex, LogIndexWriter, log_index_path_for, open_log_index
+from log_sink import Cause, TextSink, format_record
+from vcd_parser import (analyze_dependency_records, compute_signal_changes, iter_vcd_events,
+                        label_events_with_names)
+
+VCD_PARSER = str(BACKEND_DIR / "vcd" / "vcd_parser.py")
+
+
+@pytest.fixture(scope="module")
+def indexed_log(trace, tmp_path_factory):
+    """(log path, records): the trace's log written with its index."""
+    events, id_to_signal = iter_vcd_events(trace)
+    changes = compute_signal_changes(label_events_with_names(events, id_to_signal, GRAPH))
+    records = list(analyze_dependency_records(changes, GRAPH, time_window=3))
+    log_path = str(tmp_path_factory.mktemp("log") / "analysis.txt")
+    writer = LogIndexWriter()
+    with open(log_path, "w") as f, TextSink(f, index=writer) as sink:
+        for r in records:
+            sink.write(r)
+    writer.write(log_index_path_for(log_path), os.path.getsize(log_path))
+    return log_path, records
+
+
+def test_signal_lines(indexed_log):
+    log_path, records = indexed_log
+    index = LogIndex(log_path)
+    assert sorted(index.signals()) == sorted(GRAPH)
+    for signal in GRAPH:
+        expected = [format_record(r) for r in records
+                    if r.signal == signal or getattr(r, "driver", None) == signal]
+        assert index.lines_for_signal(signal) == expected
+        assert index.lines_for_signal(signal, limit=2) == expected[:2]
+        assert index.lines_for_signal(signal, 100, 200) == [
+            format_record(r) for r in records if 100 <= r.time <= 200
+            and (r.signal == signal or getattr(r, "driver", None) == signal)]
+    assert index.lines_for_signal("nope") == []
+
+
+def test_pair_lines(indexed_log):
+    log_path, records = indexed_log
+    index = LogIndex(log_path)
+    pairs = {(r.driver, r.signal) for r in records if isinstance(r, Cause)}
+    assert len(pairs) > 3
+    for driver, driven in pairs:
+        assert index.lines_for_pair(driver, driven) == [
+            format_record(r) for r in records
+            if isinstance(r, Cause) and (r.driver, r.signal) == (driver, driven)]
+    assert index.lines_for_pair("clk", "nope") == []
+
+
+@pytest.mark.parametrize("t0, t1", [(0, 0), (95, 205), (333, 333), (590, 10 ** 6), (10 ** 6, 10 ** 7)])
+def test_time_lines(indexed_log, t0, t1):
+    log_path, records = indexed_log
+    index = LogIndex(log_path)
+    expected = [format_record(r) for r in records if t0 <= r.time <= t1]
+    assert index.lines_for_time(t0, t1) == expected
+    assert index.lines_for_time(t0, t1, limit=3) == expected[:3]
+
+
+def test_stale_index_is_not_used(indexed_log, tmp_path):
+    log_path, _ = indexed_log
+    copy = str(tmp_path / "analysis.txt")
+    with open(log_path) as src, open(copy, "w") as dst:
+        dst.write(src.read() + "Time 99999: clk changed from 0 to 1.\n")
+    with open(log_index_path_for(log_path), "rb") as src, open(log_index_path_for(copy), "wb") as dst:
+        dst.write(src.read())
+    with pytest.raises(ValueError, match="stale"):
+        LogIndex(copy)
+    assert open_log_index(copy) is None
+    assert open_log_index(str(tmp_path / "missing.txt")) is None
+
+
+def test_context_from_the_index(indexed_log, tmp_path):
+    log_path, records = indexed_log
+    graph_path = str(tmp_path / "graph.txt")
+    with open(graph_path, "w") as f:
+        f.write(graph_text(GRAPH) + "\n")
+    context = build_context("why does bus change around time 300?", graph_path, log_path, budget=400)
+    lines = context["analysis"].splitlines()
+    assert lines and set(lines) <= {format_record(r) for r in records}
+    assert any("bus" in line for line in lines)
+
+
+@pytest.mark.parametrize("args, indexed", [
+    ((), True),
+    (("--no-log-index",), False),
+    (("--format", "jsonl"), False),
+    (("--stream",), False),
+    (("--stream", "--log-index"), True),
+    (("--follow", "--idle-timeout", "0"), False),
+])
+def test_cli_writes_the_index(trace, tmp_path, args, indexed):
+    graph_path = str(tmp_path / "g.json")
+    write_graph_json(graph_path, GRAPH)
+    out = str(tmp_path / "log.txt")
+    subprocess.run([sys.executable, VCD_PARSER, trace, "--graph", graph_path, "--no-cache",
+                    "--output", out, *args], check=True, capture_output=True)
+    assert os.path.exists(log_index_path_for(out)) == indexed
+    if indexed:
+        with open(out) as f:
+            first = f.readline().rstrip("\n")
+        assert LogIndex(out).lines_for_time(0, 0)[0] == first
+
+
+def test_cli_rejects_an_index_while_following(trace, tmp_path):
+    result = subprocess.run([sys.executable, VCD_PARSER, trace, "--follow", "--log-index",
+                             "--output", str(tmp_path / "log.txt")], capture_output=True, text=True)
+    assert result.returncode == 2 and "--follow cannot be combined with --log-index" in result.stderr
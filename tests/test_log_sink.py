@@ -0,0 +1,70 @@
+import io
+import json
+
+import pytest
+
+from conftest import GRAPH
+from log_sink import (BinarySink, Cause, Change, JsonlSink, MultipleDrivers, TextSink, format_record,
+                      read_binary_log)
+from vcd_parser import (analyze_dependencies_possible, analyze_dependency_records, compute_signal_changes,
+                        iter_vcd_events, label_events_with_names)
+
+
+@pytest.fixture(scope="module")
+def records(trace):
+    events, id_to_signal = iter_vcd_events(trace)
+    changes = compute_signal_changes(label_events_with_names(events, id_to_signal, GRAPH))
+    records = list(analyze_dependency_records(changes, GRAPH, time_window=3))
+    assert {type(r) for r in records} == {Change, Cause, MultipleDrivers}
+    return records
+
+
+def test_text_sink_writes_the_log(trace, records):
+    out = io.StringIO()
+    with TextSink(out) as sink:
+        for r in records:
+            sink.write(r)
+    events, id_to_signal = iter_vcd_events(trace)
+    changes = compute_signal_changes(label_events_with_names(events, id_to_signal, GRAPH))
+    assert out.getvalue().splitlines() == list(analyze_dependencies_possible(changes, GRAPH, time_window=3))
+    assert out.getvalue().splitlines() == [format_record(r) for r in records]
+
+
+def test_jsonl_round_trip(records):
+    out = io.StringIO()
+    with JsonlSink(out) as sink:
+        for r in records:
+            sink.write(r)
+    kinds = {"change": Change, "cause": Cause, "multiple_drivers": MultipleDrivers}
+    back = []
+    for line in out.getvalue().splitlines():
+        obj = json.loads(line)
+        record = kinds[obj.pop("kind")](**obj)
+        if isinstance(record, MultipleDrivers):
+            record = record._replace(drivers=tuple(record.drivers))
+        back.append(record)
+    assert back == records
+
+
+def test_binary_round_trip(records):
+    # None old values (first change of a signal) and multi-bit values included
+    extra = [Change(7, "bus", None, "1x01"), Change(2 ** 40, "bus", "1x01", "")]
+    out = io.BytesIO()
+    with BinarySink(out) as sink:
+        for r in records + extra:
+            sink.write(r)
+    out.seek(0)
+    assert list(read_binary_log(out)) == records + extra
+
+
+def test_binary_log_names_are_interned(records):
+    out = io.BytesIO()
+    with BinarySink(out) as sink:
+        for r in records:
+            sink.write(r)
+    assert out.getvalue().count(b"S\x03\x00\x00\x00clk") == 1
+
+
+def test_not_a_binary_log():
+    with pytest.raises(ValueError, match="not a MoonTrace binary log"):
+        list(read_binary_log(io.BytesIO(b"Time 0: clk changed")))
@@ -0,0 +1,109 @@
+from collections import defaultdict
+
+from parser import find_root_modules, iter_module_summaries, parse_verilator_xml_signals
+from workload import Workload, generate
+
+TINY = dict(modules=4, depth=2, fanout=2, signals=6, cycles=10, activity=0.3)
+
+# everything the streaming parser has to skip or keep apart: sections
+# before and after the netlist, nested <begin>s, a compound driven side
+XML = """<?xml version="1.0" ?>
+<verilator_xml>
+<files><file id="a" filename="top.v"/></files>
+<netlist>
+<module name="top">
+  <var name="clk"/>
+  <contassign><and><varref name="a"/><const name="1"/></and><varref name="b"/></contassign>
+  <always><if><varref name="en"/>
+    <begin><begin><assigndly><varref name="b"/><varref name="q"/></assigndly></begin></begin>
+    <begin><contassign><varref name="c"/><varref name="r"/></contassign></begin>
+  </if></always>
+  <instance name="u0" defName="leaf"><port name="i" direction="in"><varref name="q"/></port><port name="o" direction="out"><varref name="y"/></port></instance>
+</module>
+<module name="leaf">
+  <contassign><varref name="i"/><sel><varref name="o"/><const name="0"/></sel></contassign>
+</module>
+</netlist>
+<cells><cell name="top"/></cells>
+</verilator_xml>
+"""
+
+# 'loop' instantiates itself
+RECURSIVE_XML = """<verilator_xml><netlist>
+<module name="loop"><contassign><varref name="i"/><varref name="o"/></contassign>
+<instance name="u" defName="loop"><port name="i" direction="in"><varref name="o"/></port></instance></module>
+</netlist></verilator_xml>
+"""
+
+
+def workload_edges(workload, top="top"):
+    """The graph a Verilator run of 'workload' gives, built from the generator's own tables."""
+    edges = defaultdict(set)
+
+    def elaborate(mname, at):
+        mod = workload.modules[mname]
+        for driven, drivers in mod["assigns"]:
+            for d in drivers:
+                edges[f"{at}.{d}"].add(f"{at}.{driven}")
+        edges[f"{at}.s{workload.signals - 1}"].add(f"{at}.dout")
+        for reg in mod["registers"]:
+            edges[f"{at}.rst"].add(f"{at}.{reg}")
+            edges[f"{at}.{reg}"].add(f"{at}.{reg}")
+        for (inst, k), parent_in in zip(mod["children"], mod["child_ins"]):
+            child = f"{at}.{inst}"
+            for parent_sig, port in (("clk", "clk"), ("rst", "rst"), (parent_in, "din")):
+                edges[f"{at}.{parent_sig}"].add(f"{child}.{port}")
+            edges[f"{child}.dout"].add(f"{at}.c{k}_out")
+            elaborate(inst[2:inst.rindex("_")], child)
+
+    elaborate(top, top)
+    return dict(edges)
+
+
+def test_graph_of_a_generated_design(tmp_path):
+    xml_path, _ = generate(str(tmp_path), seed=3, **TINY)
+    workload = Workload(seed=3, **TINY)
+    assert dict(parse_verilator_xml_signals(xml_path, "top")) == workload_edges(workload)
+
+    # without a top module, every module nothing instantiates is a root
+    used = {inst[2:inst.rindex("_")] for mod in workload.modules.values() for inst, _ in mod["children"]}
+    roots = [m for m in workload.modules if m not in used]
+    assert roots[0] == "top" and len(roots) > 1
+    expected = {}
+    for root in roots:
+        expected.update(workload_edges(workload, root))
+    assert dict(parse_verilator_xml_signals(xml_path)) == expected
+
+
+def test_sections_around_the_netlist(tmp_path):
+    xml_path = tmp_path / "top.xml"
+    xml_path.write_text(XML)
+    assert [name for name, _ in iter_module_summaries(str(xml_path))] == ["top", "leaf"]
+    graph = parse_verilator_xml_signals(str(xml_path), "top")
+    assert dict(graph) == {
+        "top.a": {"top.b"},
+        "top.en": {"top.q", "top.r"},
+        # an <if> pairs every driver in it with every driven signal
+        "top.b": {"top.q", "top.r"},
+        "top.c": {"top.q", "top.r"},
+        "top.q": {"top.u0.i"},
+        "top.u0.o": {"top.y"},
+        "top.u0.i": {"top.u0.o"},
+    }
+
+
+def test_root_modules():
+    summary = {"edges": [], "instances": []}
+    uses = {"edges": [], "instances": [("u", "leaf", [])]}
+    assert find_root_modules({"a": uses, "leaf": summary, "b": summary}) == ["a", "b"]
+    cycle = {"edges": [], "instances": [("u", "x", [])]}
+    assert find_root_modules({"x": cycle}) == ["x"]
+
+
+def test_self_instantiation_terminates(tmp_path):
+    xml_path = tmp_path / "loop.xml"
+    xml_path.write_text(RECURSIVE_XML)
+    assert dict(parse_verilator_xml_signals(str(xml_path))) == {
+        "loop.i": {"loop.o"},
+        "loop.o": {"loop.u.i"},
+    }
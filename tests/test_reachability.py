@@ -0,0 +1,74 @@
+import random
+from collections import deque
+
+import pytest
+
+from reachability import Reachability
+
+
+def bfs_descendants(edges, a):
+    seen, queue = set(), deque([a])
+    while queue:
+        for nxt in edges.get(queue.popleft(), ()):
+            if nxt not in seen:
+                seen.add(nxt)
+                queue.append(nxt)
+    return seen
+
+
+def random_graph(seed, n=60, n_edges=90):
+    rng = random.Random(seed)
+    edges = {}
+    for _ in range(n_edges):
+        a, b = rng.randrange(n), rng.randrange(n)
+        edges.setdefault(f"s{a}", []).append(f"s{b}")
+    return edges
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_bfs(seed):
+    edges = random_graph(seed)
+    reach = Reachability(edges)
+    nodes = set(reach.nodes)
+    for a in nodes:
+        expected = bfs_descendants(edges, a)
+        assert set(reach.descendants(a)) == expected
+        for b in nodes:
+            assert reach.is_descendant(a, b) == (b in expected)
+
+
+def test_cycles_and_self_loops():
+    edges = {"a": ["b"], "b": ["c"], "c": ["a", "d"], "r": ["r"], "x": ["a"]}
+    reach = Reachability(edges)
+    # a node on a loop reaches itself, one off it does not
+    assert reach.is_descendant("a", "a") and reach.is_descendant("r", "r")
+    assert not reach.is_descendant("x", "x")
+    assert set(reach.descendants("x")) == {"a", "b", "c", "d"}
+    assert reach.comp_of[reach.index["a"]] == reach.comp_of[reach.index["c"]]
+
+
+def test_dict_interface():
+    reach = Reachability({"a": ["b"], "b": ["c"]})
+    assert "a" in reach and "c" not in reach
+    assert "c" in reach["a"] and "a" not in reach["a"]
+    assert len(reach["a"]) == 2 and set(reach["a"]) == {"b", "c"}
+    assert not reach.is_descendant("a", "unknown")
+    assert list(reach.descendants("unknown")) == []
+    with pytest.raises(KeyError):
+        reach["c"]
+
+
+def test_long_chain_does_not_recurse():
+    n = 50000
+    edges = {f"s{i}": [f"s{i + 1}"] for i in range(n)}
+    edges[f"s{n}"] = ["s0"]
+    reach = Reachability(edges)
+    assert reach.is_descendant("s10", "s9")
+    assert len(reach.members) == 1
+
+
+def test_long_dag_closure_is_iterative():
+    n = 3000
+    reach = Reachability({f"s{i}": [f"s{i + 1}"] for i in range(n)})
+    assert reach.is_descendant("s0", f"s{n}")
+    assert not reach.is_descendant(f"s{n}", "s0")
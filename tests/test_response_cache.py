@@ -0,0 +1,107 @@
+import os
+
+import pytest
+
+import response_cache
+from response_cache import ResponseCache, backend_model, cache_from_env, cache_key, stub_reply
+
+
+def test_cache_key_covers_the_request():
+    messages = [{"role": "user", "content": "why is q x?"}]
+    key = cache_key("m", "system", messages)
+    assert key == cache_key("m", "system", [dict(m) for m in messages])
+    assert key != cache_key("other", "system", messages)
+    assert key != cache_key("m", "system 2", messages)
+    assert key != cache_key("m", "system", messages + messages)
+    assert key != cache_key("m", "system", messages, max_tokens=200)
+
+
+def test_stub_replies_are_keyed_apart(monkeypatch):
+    monkeypatch.delenv("MOONTRACE_BACKEND", raising=False)
+    real = cache_key(backend_model("gpt-4o-mini"), "s", [])
+    monkeypatch.setenv("MOONTRACE_BACKEND", "stub")
+    assert backend_model("gpt-4o-mini") == "stub"
+    assert cache_key(backend_model("gpt-4o-mini"), "s", []) != real
+
+
+def test_memory_and_disk(tmp_path):
+    cache = ResponseCache(str(tmp_path), memory_entries=2)
+    for i in range(3):
+        cache.put(f"k{i}", f"reply {i}")
+    assert list(cache._memory) == ["k1", "k2"]
+    # evicted from memory, still on disk
+    assert cache.get("k0") == "reply 0"
+    assert ResponseCache(str(tmp_path)).get("k2") == "reply 2"
+    assert cache.get("missing") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_memory_only():
+    cache = ResponseCache(None)
+    cache.put("k", "reply")
+    assert cache.get("k") == "reply"
+
+
+def test_ttl(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "time", lambda: now[0])
+    cache = ResponseCache(str(tmp_path), ttl=60)
+    cache.put("k", "reply")
+    now[0] += 59
+    assert cache.get("k") == "reply"
+    now[0] += 2
+    assert cache.get("k") is None
+    assert not os.path.exists(cache._path("k"))
+
+
+def test_max_files(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_files=2)
+    for i in range(4):
+        cache.put(f"k{i}", "reply")
+        path = cache._path(f"k{i}")
+        os.utime(path, (i, i))
+    assert len(os.listdir(tmp_path)) == 2
+
+
+def test_unreadable_entry_is_a_miss(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    with open(cache._path("k"), "w") as f:
+        f.write("{")
+    assert cache.get("k") is None
+
+
+def test_stream_stores_the_reply(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    emitted = []
+    assert cache.stream("k", lambda: iter(["a", "b"]), emitted.append) == "ab"
+
+    def no_call():
+        pytest.fail("cache was not used")
+    assert cache.stream("k", no_call, emitted.append) == "ab"
+    assert emitted == ["a", "b", "ab"]
+
+
+def test_cache_from_env(tmp_path, monkeypatch):
+    monkeypatch.setenv("MOONTRACE_RESPONSE_CACHE", "0")
+    assert cache_from_env(str(tmp_path)) is None
+    monkeypatch.setenv("MOONTRACE_RESPONSE_CACHE", "1")
+    monkeypatch.setenv("MOONTRACE_CACHE_TTL", "0")
+    assert cache_from_env(str(tmp_path)).ttl is None
+    monkeypatch.setenv("MOONTRACE_CACHE_TTL", "soon")
+    assert cache_from_env(str(tmp_path)).ttl == response_cache.DEFAULT_TTL
+
+
+def test_stub_reply_echoes_the_question():
+    messages = [{"role": "system", "content": "s"}, {"role": "user", "content": "why?"}]
+    assert "".join(stub_reply(messages)).endswith("why?")
+
+
+def test_unwritable_cache_is_warned_about_on_stderr(tmp_path, capsys):
+    # a file where the cache directory should be
+    blocked = tmp_path / "cache"
+    blocked.write_text("")
+    cache = ResponseCache(str(blocked))
+    cache.put("k", "reply")
+    out, err = capsys.readouterr()
+    assert out == "" and "[Warning] Could not write response cache" in err
+    assert cache.get("k") == "reply"
@@ -0,0 +1,53 @@
+import io
+import json
+
+import pytest
+
+from stage_stats import StageStats
+
+
+def test_stages_are_recorded_in_order():
+    stats = StageStats()
+    with stats.stage("parse", path="x.vcd") as st:
+        st["events"] = 3
+    with pytest.raises(RuntimeError):
+        with stats.stage("analyze"):
+            raise RuntimeError("boom")
+    assert [e["stage"] for e in stats.stages] == ["parse", "analyze"]
+    first = stats.stages[0]
+    assert first["path"] == "x.vcd" and first["events"] == 3
+    assert first["seconds"] >= 0
+    assert first["peak_rss_scope"] in ("stage", "process")
+    summary = stats.summary()
+    assert "parse" in summary and "events=3" in summary and "total" in summary
+
+
+def test_write_json(tmp_path):
+    stats = StageStats()
+    with stats.stage("load_graph", edges=7):
+        pass
+    path = tmp_path / "stats.json"
+    stats.write_json(str(path))
+    report = json.loads(path.read_text())
+    assert [e["stage"] for e in report["stages"]] == ["load_graph"]
+    assert report["stages"][0]["edges"] == 7
+    assert report["total_seconds"] >= report["stages"][0]["seconds"]
+
+
+@pytest.mark.parametrize("profile, marker", [("cprofile", "function calls"), ("tracemalloc", "traced peak")])
+def test_only_the_chosen_stages_are_profiled(profile, marker):
+    out = io.StringIO()
+    stats = StageStats(profile=profile, profile_stages={"hot"}, profile_out=out)
+    with stats.stage("cold"):
+        sum(range(1000))
+    with stats.stage("hot"):
+        [bytes(100) for _ in range(100)]
+    text = out.getvalue()
+    assert f"--- {profile} profile of stage 'hot' ---" in text
+    assert "'cold'" not in text
+    assert marker in text
+
+
+def test_unknown_profiler():
+    with pytest.raises(ValueError, match="unknown profiler"):
+        StageStats(profile="perf")
@@ -0,0 +1,43 @@
+from dep_graph import graph_text, load_dependency_graph, write_graph
+from parser import parse_verilator_xml_ids, parse_verilator_xml_signals
+from symbols import SymbolTable
+from test_parser import TINY
+from workload import generate
+
+
+def test_names_round_trip():
+    symbols = SymbolTable()
+    names = ["counter.u_x.count", "counter.count", "clk", "counter.u_x.count", "a..b"]
+    ids = [symbols.intern(n) for n in names]
+    assert ids[0] == ids[3]
+    assert [symbols.name(i) for i in ids] == names
+    # every prefix has an id of its own, below its children's
+    assert symbols.lookup("counter.u_x") < ids[0]
+    assert symbols.lookup("counter.u_y") is None
+    table = symbols.names()
+    assert len(table) == len(symbols)
+    assert all(table[i] == symbols.name(i) for i in range(len(symbols)))
+
+
+def test_paths_under_a_prefix():
+    symbols = SymbolTable()
+    inst = symbols.intern("top.u_0")
+    ids = symbols.intern_paths(inst, [("s1",), "top.a,top.b", ("u_1", "dout")])
+    assert ids[1] is None
+    assert symbols.name(ids[0]) == "top.u_0.s1"
+    assert ids[2] == symbols.intern_path(inst, ("u_1", "dout")) == symbols.intern("top.u_0.u_1.dout")
+    assert symbols.child(symbols.lookup("top.u_0.u_1"), "dout") == ids[2]
+
+
+def test_ids_give_the_named_graph(tmp_path):
+    xml_path, _ = generate(str(tmp_path), seed=3, **TINY)
+    id_edges, symbols = parse_verilator_xml_ids(xml_path)
+    names = symbols.names()
+    named = {names[d]: {names[x] for x in driven} for d, driven in id_edges.items()}
+    assert named == dict(parse_verilator_xml_signals(xml_path))
+
+    graph_path = str(tmp_path / "g.mtgraph")
+    write_graph(graph_path, id_edges, names=names)
+    graph = load_dependency_graph(graph_path)
+    assert {d: set(driven) for d, driven in graph.items()} == named
+    assert graph_text(id_edges, names) == graph_text(graph)
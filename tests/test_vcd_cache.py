@@ -0,0 +1,75 @@
+import os
+import shutil
+
+import pytest
+
+from vcd_cache import cache_path_for, cached_parse, load_cache, save_cache, vcd_fingerprint
+from vcd_parser import compute_signal_changes, parse_vcd_to_events
+
+
+@pytest.fixture
+def dump(trace, tmp_path):
+    path = str(tmp_path / "trace.vcd")
+    shutil.copy(trace, path)
+    return path
+
+
+def no_parse(path):
+    pytest.fail("the cache was not used")
+
+
+def test_round_trip(dump):
+    store, id_to_signal = cached_parse(dump, parse_vcd_to_events)
+    assert os.path.exists(cache_path_for(dump))
+    cached, cached_ids = cached_parse(dump, no_parse)
+    assert list(cached) == list(store)
+    assert cached.signals == store.signals
+    assert cached_ids == id_to_signal
+    # the mapped columns work through the rest of the pipeline
+    assert list(compute_signal_changes(cached)) == list(compute_signal_changes(store))
+
+
+def test_changed_dump_is_parsed_again(dump):
+    cached_parse(dump, parse_vcd_to_events)
+    with open(dump, "a") as f:
+        f.write("#99999\n1!\n")
+    store, _ = cached_parse(dump, parse_vcd_to_events)
+    assert store[-1] == (99999, "!", "1")
+
+
+def test_same_size_and_mtime_rewrite_is_detected(dump):
+    cached_parse(dump, parse_vcd_to_events)
+    st = os.stat(dump)
+    with open(dump, "r+b") as f:
+        f.seek(-2, os.SEEK_END)
+        f.write(b"1" if f.read(1) == b"0" else b"0")
+    os.utime(dump, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert load_cache(cache_path_for(dump), vcd_fingerprint(dump)) is None
+
+
+@pytest.mark.parametrize("damage", [b"", b"MTVCDC\n", b"not a cache at all"])
+def test_unreadable_cache_is_ignored(dump, damage):
+    store, _ = cached_parse(dump, parse_vcd_to_events)
+    with open(cache_path_for(dump), "wb") as f:
+        f.write(damage)
+    assert load_cache(cache_path_for(dump), vcd_fingerprint(dump)) is None
+    again, _ = cached_parse(dump, parse_vcd_to_events)
+    assert list(again) == list(store)
+
+
+def test_truncated_cache_is_ignored(dump):
+    store, id_to_signal = parse_vcd_to_events(dump)
+    path = cache_path_for(dump)
+    save_cache(path, vcd_fingerprint(dump), store, id_to_signal)
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 1)
+    assert load_cache(path, vcd_fingerprint(dump)) is None
+
+
+def test_unwritable_cache_is_warned_about_on_stderr(dump, capsys):
+    # a directory in the cache's place cannot be replaced by the new file
+    os.mkdir(cache_path_for(dump))
+    store, _ = cached_parse(dump, parse_vcd_to_events)
+    assert list(store) == list(parse_vcd_to_events(dump)[0])
+    out, err = capsys.readouterr()
+    assert out == "" and "[Warning] Could not write VCD cache" in err
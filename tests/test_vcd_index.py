@@ -0,0 +1,79 @@
+import os
+import shutil
+
+import pytest
+
+from conftest import GRAPH
+import vcd_index
+from vcd_index import build_vcd_index, extract_window, index_path_for, load_vcd_index
+from vcd_parser import compute_signal_changes, label_events_with_names, parse_vcd_to_events
+
+WINDOWS = [(0, 0), (0, 100), (215, 480), (333, 333), (334, 336), (590, 10 ** 6), (10 ** 6, 10 ** 7)]
+
+
+@pytest.fixture
+def dump(trace, tmp_path):
+    path = str(tmp_path / "trace.vcd")
+    shutil.copy(trace, path)
+    return path
+
+
+def window_changes(vcd_path, t0, t1, index):
+    events, id_to_signal, state = extract_window(vcd_path, t0, t1, index=index)
+    initial_values = {name: val for (_, name, val) in label_events_with_names(
+        [(t0, vid, val) for vid, val in state.items()], id_to_signal, GRAPH)}
+    return list(compute_signal_changes(label_events_with_names(events, id_to_signal, GRAPH), initial_values))
+
+
+@pytest.mark.parametrize("checkpoint_stride", [1, 700, 10 ** 9])
+def test_window_matches_full_trace(dump, checkpoint_stride):
+    index = build_vcd_index(dump, checkpoint_stride=checkpoint_stride)
+    store, id_to_signal = parse_vcd_to_events(dump)
+    full = list(compute_signal_changes(label_events_with_names(store, id_to_signal, GRAPH)))
+    for t0, t1 in WINDOWS:
+        assert window_changes(dump, t0, t1, index) == [c for c in full if t0 <= c[0] <= t1]
+
+
+def test_state_at_t0(dump):
+    index = build_vcd_index(dump, checkpoint_stride=700)
+    assert len(index) > 3
+    store, _ = parse_vcd_to_events(dump)
+    for t0 in (1, 250, 333, 10 ** 6):
+        expected = {}
+        for (t, vid, val) in store:
+            if t < t0:
+                expected.pop(vid, None)
+                expected[vid] = val
+        _, _, state = extract_window(dump, t0, t0, index=index)
+        assert list(state.items()) == list(expected.items())
+
+
+def test_index_is_reused_until_the_dump_changes(dump):
+    assert load_vcd_index(dump, build=False) is None
+    index = load_vcd_index(dump)
+    assert os.path.exists(index_path_for(dump))
+    assert list(load_vcd_index(dump, build=False).times) == list(index.times)
+    with open(dump, "a") as f:
+        f.write("#99999\n1!\n")
+    assert load_vcd_index(dump, build=False) is None
+    events, _, _ = extract_window(dump, 99999, 99999)
+    assert list(events) == [(99999, "!", "1")]
+
+
+def test_window_decodes_one_checkpoint(dump, monkeypatch):
+    build_vcd_index(dump, checkpoint_stride=700)
+    index = load_vcd_index(dump, build=False)
+    decoded = []
+    checkpoint = vcd_index.VcdIndex.checkpoint
+    monkeypatch.setattr(vcd_index.VcdIndex, "checkpoint", lambda self, k: decoded.append(k) or checkpoint(self, k))
+    events, _, _ = extract_window(dump, 400, 420, index=index)
+    list(events)
+    assert len(decoded) == 1 and index.times[decoded[0]] <= 400 < index.times[decoded[0] + 1]
+
+
+def test_truncated_index_is_rebuilt(dump):
+    build_vcd_index(dump, checkpoint_stride=700)
+    with open(index_path_for(dump), "r+b") as f:
+        f.truncate(os.path.getsize(index_path_for(dump)) // 2)
+    assert load_vcd_index(dump, build=False) is None
+    assert len(load_vcd_index(dump)) == 1  # rebuilt with the default stride
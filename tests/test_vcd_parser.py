@@ -0,0 +1,407 @@
+import bisect
+import itertools
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+
+import pytest
+
+import vcd_parser
+from conftest import BACKEND_DIR, GRAPH, write_trace
+from dep_graph import write_graph_json
+from vcd_parser import (ClockError, SignalNameResolver, _follow_lines, _split_vcd_body,
+                        analyze_dependencies_parallel, analyze_dependencies_possible,
+                        analyze_dependency_records, compute_signal_changes, detect_clock,
+                        follow_vcd_events, iter_vcd_events, label_events_with_names,
+                        parse_vcd_parallel, parse_vcd_to_events)
+
+VCD_PARSER = str(BACKEND_DIR / "vcd" / "vcd_parser.py")
+
+
+def reference_log(changes, edges, time_window=10, clock=None, cycles=1, edge="posedge"):
+    """The analysis as it was before streaming: every change in memory, one pass per time."""
+    inactive, active = {"posedge": ("0", "1"), "negedge": ("1", "0")}[edge]
+    edge_times = sorted({t for (t, sig, ov, nv) in changes
+                         if sig == clock and (ov, nv) == (inactive, active)})
+
+    def window_end(t):
+        if clock is None:
+            return t + time_window
+        i = bisect.bisect_right(edge_times, t) + cycles - 1
+        return edge_times[i] if i < len(edge_times) else float('inf')
+
+    descendants_of = {}
+    for driver in edges:
+        seen, queue = set(), deque([driver])
+        while queue:
+            for nxt in edges.get(queue.popleft(), ()):
+                if nxt not in seen:
+                    seen.add(nxt)
+                    queue.append(nxt)
+        descendants_of[driver] = seen
+
+    changes_by_time = defaultdict(list)
+    for (t, sig, ov, nv) in changes:
+        changes_by_time[t].append((sig, ov, nv))
+    log = []
+    drivers_by_signal = defaultdict(lambda: defaultdict(set))
+    all_times = sorted(changes_by_time)
+    for t in all_times:
+        for (driver, ov, nv) in changes_by_time[t]:
+            log.append(f"Time {t}: {driver} changed from {ov} to {nv}.")
+            in_window = all_times[bisect.bisect_left(all_times, t):bisect.bisect_right(all_times, window_end(t))]
+            for look_time in in_window:
+                for (dsig, _, d_new) in changes_by_time[look_time]:
+                    if dsig in descendants_of.get(driver, ()):
+                        drivers_by_signal[look_time][dsig].add(driver)
+                        log.append(f"   => {driver} possibly caused {dsig} to change to {d_new} "
+                                   f"at time {look_time}")
+        for signal, drivers in drivers_by_signal.pop(t, {}).items():
+            if len(drivers) > 1:
+                log.append(f"Time {t}: Signal {signal} has multiple possible drivers: "
+                           f"{', '.join(sorted(drivers))}")
+    return log
+
+
+def changes_of(vcd_path, graph=GRAPH, stream=True):
+    if stream:
+        events, id_to_signal = iter_vcd_events(vcd_path)
+    else:
+        events, id_to_signal = parse_vcd_to_events(vcd_path)
+    return list(compute_signal_changes(label_events_with_names(events, id_to_signal, graph)))
+
+
+def test_stream_matches_parse(trace):
+    events, id_to_signal = iter_vcd_events(trace)
+    # the header is read before the first event is asked for
+    assert sorted(id_to_signal.values()) == sorted([f"top.{net}"] for net in GRAPH)
+    stored, stored_ids = parse_vcd_to_events(trace)
+    assert list(events) == list(stored)
+    assert stored_ids == id_to_signal
+
+
+NESTED_VCD = """$timescale 1ns $end
+$scope module TOP $end
+$var wire 1 ! clk $end
+$scope module counter $end
+$var wire 4 " count $end
+$scope module u_x $end
+$var wire 4 # count $end
+$upscope $end
+$var wire 1 $ en $end
+$upscope $end
+$upscope $end
+$enddefinitions $end
+#0
+0!
+b0000 "
+b0000 #
+1$
+#5
+1!
+b0001 #
+"""
+
+
+def test_names_follow_scopes(tmp_path):
+    path = tmp_path / "nested.vcd"
+    path.write_text(NESTED_VCD)
+    events, id_to_signal = iter_vcd_events(str(path))
+    assert id_to_signal == {"!": ["TOP.clk"], '"': ["TOP.counter.count"],
+                            "#": ["TOP.counter.u_x.count"], "$": ["TOP.counter.en"]}
+    assert parse_vcd_parallel(str(path), workers=2)[1] == id_to_signal
+
+    graph = {"counter.u_x.count": ["counter.count"], "counter.count": []}
+    labeled = list(label_events_with_names(events, id_to_signal, graph))
+    # the longest scope suffix in the graph wins; the two counts stay apart
+    assert (5, "counter.u_x.count", "0001") in labeled
+    assert (0, "counter.count", "0000") in labeled
+
+
+def test_resolution_order():
+    graph = {"soc.counter.u_x.count": ["soc.counter.count"], "clk": []}
+    resolver = SignalNameResolver({"!": ["TOP.clk"], '"': ["TOP.counter.u_x.count"],
+                                   "#": ["TOP.counter.count"], "$": ["TOP.other.thing"]}, graph)
+    assert resolver.resolve("!") == "clk"
+    assert resolver.resolve('"') == "soc.counter.u_x.count"
+    assert resolver.resolve("#") == "soc.counter.count"
+    assert resolver.resolve("$") == "TOP.other.thing"
+    assert resolver.resolve("?") == "<unknown:?>"
+
+
+# one net declared under two scopes ('!' is both TOP.clk and TOP.top.clk)
+ALIASED_VCD = """$timescale 1ns $end
+$scope module TOP $end
+$var wire 1 ! clk $end
+$scope module top $end
+$var wire 1 ! clk $end
+$var wire 1 " q $end
+$upscope $end
+$upscope $end
+$enddefinitions $end
+#0
+0!
+0"
+#5
+1!
+#6
+1"
+#10
+0!
+#15
+1!
+#16
+0"
+#20
+0!
+"""
+
+
+def test_aliases_are_kept_and_resolved(tmp_path):
+    path = tmp_path / "aliased.vcd"
+    path.write_text(ALIASED_VCD)
+    graph = {"top.clk": ["top.q"]}
+    _, id_to_signal = parse_vcd_to_events(str(path))
+    assert id_to_signal["!"] == ["TOP.clk", "TOP.top.clk"]
+    assert parse_vcd_parallel(str(path), workers=2)[1] == id_to_signal
+
+    resolver = SignalNameResolver(id_to_signal, graph)
+    assert resolver.resolve("!") == "top.clk"
+    assert resolver.aliases()["TOP.clk"] == "top.clk"
+    log = list(analyze_dependencies_possible(changes_of(str(path), graph), graph, clock="top.clk"))
+    assert "   => top.clk possibly caused top.q to change to 1 at time 6" in log
+
+
+def test_ambiguous_suffix_falls_back_to_vcd_name():
+    graph = {"a.u0.x": ["b.u1.x"]}
+    resolver = SignalNameResolver({"!": ["TOP.z.x"], '"': ["TOP.w.u0.x"], "#": ["TOP.b.u1.x"]}, graph)
+    # "x" ends both nodes; "u0.x" and "u1.x" end one each
+    assert resolver.resolve("!") == "TOP.z.x"
+    assert resolver.resolve('"') == "a.u0.x"
+    assert resolver.resolve("#") == "b.u1.x"
+
+
+def test_events_are_in_file_order(trace):
+    events, _ = iter_vcd_events(trace)
+    times = [t for (t, _, _) in events]
+    assert times == sorted(times)
+    assert times[0] == 0
+
+
+@pytest.mark.parametrize("time_window", [0, 1, 3, 12])
+def test_analysis_matches_reference(trace, time_window):
+    changes = changes_of(trace)
+    log = list(analyze_dependencies_possible(iter(changes), GRAPH, time_window=time_window))
+    assert log == reference_log(changes, GRAPH, time_window)
+    assert any("possibly caused" in line for line in log)
+    assert any("multiple possible drivers" in line for line in log)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_window_join_on_sparse_times(seed):
+    # a wide timescale: the join must not step through time units
+    rng = random.Random(seed)
+    edges = {f"s{i}": [f"s{rng.randrange(12)}" for _ in range(2)] for i in range(12)}
+    changes, t = [], 0
+    for _ in range(400):
+        t += rng.choice([0, 0, 1, 10 ** 6, 3 * 10 ** 6])
+        changes.append((t, f"s{rng.randrange(14)}", None, str(rng.getrandbits(1))))
+    for time_window in (0, 10 ** 6, 5 * 10 ** 6):
+        log = list(analyze_dependencies_possible(iter(changes), edges, time_window=time_window))
+        assert log == reference_log(changes, edges, time_window)
+
+
+@pytest.mark.parametrize("cycles", [1, 2, 3])
+@pytest.mark.parametrize("edge", ["posedge", "negedge"])
+def test_clocked_analysis_matches_reference(trace, edge, cycles):
+    changes = changes_of(trace)
+    log = list(analyze_dependencies_possible(iter(changes), GRAPH, clock="clk", cycles=cycles, edge=edge))
+    assert log == reference_log(changes, GRAPH, clock="clk", cycles=cycles, edge=edge)
+    assert log != list(analyze_dependencies_possible(iter(changes), GRAPH, time_window=1))
+
+
+def test_detect_clock(trace):
+    changes = changes_of(trace)
+    clock, replay = detect_clock(iter(changes), sample=50)
+    assert clock == "clk"
+    assert list(replay) == changes
+    store, id_to_signal = parse_vcd_to_events(trace)
+    stored = compute_signal_changes(label_events_with_names(store, id_to_signal, GRAPH))
+    assert detect_clock(stored) == ("clk", stored)
+    assert detect_clock(iter([(t, "x", None, str(t % 2)) for t in range(3)]))[0] is None
+
+
+def test_stored_pipeline_matches_streamed(trace):
+    stored = changes_of(trace, stream=False)
+    assert stored == changes_of(trace)
+    assert (list(analyze_dependencies_possible(stored, GRAPH, time_window=1))
+            == reference_log(stored, GRAPH, 1))
+
+
+@pytest.mark.parametrize("workers", [1, 2, 5])
+def test_parallel_parse_matches_serial(trace, workers):
+    store, id_to_signal = parse_vcd_to_events(trace)
+    par_store, par_ids = parse_vcd_parallel(trace, workers=workers)
+    assert list(par_store) == list(store)
+    assert par_store.signals == store.signals
+    assert par_ids == id_to_signal
+
+
+def test_parallel_parse_of_undeclared_ids(tmp_path):
+    # id codes used without a declaration, and a $var after the header
+    path = write_trace(tmp_path / "t.vcd", cycles=30)
+    with open(path, "a") as f:
+        for t in range(400, 2000, 10):
+            f.write(f"#{t}\n1?\nb1x ~~\n0?\n")
+            if t == 1200:
+                f.write("$var wire 1 ?? late $end\n1??\n")
+    store, id_to_signal = parse_vcd_to_events(path)
+    assert id_to_signal["??"] == ["late"]
+    par_store, par_ids = parse_vcd_parallel(path, workers=3)
+    assert list(par_store) == list(store)
+    assert par_ids == id_to_signal
+
+
+def test_chunks_start_at_timestamps(trace):
+    with open(trace, "rb") as f:
+        data = f.read()
+    start = data.index(b"#0")
+    bounds = _split_vcd_body(data, start, len(data), 7)
+    assert bounds[0][0] == start and bounds[-1][1] == len(data)
+    assert all(a[1] == b[0] for a, b in zip(bounds, bounds[1:]))
+    assert all(data[lo:lo + 1] == b"#" for lo, _ in bounds)
+
+
+def test_parallel_parse_of_empty_file(tmp_path):
+    path = tmp_path / "empty.vcd"
+    path.write_text("")
+    store, id_to_signal = parse_vcd_parallel(str(path), workers=2)
+    assert len(store) == 0 and id_to_signal == {}
+
+
+def test_analysis_reports_before_the_end(trace):
+    changes = changes_of(trace)
+    # the first change after time 0 closes its window
+    first_later = next(i for i, c in enumerate(changes) if c[0] > 1)
+
+    def head_then_fail():
+        yield from changes[:first_later + 1]
+        pytest.fail("the analysis read past the window of time 0")
+
+    expected = reference_log(changes, GRAPH, 1)
+    n = next(i for i, line in enumerate(expected) if not line.startswith(("Time 0:", "   =>")))
+    log = analyze_dependencies_possible(head_then_fail(), GRAPH, time_window=1)
+    assert list(itertools.islice(log, n)) == expected[:n]
+
+
+def test_follow_reads_lines_as_they_are_written(trace, tmp_path):
+    path = tmp_path / "growing.vcd"
+    with open(trace) as f:
+        text = f.read()
+    header, body = text.split("$enddefinitions $end\n")
+    path.write_text(header + "$enddefinitions $end\n")
+
+    def writer():
+        with open(path, "a") as f:
+            # cut mid-line as well, the way a simulator's buffer flushes do
+            for k in range(0, len(body), 97):
+                f.write(body[k:k + 97])
+                f.flush()
+                time.sleep(0.001)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    events, id_to_signal = follow_vcd_events(str(path), poll_interval=0.005, idle_timeout=0.5)
+    followed = list(events)
+    thread.join()
+    expected_events, expected_ids = iter_vcd_events(trace)
+    assert id_to_signal == expected_ids
+    assert followed == list(expected_events)
+
+
+def test_follow_holds_back_a_partial_line(tmp_path):
+    path = tmp_path / "partial.txt"
+    path.write_text("#1\n1")
+    with open(path) as f:
+        lines = _follow_lines(f, poll_interval=0.005, idle_timeout=0.3)
+        assert next(lines) == "#1\n"
+        with open(path, "a") as g:
+            g.write("!\n")
+        assert next(lines) == "1!\n"
+        with open(path, "a") as g:
+            g.write("0!")
+        # not completed before the file goes idle: given out as it is
+        assert list(lines) == ["0!"]
+
+
+@pytest.mark.parametrize("workers", [2, 3])
+@pytest.mark.parametrize("options", [
+    dict(time_window=0),
+    dict(time_window=12),
+    dict(clock="clk"),
+    dict(clock="clk", cycles=3, edge="negedge"),
+])
+def test_parallel_analysis_matches_serial(trace, monkeypatch, workers, options):
+    store, id_to_signal = parse_vcd_to_events(trace)
+    changes = compute_signal_changes(label_events_with_names(store, id_to_signal, GRAPH))
+    serial = list(analyze_dependency_records(iter(changes), GRAPH, **options))
+    assert list(analyze_dependencies_parallel(changes, GRAPH, workers=workers, **options)) == serial
+    # small shards, so several of them (and their lead-ins) are cut and queued
+    monkeypatch.setattr(vcd_parser, "SHARD_CHANGES", 64)
+    monkeypatch.setattr(vcd_parser, "SHARDS_IN_FLIGHT", 1)
+    assert list(analyze_dependencies_parallel(changes, GRAPH, workers=workers, **options)) == serial
+
+
+def test_only_clean_transitions_are_clock_edges():
+    graph = {"d": ["q"]}
+    changes = [
+        (0, "clk", None, "x"), (0, "d", None, "0"),
+        (5, "clk", "x", "1"),      # not a posedge
+        (6, "d", "0", "1"),
+        (7, "q", None, "1"),
+        (10, "clk", "1", "0"),
+        (15, "clk", "0", "1"),     # first posedge
+        (16, "q", "1", "0"),
+    ]
+    log = list(analyze_dependencies_possible(iter(changes), graph, clock="clk"))
+    assert log == reference_log(changes, graph, clock="clk")
+    # the window of d at 0 runs to 15, not 5, so q at 7 is in it and q at 16 is not
+    assert "   => d possibly caused q to change to 1 at time 7" in log
+    assert "   => d possibly caused q to change to 0 at time 16" not in log
+
+
+def test_clock_without_edges_is_rejected(trace):
+    changes = [(t, "clk", "x" if t % 2 else "1", "1" if t % 2 else "x") for t in range(100)]
+    with pytest.raises(ClockError, match="no posedge"):
+        list(analyze_dependency_records(iter(changes), GRAPH, clock="clk", max_unclocked=50))
+    # the whole trace is held without a limit, and the log comes out at the end
+    assert list(analyze_dependency_records(iter(changes), GRAPH, clock="clk"))
+
+    store, id_to_signal = parse_vcd_to_events(trace)
+    stored = compute_signal_changes(label_events_with_names(store, id_to_signal, GRAPH))
+    with pytest.raises(ClockError, match="clock 'rst' has no posedge"):
+        list(analyze_dependencies_parallel(stored, GRAPH, clock="rst", workers=2))
+
+
+@pytest.mark.parametrize("args, clock, message", [
+    ((), "clkk", "is not a signal"),
+    (("--stream",), "clkk", "is not a signal"),
+    ((), "rst", "has no posedge"),
+    (("--jobs", "2"), "rst", "has no posedge"),
+    (("--edge", "negedge"), "top.clk", None),
+])
+def test_cli_checks_the_clock(trace, tmp_path, args, clock, message):
+    graph_path = str(tmp_path / "g.json")
+    write_graph_json(graph_path, GRAPH)
+    result = subprocess.run([sys.executable, VCD_PARSER, trace, "--graph", graph_path, "--no-cache",
+                             "--clock", clock, *args], capture_output=True, text=True)
+    if message is None:
+        # an alias of the clock is mapped to its label
+        assert result.returncode == 0 and "Using clock 'clk'" in result.stderr
+        assert "possibly caused" in result.stdout
+    else:
+        assert result.returncode == 1
+        assert f"clock '{clock}' {message}" in result.stdout
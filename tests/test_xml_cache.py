@@ -0,0 +1,105 @@
+import os
+import shutil
+
+import pytest
+
+from parser import parse_verilator_xml_ids, parse_verilator_xml_signals
+from test_parser import TINY, XML
+from workload import generate
+from xml_cache import ModuleSummaryCache, cache_path_for, iter_module_slices
+
+# a port bound to a <varref> without a name
+NAMELESS_XML = """<verilator_xml><netlist>
+<module name="top"><instance name="u" defName="sub"><port name="a" direction="in"><varref/></port><port name="y" direction="out"><varref name="o"/></port></instance></module>
+<module name="sub"><contassign><varref name="a"/><varref name="y"/></contassign></module>
+</netlist></verilator_xml>
+"""
+
+
+def named(xml_path, cache=None):
+    id_edges, symbols = parse_verilator_xml_ids(xml_path, cache=cache)
+    names = symbols.names()
+    return {(None if d is None else names[d]): {None if x is None else names[x] for x in driven}
+            for d, driven in id_edges.items()}
+
+
+@pytest.fixture
+def design(tmp_path):
+    xml_path, _ = generate(str(tmp_path / "gen"), seed=3, **TINY)
+    shutil.copy(xml_path, tmp_path / "design.xml")
+    return str(tmp_path / "design.xml")
+
+
+def test_round_trip(design):
+    expected = dict(parse_verilator_xml_signals(design))
+    cache = ModuleSummaryCache(design)
+    assert named(design, cache) == expected
+    assert cache.hits == 0 and cache.misses == 4
+    cache.save()
+
+    cache = ModuleSummaryCache(design)
+    assert named(design, cache) == expected
+    assert (cache.hits, cache.misses) == (4, 0)
+
+
+def test_only_edited_modules_are_parsed(design):
+    cache = ModuleSummaryCache(design)
+    named(design, cache)
+    cache.save()
+    with open(design) as f:
+        text = f.read()
+    # one more assignment in m1
+    start = text.index('<module name="m1">')
+    text = text[:start] + text[start:].replace(
+        "</module>", '<contassign><varref name="din"/><varref name="extra"/></contassign>\n</module>', 1)
+    with open(design, "w") as f:
+        f.write(text)
+
+    cache = ModuleSummaryCache(design)
+    graph = named(design, cache)
+    assert (cache.hits, cache.misses) == (3, 1)
+    assert graph == dict(parse_verilator_xml_signals(design))
+    assert any(name.endswith(".extra") for driven in graph.values() for name in driven)
+
+
+@pytest.mark.parametrize("damage", ["", "{", "[]", '{"version": 0, "modules": {}}',
+                                    '{"version": 1, "modules": []}'])
+def test_unreadable_cache_is_ignored(design, damage):
+    with open(cache_path_for(design), "w") as f:
+        f.write(damage)
+    cache = ModuleSummaryCache(design)
+    assert named(design, cache) == dict(parse_verilator_xml_signals(design))
+    assert cache.hits == 0
+
+
+def test_module_slices(tmp_path):
+    xml_path = tmp_path / "top.xml"
+    xml_path.write_text(XML.replace('<module name="leaf">', '<module name="a&amp;b"/>\n<module name="leaf">'))
+    with open(xml_path, "rb") as f:
+        slices = list(iter_module_slices(f.read()))
+    assert [name for name, _ in slices] == ["top", "a&b", "leaf"]
+    assert slices[1][1] == b'<module name="a&amp;b"/>'
+    assert all(raw.startswith(b"<module") for _, raw in slices)
+
+
+def test_nameless_varref(tmp_path):
+    xml_path = str(tmp_path / "nameless.xml")
+    with open(xml_path, "w") as f:
+        f.write(NAMELESS_XML)
+    expected = {None: {"top.u.a"}, "top.u.a": {"top.u.y"}, "top.u.y": {"top.o"}}
+    assert dict(parse_verilator_xml_signals(xml_path)) == expected
+    cache = ModuleSummaryCache(xml_path)
+    assert named(xml_path, cache) == expected
+    cache.save()
+    cache = ModuleSummaryCache(xml_path)
+    assert named(xml_path, cache) == expected and cache.misses == 0
+
+
+def test_unwritable_cache_is_warned_about_on_stderr(design, capsys):
+    # a directory in the sidecar's place cannot be replaced by the new file
+    os.mkdir(cache_path_for(design))
+    cache = ModuleSummaryCache(design)
+    named(design, cache)
+    cache.save()
+    out, err = capsys.readouterr()
+    assert out == "" and "[Warning] Could not write module cache" in err